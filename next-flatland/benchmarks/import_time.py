@@ -0,0 +1,77 @@
+"""
+Import time of the simulation core in fresh interpreters, as paid by every spawned worker process.
+
+The core is checked against the budget of the tree before checkpoints, metrics, streaming and the other
+simulation modules were added: `import gen_env` then took 135 ms and loaded 236 modules, 35 ms more than
+`import ugraph` alone, which the core needs. The benchmark fails if the core is slower or loads more modules,
+or if it loads any of the heavy dependencies that only optional features need.
+
+Run from the project root:  python benchmarks/import_time.py [repetitions]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODULES = (
+    "next_flatland.network.state_network",
+    "next_flatland.simulation",
+    "gen_env",
+    "rail_prototyp",
+    "next_flatland.network.state_network.plot_3d",
+)
+PLOTTING_MODULES = ("plotly.graph_objects", "ugraph.plot")
+HEAVY_MODULES = ("numpy", "pandas", "asyncio", "multiprocessing", "concurrent.futures", *PLOTTING_MODULES)
+# maximal number of loaded modules by module of the core, None where there is no baseline
+MODULE_BUDGET = {"gen_env": 236, "next_flatland.network.state_network": 235, "next_flatland.simulation": None}
+# import time of gen_env over the one of ugraph
+TIME_BUDGET_SECONDS = 0.035
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+plotting = [name for name in {plotting!r} if name in sys.modules]
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "modules": len(sys.modules), "plotting": plotting, "heavy": heavy}}))
+"""
+
+
+def measure(module: str) -> dict:
+    code = MEASURE.format(module=module, plotting=PLOTTING_MODULES, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+def main(repetitions: int = 5) -> None:
+    print(f"{'module':45} {'median [ms]':>12} {'min [ms]':>10} {'modules':>8}  plotting loaded")
+    medians, failures = {}, []
+    for module in ("ugraph", *MODULES):
+        runs = [measure(module) for _ in range(repetitions)]
+        seconds = [run["seconds"] for run in runs]
+        medians[module] = statistics.median(seconds)
+        print(
+            f"{module:45} {medians[module] * 1000:12.1f} {min(seconds) * 1000:10.1f} "
+            f"{runs[0]['modules']:8d}  {', '.join(runs[0]['plotting']) or '-'}"
+        )
+        if module in MODULE_BUDGET:
+            if runs[0]["heavy"]:
+                failures.append(f"{module} loads {', '.join(runs[0]['heavy'])}")
+            if MODULE_BUDGET[module] is not None and runs[0]["modules"] > MODULE_BUDGET[module]:
+                failures.append(f"{module} loads {runs[0]['modules']} modules, budget {MODULE_BUDGET[module]}")
+    overhead = medians["gen_env"] - medians["ugraph"]
+    print(f"gen_env over ugraph: {overhead * 1000:.1f} ms, budget {TIME_BUDGET_SECONDS * 1000:.0f} ms")
+    if overhead > TIME_BUDGET_SECONDS:
+        failures.append(f"gen_env takes {overhead * 1000:.1f} ms over ugraph")
+    if failures:
+        sys.exit("Over the import budget: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
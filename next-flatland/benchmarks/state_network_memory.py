@@ -0,0 +1,115 @@
+"""
+Memory per node of a StateNetwork and a CompactStateNetwork of the same line network, each built in a fresh
+interpreter and measured as the growth of its resident set size (Linux only).
+
+Every section of the line has a resource, a forward and a backward infrastructure node, two allocations and
+the transitions to the next section, so there are 4/3 links per node.
+
+Run from the project root:  python benchmarks/state_network_memory.py [sections ...]
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BACKENDS = ("StateNetwork", "CompactStateNetwork")
+
+MEASURE = """
+import ctypes, gc, json, time
+import numpy as np
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, StateNode, StateNodeType
+from next_flatland.network.state_network.compact import CompactStateNetwork, new_link_array, new_node_array
+
+
+def rss():
+    gc.collect()
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def line_arrays(n):
+    ids = np.empty(3 * n, dtype=object)
+    ids[0::3] = [f"s{{i}}_forward" for i in range(n)]
+    ids[1::3] = [f"s{{i}}_backward" for i in range(n)]
+    ids[2::3] = [f"s{{i}}" for i in range(n)]
+    nodes = new_node_array(3 * n)
+    nodes["node_type"] = StateNodeType.INFRASTRUCTURE.value
+    nodes["node_type"][2::3] = StateNodeType.RESOURCE.value
+    nodes["length"] = 20.0
+    nodes["length"][2::3] = 0.0
+    nodes["x"] = np.repeat(np.arange(n) * 20.0, 3)
+    nodes["z"][2::3] = -50.0
+    links = new_link_array(4 * n - 2)
+    section = np.arange(n) * 3
+    links["source"][: 2 * n] = np.concatenate([section, section + 1])
+    links["target"][: 2 * n] = np.concatenate([section + 2, section + 2])
+    links["link_type"][: 2 * n] = StateLinkType.ALLOCATION.value
+    links["source"][2 * n :] = np.concatenate([section[:-1], section[1:] + 1])
+    links["target"][2 * n :] = np.concatenate([section[1:], section[:-1] + 1])
+    links["link_type"][2 * n :] = StateLinkType.TRANSITION.value
+    return ids, nodes, links
+
+
+def build_state_network(ids, nodes, links):
+    state_nodes = [
+        StateNode(
+            node_type=StateNodeType(t), coordinates=ThreeDCoordinates(x, y, z), id=NodeId(i),
+            capacity=c, length=length, max_speed=s,
+        )
+        for i, (t, x, y, z, c, length, s) in zip(ids, nodes.tolist())
+    ]
+    state_links = [
+        (EndNodeIdPair((ids[s], ids[t])), StateLink(link_type=StateLinkType(lt), max_speed=ms))
+        for s, t, lt, ms in links.tolist()
+    ]
+    return StateNetwork.create_new(state_nodes, state_links)
+
+
+before = rss()
+arrays = line_arrays({sections})
+start = time.perf_counter()
+if "{backend}" == "StateNetwork":
+    network = build_state_network(*arrays)
+else:
+    network = CompactStateNetwork.from_arrays(*arrays)
+elapsed = time.perf_counter() - start
+del arrays
+network.node_by_id(NodeId("s0_forward"))  # the id index of igraph is built on first lookup
+after = rss()
+start = time.perf_counter()
+for i in range(0, {sections}, max({sections} // 1000, 1)):
+    network.neighbors(NodeId(f"s{{i}}_forward"), "out")
+lookup = (time.perf_counter() - start) / len(range(0, {sections}, max({sections} // 1000, 1)))
+print(json.dumps({{"nodes": network.n_count, "links": network.l_count, "bytes": after - before,
+                  "build_seconds": elapsed, "lookup_seconds": lookup}}))
+"""
+
+
+def measure(backend: str, sections: int) -> dict:
+    code = MEASURE.format(backend=backend, sections=sections)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+def main(sections: list[int]) -> None:
+    print(f"{'backend':20} {'nodes':>9} {'links':>9} {'bytes/node':>11} {'build [s]':>10} {'neighbors [us]':>15}")
+    for n in sections:
+        per_node = {}
+        for backend in BACKENDS:
+            run = measure(backend, n)
+            per_node[backend] = run["bytes"] / run["nodes"]
+            print(
+                f"{backend:20} {run['nodes']:9d} {run['links']:9d} {per_node[backend]:11.1f} "
+                f"{run['build_seconds']:10.2f} {run['lookup_seconds'] * 1e6:15.1f}"
+            )
+        print(f"{'reduction':20} {per_node['StateNetwork'] / per_node['CompactStateNetwork']:>42.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [100_000, 333_334])
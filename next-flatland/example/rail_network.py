@@ -1,7 +1,6 @@
 from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
 
 from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, StateNode, StateNodeType
-from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure, compose_with_slider
 
 RESOURCE_Z = -50
 NODE_DISTANCE = 20
@@ -134,11 +133,13 @@ def create_example_rail_network() -> StateNetwork:
 
     state_network = StateNetwork.create_new(nodes_to_add, links_to_add)
     if not (validation_result := state_network.validate_topology()).succeeded:
-        raise ValueError(validation_result.answer)
+        raise ValueError("\n".join(violation.message for violation in validation_result.answer))
     return state_network
 
 
 if __name__ == "__main__":
+    from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure, compose_with_slider
+
     figure = add_state_network_in_3d_to_figure(create_example_rail_network())
     figure.show()
     compose_with_slider((figure, figure)).show()
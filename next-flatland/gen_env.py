@@ -1,11 +1,17 @@
+import random
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Generic, List, Set, TypeVar
-
-import plotly.graph_objects as go
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Generic, List, Set, TypeVar
 
 from next_flatland.network.state_network.network import StateNetwork
-from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    import plotly.graph_objects as go
+
+    from next_flatland.simulation.checkpoint import CheckpointStore
 
 
 # TODO type hints and generics domain-agnostic
@@ -21,10 +27,11 @@ class Resource(Entity):
     location , etc.
     """
 
-    def __init__(self):
+    def __init__(self, capacity: int = 1):
         self._state = None
         self._rules = set()
         self._objectives = None
+        self._capacity = capacity
 
     @property
     def state(self):
@@ -38,6 +45,10 @@ class Resource(Entity):
     def objectives(self):
         return self._objectives
 
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
 
 @dataclass()
 class Effect:
@@ -53,7 +64,19 @@ class Effect:
     malfunction
     """
 
-    pass
+    # type of the entity or relation changed by the effect, selects the rules that apply to it
+    subject_type = None
+
+
+class EnvironmentEffect(Effect):
+    """
+        A change of the system made by an environment process, e.g. a train entering the network. It is not
+    checked by the arbiter but applied to the system state directly, and applied again by a Replay.
+    """
+
+    @abstractmethod
+    def apply(self, state: "SystemState"):
+        raise NotImplementedError()
 
 
 class Agent(Entity):
@@ -145,6 +168,133 @@ class Arbiter:
         raise NotImplementedError()
 
 
+class LocalRule:
+    """
+        A local rule checks a single effect without considering the other effects of the step, e.g. whether a
+    move follows a transition of the infrastructure. It applies to the effects of `effect_types` whose
+    subject is one of `subject_types`, or to all of them if `subject_types` is None.
+    """
+
+    effect_types: tuple[type, ...] = (Effect,)
+    subject_types: frozenset | None = None
+
+    @abstractmethod
+    def check(self, state: StateNetwork, effect: Effect, facts: Dict[str, Any]) -> bool:
+        """Whether `effect` is valid, `facts` is shared by all rules checking the effect in this step."""
+        raise NotImplementedError()
+
+    def check_batch(self, state: StateNetwork, effects: List[Effect], facts: List[Dict[str, Any]]) -> List[bool]:
+        """Check many effects at once, rules on plain arrays can override this with a vectorized version."""
+        return [self.check(state, effect, effect_facts) for effect, effect_facts in zip(effects, facts)]
+
+
+class GlobalRule:
+    """
+        A global rule checks an effect against the relations between entities, including the ones changed by
+    the effects accepted before it in the same step, e.g. the capacity of a resource. The effects are
+    checked in the order they were proposed, `context` is shared by all effects of the step.
+    """
+
+    effect_types: tuple[type, ...] = (Effect,)
+    subject_types: frozenset | None = None
+
+    @abstractmethod
+    def check(self, state: StateNetwork, effect: Effect, facts: Dict[str, Any], context: Dict[str, Any]) -> bool:
+        raise NotImplementedError()
+
+    def commit(self, state: StateNetwork, effect: Effect, facts: Dict[str, Any], context: Dict[str, Any]):
+        """Record in `context` the changes of an effect accepted by all global rules."""
+        pass
+
+
+class RuleBasedArbiter(Arbiter):
+    """
+        Arbiter checking the effects against registered rules. The rules are indexed by effect type and by the
+    type of the entity or relation the effect changes (`Effect.subject_type`), so an effect is only checked
+    against the rules that apply to it and effects without any rule are accepted as proposed. All local rules
+    are evaluated first, batched by rule and optionally in chunks on an executor, then the remaining effects
+    are checked in a single global pass.
+    """
+
+    def __init__(self, executor: "Executor | None" = None, chunk_size: int = 1024):
+        # the chunks share the state, so the executor has to run them in threads
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self._local_rules: list[LocalRule] = []
+        self._global_rules: list[GlobalRule] = []
+        self._rule_index: dict[tuple[type, Any], tuple[list[LocalRule], list[GlobalRule]]] = {}
+
+    def register(self, rule: LocalRule | GlobalRule):
+        if isinstance(rule, LocalRule):
+            self._local_rules.append(rule)
+        elif isinstance(rule, GlobalRule):
+            self._global_rules.append(rule)
+        else:
+            raise TypeError(f"{rule} is neither a LocalRule nor a GlobalRule")
+        self._rule_index.clear()
+
+    def rules_for(self, effect: Effect) -> tuple[list[LocalRule], list[GlobalRule]]:
+        key = (type(effect), effect.subject_type)
+        if key not in self._rule_index:
+            self._rule_index[key] = (
+                [rule for rule in self._local_rules if _applies(rule, *key)],
+                [rule for rule in self._global_rules if _applies(rule, *key)],
+            )
+        return self._rule_index[key]
+
+    def complete(self, state: StateNetwork, effect: Effect, facts: Dict[str, Any]) -> List[Effect]:
+        """Effects to propagate for an accepted effect, arbiters can add effects to complete the state change."""
+        return [effect]
+
+    def check_rules(self, state: StateNetwork, effects: List[Effect]) -> List[Effect]:
+        facts: list[dict[str, Any]] = [{} for _ in effects]
+        valid = self._check_local_rules(state, effects, facts)
+
+        context: dict[str, Any] = {}
+        valid_effects: list[Effect] = []
+        for position, effect in enumerate(effects):
+            if not valid[position]:
+                continue
+            global_rules = self.rules_for(effect)[1]
+            if all(rule.check(state, effect, facts[position], context) for rule in global_rules):
+                for rule in global_rules:
+                    rule.commit(state, effect, facts[position], context)
+                valid_effects.extend(self.complete(state, effect, facts[position]))
+        return valid_effects
+
+    def _check_local_rules(self, state: StateNetwork, effects: List[Effect], facts: List[Dict[str, Any]]) -> list[bool]:
+        valid = [True] * len(effects)
+        positions_by_rule: dict[int, tuple[LocalRule, list[int]]] = {}
+        for position, effect in enumerate(effects):
+            for rule in self.rules_for(effect)[0]:
+                positions_by_rule.setdefault(id(rule), (rule, []))[1].append(position)
+
+        # rules run in order of registration, an effect rejected by one rule isn't checked by the later ones
+        for rule in self._local_rules:
+            if id(rule) not in positions_by_rule:
+                continue
+            positions = [position for position in positions_by_rule[id(rule)][1] if valid[position]]
+            chunks = [positions[i : i + self.chunk_size] for i in range(0, len(positions), self.chunk_size)]
+
+            def check_chunk(chunk: list[int], rule: LocalRule = rule) -> List[bool]:
+                return rule.check_batch(state, [effects[i] for i in chunk], [facts[i] for i in chunk])
+
+            if self.executor is None or len(chunks) < 2:
+                results = map(check_chunk, chunks)
+            else:
+                results = self.executor.map(check_chunk, chunks)
+            for chunk, chunk_valid in zip(chunks, results):
+                for position, is_valid in zip(chunk, chunk_valid):
+                    valid[position] = is_valid
+        return valid
+
+
+def _applies(rule: LocalRule | GlobalRule, effect_type: type, subject_type: Any) -> bool:
+    if not issubclass(effect_type, rule.effect_types):
+        return False
+    return rule.subject_types is None or subject_type in rule.subject_types
+
+
 class Propagator:
     """
         Given the valid effects , a propagator updates the system state (entities and relations). Note that if
@@ -171,31 +321,167 @@ class SystemState(Generic[AgentType, RelationType, ResourceType]):
         raise NotImplementedError()
 
 
+class Observer:
+    """
+        An observer is notified after every step with the effects proposed by the agents and the effects
+    accepted by the arbiter and propagated. Observers must not modify the system state, e.g. metrics, logs
+    or viewers.
+    """
+
+    @abstractmethod
+    def observe(self, state: SystemState, proposed: List[Effect], accepted: List[Effect]):
+        raise NotImplementedError()
+
+    def observe_environment(self, state: SystemState, changes: List[EnvironmentEffect] | None):
+        """
+        Called at the start of every step with the changes applied by the environment processes, None if a
+        process changed the system without returning its changes.
+        """
+
+
+class EffectRecorder(Observer):
+    """
+        Records a run for a Replay: the environment changes and the accepted effects of every step into an
+    EffectLog and, every `keyframe_every` steps, a keyframe of the system state and the propagator into a
+    CheckpointStore. A seek replays at most `keyframe_every` - 1 steps, fewer keyframes cost less disk but
+    more time per seek. Use `GenEnvSimulation.record` to start recording with a keyframe of the current state.
+    Only environment processes returning their changes can be recorded. The recorder can be checkpointed
+    with the simulation, a resumed run continues the recording.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        propagator: Propagator,
+        keyframe_every: int = 200,
+        static: Dict[str, Any] | None = None,
+    ):
+        # recording is imported on first use, plain runs don't load NumPy and the checkpoint machinery
+        from next_flatland.simulation.checkpoint import CheckpointStore
+        from next_flatland.simulation.replay import EffectLog
+
+        self.log = EffectLog(directory, "w", static)
+        self.keyframes = CheckpointStore(directory, static, keep=0)
+        self.propagator = propagator
+        self.keyframe_every = keyframe_every
+        self.n_steps = 0
+
+    def keyframe(self, state: SystemState):
+        self.log.flush()
+        self.keyframes.save({"state": state, "propagator": self.propagator}, state.state, self.n_steps)
+
+    def observe_environment(self, state: SystemState, changes: List[EnvironmentEffect] | None):
+        if changes is None:
+            raise ValueError("An environment process didn't return its changes, the run can't be recorded")
+        self.log.begin_step(changes)
+
+    def observe(self, state: SystemState, proposed: List[Effect], accepted: List[Effect]):
+        self.log.append(accepted)
+        self.n_steps += 1
+        if self.n_steps % self.keyframe_every == 0:
+            self.keyframe(state)
+
+    def close(self):
+        self.log.close()
+
+
+class EnvironmentProcess:
+    """
+        An environment process changes the system from outside of the agents at the start of every step, e.g.
+    trains entering and leaving the network according to a timetable, or malfunctions.
+    """
+
+    @abstractmethod
+    def apply(self, state: SystemState) -> List[EnvironmentEffect] | None:
+        """Change the system, returns the applied changes so they can be recorded, None if they are unknown."""
+        raise NotImplementedError()
+
+    def is_done(self) -> bool:
+        """Whether the process won't change the system anymore, the simulation runs at least until then."""
+        return True
+
+
 class GenEnvSimulation:
 
-    def __init__(self, propagator: Propagator, state: SystemState, arbiter: Arbiter):
+    def __init__(
+        self,
+        propagator: Propagator,
+        state: SystemState,
+        arbiter: Arbiter,
+        observers: List[Observer] | None = None,
+        environment: List[EnvironmentProcess] | None = None,
+    ):
         self.propagator = propagator
         self.state = state
         self.arbiter = arbiter
         self.queue = list()
+        self.observers = observers if observers is not None else []
+        self.environment = environment if environment is not None else []
+        self.n_steps = 0
 
     def addEffects(self, effects: List[Effect]):
         self.queue.extend(effects)
 
-    def run(self, figures: list[go.Figure] | None = None):
+    def run(
+        self,
+        figures: list["go.Figure"] | None = None,
+        checkpoints: "CheckpointStore | None" = None,
+        checkpoint_every: int = 100,
+    ):
+        if isinstance(figures, list):
+            # plotting is only imported when figures are requested, headless runs don't load plotly
+            from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure
+
         dones = self.step()
         if isinstance(figures, list):
             figures.append(add_state_network_in_3d_to_figure(self.state.state))
 
-        while not (all(dones.values())):
+        while not (all(dones.values()) and all(process.is_done() for process in self.environment)):
             self.queue.clear()
+            if checkpoints is not None and self.n_steps % checkpoint_every == 0:
+                self.checkpoint(checkpoints)
             dones = self.step()
             if isinstance(figures, list):
                 figures.append(add_state_network_in_3d_to_figure(self.state.state))
 
+    def checkpoint(self, checkpoints: "CheckpointStore") -> Path:
+        """Write the whole simulation including the random number generators, the static network only once."""
+        import numpy as np
+
+        root = {"simulation": self, "random": random.getstate(), "numpy_random": np.random.get_state()}
+        return checkpoints.save(root, self.state.state, self.n_steps)
+
+    @classmethod
+    def resume(cls, checkpoints: "CheckpointStore", path: Path | str | None = None) -> "GenEnvSimulation":
+        """Restore the simulation of the latest checkpoint, or of `path`, to continue with `run`."""
+        import numpy as np
+
+        _, root = checkpoints.load(path)
+        random.setstate(root["random"])
+        np.random.set_state(root["numpy_random"])
+        return root["simulation"]
+
+    def record(
+        self, directory: Path | str, keyframe_every: int = 200, static: Dict[str, Any] | None = None
+    ) -> EffectRecorder:
+        """Record the following steps into `directory`, see EffectRecorder. Steps are counted from now on."""
+        recorder = EffectRecorder(directory, self.propagator, keyframe_every, static)
+        recorder.keyframe(self.state)
+        self.observers.append(recorder)
+        return recorder
+
     def step(self):
+        changes: list[EnvironmentEffect] | None = []
+        for process in self.environment:
+            applied = process.apply(self.state)
+            changes = None if applied is None or changes is None else changes + applied
+        for observer in self.observers:
+            observer.observe_environment(self.state, changes)
         self.addEffects(self.state.actions_to_effects(self.state.pull_actions()))
-        # TODO malfuntion/env
+        proposed = list(self.queue)
         self.queue = self.arbiter.check_rules(self.state.state, self.queue)
         dones = self.propagator.propagate(self.state.state, self.queue)
+        self.n_steps += 1
+        for observer in self.observers:
+            observer.observe(self.state, proposed, self.queue)
         return dones
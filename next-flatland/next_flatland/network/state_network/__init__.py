@@ -1,4 +1,26 @@
+from importlib import import_module
+
 from .link import StateLink, StateLinkType
 from .network import StateNetwork
 from .node import StateNode, StateNodeType
-from .plot_3d import add_state_network_in_3d_to_figure
+
+# the other modules are imported on first use, so importing the core doesn't load their dependencies,
+# e.g. plotly and ugraph.plot for plotting or NumPy for the compact storage and the occupancy counters
+_MODULE_BY_NAME = {
+    "CompactStateNetwork": ".compact",
+    "ResourceOccupancy": ".occupancy",
+    "PathService": ".paths",
+    "Route": ".paths",
+    "RasterRenderer": ".render_2d",
+    "compile_route_table": ".route_table",
+    "TopologyViolation": ".validation",
+    "add_state_network_in_3d_to_figure": ".plot_3d",
+}
+
+__all__ = ["StateLink", "StateLinkType", "StateNetwork", "StateNode", "StateNodeType", *_MODULE_BY_NAME]
+
+
+def __getattr__(name: str):
+    if name in _MODULE_BY_NAME:
+        return getattr(import_module(_MODULE_BY_NAME[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,179 @@
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+from ugraph import EndNodeIdPair, NodeId
+
+from next_flatland.network.state_network.link import StateLink, StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+
+
+@dataclass(frozen=True, slots=True)
+class MacroEdge:
+    """A linear chain of infrastructure nodes that an agent can traverse in a single move."""
+
+    path: tuple[NodeId, ...]  # infrastructure nodes from source to target, both included
+    resources: tuple[NodeId, ...]  # resources allocated by the entered nodes path[1:], in travel order
+
+    @property
+    def source(self) -> NodeId:
+        return self.path[0]
+
+    @property
+    def target(self) -> NodeId:
+        return self.path[-1]
+
+    @property
+    def entered(self) -> tuple[NodeId, ...]:
+        return self.path[1:]
+
+
+class CollapsedNetwork:
+    """
+    Infrastructure layer of a StateNetwork with linear TRANSITION chains collapsed into macro edges.
+
+    Only switches, ends of lines and other nodes without exactly one incoming and one outgoing transition
+    are kept. Every maximal chain between two kept nodes becomes one macro edge, which keeps the mapping
+    back to the original infrastructure nodes and resources, so moves along it can still be checked
+    against the occupancy of every resource on the way.
+    """
+
+    # written once per checkpoint directory instead of into every checkpoint
+    checkpoint_static = True
+
+    def __init__(
+        self,
+        network: StateNetwork,
+        macro_edges: Mapping[EndNodeIdPair, MacroEdge],
+        resources_by_infrastructure: Mapping[NodeId, tuple[NodeId, ...]],
+    ):
+        self._network = network
+        self._macro_edges = dict(macro_edges)
+        self._resources_by_infrastructure = resources_by_infrastructure
+        self._edges_from: defaultdict[NodeId, list[MacroEdge]] = defaultdict(list)
+        self._position_on_edge: dict[NodeId, tuple[MacroEdge, int]] = {}
+        for edge in self._macro_edges.values():
+            self._edges_from[edge.source].append(edge)
+            for position, infra_id in enumerate(edge.path[1:-1], start=1):
+                self._position_on_edge[infra_id] = (edge, position)
+
+    @property
+    def network(self) -> StateNetwork:
+        """The collapsed network: kept infrastructure nodes, their resources and one transition per macro edge."""
+        return self._network
+
+    @property
+    def macro_edges(self) -> Mapping[EndNodeIdPair, MacroEdge]:
+        return self._macro_edges
+
+    def is_collapsed(self, infra_id: NodeId) -> bool:
+        return infra_id in self._position_on_edge
+
+    def macro_edges_from(self, infra_id: NodeId) -> list[MacroEdge]:
+        """
+        Macro edges an agent on `infra_id` can take. For a collapsed node inside a chain this is the
+        remainder of its chain up to the next kept node.
+        """
+        if infra_id not in self._position_on_edge:
+            return self._edges_from.get(infra_id, [])
+        edge, position = self._position_on_edge[infra_id]
+        path = edge.path[position:]
+        return [MacroEdge(path=path, resources=_resources_entered(path, self._resources_by_infrastructure))]
+
+    def traversed(self, source: NodeId, target: NodeId) -> tuple[NodeId, ...] | None:
+        """Infrastructure nodes entered by moving from `source` to `target` in one move, None if impossible."""
+        for edge in self.macro_edges_from(source):
+            if edge.target == target:
+                return edge.entered
+        return None
+
+
+def collapse_state_network(state: StateNetwork) -> CollapsedNetwork:
+    """
+    Compile the infrastructure layer of `state` into a CollapsedNetwork.
+
+    Args:
+        state (StateNetwork): Network with infrastructure and resource nodes, agents are ignored.
+
+    Returns:
+        CollapsedNetwork: The collapsed network and its macro edges.
+    """
+    nodes = state.all_nodes
+    successors: defaultdict[int, list[int]] = defaultdict(list)
+    in_degree: defaultdict[int, int] = defaultdict(int)
+    resources_by_infra: defaultdict[int, list[int]] = defaultdict(list)
+    for (s, t), link in state.link_by_tuple_iterator():
+        if link.link_type == StateLinkType.TRANSITION:
+            successors[s].append(t)
+            in_degree[t] += 1
+        elif link.link_type == StateLinkType.ALLOCATION:
+            resources_by_infra[s].append(t)
+
+    infrastructure = [i for i, node in enumerate(nodes) if node.node_type == StateNodeType.INFRASTRUCTURE]
+    kept = {i for i in infrastructure if not (in_degree[i] == 1 and len(successors[i]) == 1)}
+    chains = _follow_chains(infrastructure, successors, kept)
+
+    resources_by_infrastructure = {
+        nodes[i].id: tuple(nodes[r].id for r in resources) for i, resources in resources_by_infra.items()
+    }
+    macro_edges: dict[EndNodeIdPair, MacroEdge] = {}
+    for chain in chains:
+        path = tuple(nodes[i].id for i in chain)
+        macro_edges[EndNodeIdPair((path[0], path[-1]))] = MacroEdge(
+            path=path, resources=_resources_entered(path, resources_by_infrastructure)
+        )
+
+    kept_resources = {r for i in kept for r in resources_by_infra[i]}
+    links_to_add: list[tuple[EndNodeIdPair, StateLink]] = [
+        (EndNodeIdPair((nodes[i].id, nodes[r].id)), StateLink(link_type=StateLinkType.ALLOCATION))
+        for i in kept
+        for r in resources_by_infra[i]
+    ]
+    links_to_add.extend((end_nodes, StateLink(link_type=StateLinkType.TRANSITION)) for end_nodes in macro_edges)
+    network = StateNetwork.create_new([nodes[i] for i in sorted(kept | kept_resources)], links_to_add)
+    return CollapsedNetwork(network, macro_edges, resources_by_infrastructure)
+
+
+def _resources_entered(
+    path: tuple[NodeId, ...], resources_by_infrastructure: Mapping[NodeId, tuple[NodeId, ...]]
+) -> tuple[NodeId, ...]:
+    entered = (resources_by_infrastructure.get(infra_id, ()) for infra_id in path[1:])
+    return tuple(dict.fromkeys(resource_id for resources in entered for resource_id in resources))
+
+
+def _follow_chains(infrastructure: list[int], successors: Mapping[int, list[int]], kept: set[int]) -> list[list[int]]:
+    """
+    Maximal chains between kept nodes. `kept` is extended where needed: one node per cycle without any
+    kept node, and the last node of the longer one of two chains between the same end nodes, whichever is
+    walked first, so every pair of end nodes has at most one macro edge.
+    """
+    visited: set[int] = set()
+    chain_by_end_nodes: dict[tuple[int, int], list[int]] = {}
+
+    def walk(start: int) -> None:
+        for successor in successors[start]:
+            chain = [start, successor]
+            while chain[-1] not in kept:
+                visited.add(chain[-1])
+                chain.append(successors[chain[-1]][0])
+            other = chain_by_end_nodes.get((start, chain[-1]))
+            if other is None:
+                chain_by_end_nodes[(start, chain[-1])] = chain
+                continue
+            longer, shorter = (chain, other) if len(chain) >= len(other) else (other, chain)
+            if len(longer) == 2:
+                # parallel transitions between the same nodes are one move
+                continue
+            chain_by_end_nodes[(start, chain[-1])] = shorter
+            kept.add(longer[-2])
+            chain_by_end_nodes[(start, longer[-2])] = longer[:-1]
+            chain_by_end_nodes[(longer[-2], longer[-1])] = longer[-2:]
+
+    for i in [i for i in infrastructure if i in kept]:
+        walk(i)
+    for i in infrastructure:
+        if i not in kept and i not in visited:
+            kept.add(i)
+            walk(i)
+    return list(chain_by_end_nodes.values())
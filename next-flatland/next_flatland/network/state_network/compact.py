@@ -0,0 +1,421 @@
+import math
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Literal
+
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+from ugraph import EndNodeIdPair, LinkIndex, NodeId, NodeIndex, ThreeDCoordinates
+
+from next_flatland.network.state_network.link import StateLink, StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNode, StateNodeType
+
+# exchange format of from_arrays, node_array and link_array: one row per node or link with all attributes
+NODE_DTYPE = np.dtype(
+    [
+        ("node_type", np.int8),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("z", np.float64),
+        ("capacity", np.int64),
+        ("length", np.float64),
+        ("max_speed", np.float64),
+    ]
+)
+LINK_DTYPE = np.dtype([("source", np.int64), ("target", np.int64), ("link_type", np.int8), ("max_speed", np.float64)])
+
+_NODE_PROFILE_FIELDS = ["node_type", "capacity", "length", "max_speed"]
+_LINK_PROFILE_FIELDS = ["link_type", "max_speed"]
+
+
+def new_node_array(n: int) -> np.ndarray:
+    """`n` rows of NODE_DTYPE with the defaults of StateNode."""
+    nodes = np.zeros(n, dtype=NODE_DTYPE)
+    nodes["capacity"] = 1
+    nodes["max_speed"] = math.inf
+    return nodes
+
+
+def new_link_array(n: int) -> np.ndarray:
+    """`n` rows of LINK_DTYPE with the defaults of StateLink."""
+    links = np.zeros(n, dtype=LINK_DTYPE)
+    links["max_speed"] = math.inf
+    return links
+
+
+class CompactStateNetwork:
+    """
+    Read-only storage and interchange format for networks with millions of nodes, stored in a few NumPy arrays
+    instead of one Python object per node and link and an igraph graph. It is not a StateNetwork: it can not be
+    changed, has no underlying_digraph and offers neither the reduce_to_* methods nor validate_topology.
+
+    Per node only the coordinates and a code of its (node type, capacity, length, max speed) combination are
+    stored, per link the target and the code of its (link type, max speed) combination. Networks have few
+    distinct combinations, they are kept once in small profile tables. The links are ordered by source node,
+    so the outgoing links of a node are a slice found by an offset per node, the index of incoming links is
+    built on first use. Node ids are one UTF-8 buffer with an offset per node and a sorted order for lookup.
+
+    The lookup and iteration methods of StateNetwork are offered with the same names, for inspecting a stored
+    network without materializing it. StateNode objects are created on every request and not kept, StateLink
+    objects are shared by all links of a profile. Link indexes differ from the StateNetwork the network was
+    created from, since the links are grouped by source node. Simulation, reduction and validation need a
+    StateNetwork, use `to_state_network` to materialize the whole network or a region of it.
+    """
+
+    def __init__(
+        self,
+        nodes: np.ndarray,
+        node_profiles: np.ndarray,
+        link_targets: np.ndarray,
+        link_codes: np.ndarray,
+        link_profiles: np.ndarray,
+        link_offsets: np.ndarray,
+        id_data: bytes,
+        id_offsets: np.ndarray,
+        id_order: np.ndarray,
+    ):
+        """Use from_arrays or from_state_network, the arguments are the internal arrays."""
+        self._nodes = nodes  # (code, x, y, z) per node
+        self._node_profiles = node_profiles
+        self._link_targets = link_targets
+        self._link_codes = link_codes
+        self._link_profiles = link_profiles
+        self._link_offsets = link_offsets  # outgoing links of node i are link_offsets[i]:link_offsets[i + 1]
+        self._id_data = id_data
+        self._id_offsets = id_offsets
+        self._id_order = id_order  # node indexes in order of their id
+        self._node_profile_values = [
+            (StateNodeType(int(t)), int(c), float(length), float(s)) for t, c, length, s in node_profiles.tolist()
+        ]
+        self._links_by_code = [
+            StateLink(link_type=StateLinkType(int(t)), max_speed=float(s)) for t, s in link_profiles.tolist()
+        ]
+        self._in_index: tuple[np.ndarray, np.ndarray] | None = None
+
+    @classmethod
+    def from_arrays(
+        cls, node_ids: Sequence[str] | np.ndarray, nodes: np.ndarray, links: np.ndarray
+    ) -> "CompactStateNetwork":
+        """
+        Build the network without creating node or link objects.
+
+        Args:
+            node_ids (Sequence[str] | np.ndarray): Unique id per node.
+            nodes (np.ndarray): One row of NODE_DTYPE per node, see new_node_array.
+            links (np.ndarray): One row of LINK_DTYPE per link, source and target are node indexes.
+        """
+        n_nodes = len(nodes)
+        if len(node_ids) != n_nodes:
+            raise ValueError(f"{len(node_ids)} ids for {n_nodes} nodes")
+        if len(links) and (
+            min(links["source"].min(), links["target"].min()) < 0
+            or max(links["source"].max(), links["target"].max()) >= n_nodes
+        ):
+            raise ValueError(f"Links refer to nodes outside of 0 to {n_nodes - 1}")
+        id_data, id_offsets, id_order = _encode_ids(node_ids)
+        node_profiles, node_codes = _profiles(nodes, _NODE_PROFILE_FIELDS)
+        compact_nodes = np.empty(
+            n_nodes, dtype=[("code", node_codes.dtype), ("x", np.float64), ("y", np.float64), ("z", np.float64)]
+        )
+        compact_nodes["code"] = node_codes
+        for axis in ("x", "y", "z"):
+            compact_nodes[axis] = nodes[axis]
+        by_source = np.argsort(links["source"], kind="stable")
+        link_profiles, link_codes = _profiles(links[by_source], _LINK_PROFILE_FIELDS)
+        link_offsets = np.zeros(n_nodes + 1, dtype=_index_dtype(len(links)))
+        np.cumsum(np.bincount(links["source"], minlength=n_nodes), out=link_offsets[1:])
+        return cls(
+            nodes=_read_only(compact_nodes),
+            node_profiles=_read_only(node_profiles),
+            link_targets=_read_only(links["target"][by_source].astype(_index_dtype(n_nodes))),
+            link_codes=_read_only(link_codes),
+            link_profiles=_read_only(link_profiles),
+            link_offsets=_read_only(link_offsets),
+            id_data=id_data,
+            id_offsets=id_offsets,
+            id_order=id_order,
+        )
+
+    @classmethod
+    def from_state_network(cls, network: StateNetwork) -> "CompactStateNetwork":
+        all_nodes = network.all_nodes
+        nodes = np.array(
+            [
+                (node.node_type.value, *_xyz(node.coordinates), node.capacity, node.length, node.max_speed)
+                for node in all_nodes
+            ],
+            dtype=NODE_DTYPE,
+        )
+        links = np.array(
+            [(s, t, link.link_type.value, link.max_speed) for (s, t), link in network.link_by_tuple_iterator()],
+            dtype=LINK_DTYPE,
+        )
+        return cls.from_arrays([node.id for node in all_nodes], nodes, links)
+
+    def to_state_network(self, node_indexes: Iterable[NodeIndex] | None = None) -> StateNetwork:
+        """The nodes of `node_indexes`, all by default, and the links between them as a StateNetwork."""
+        if node_indexes is None:
+            selected = np.arange(self.n_count)
+        else:
+            selected = np.unique(np.fromiter(node_indexes, dtype=np.int64))
+        is_selected = np.zeros(self.n_count, dtype=bool)
+        is_selected[selected] = True
+        sources = self._link_sources()
+        kept = np.flatnonzero(is_selected[sources] & is_selected[self._link_targets])
+        links = [
+            (self.link_end_node_id_pair_by_index(LinkIndex(int(i))), self._links_by_code[code])
+            for i, code in zip(kept.tolist(), self._link_codes[kept].tolist())
+        ]
+        return StateNetwork.create_new(self.nodes_by_indexes(selected.tolist()), links)
+
+    def node_array(self) -> np.ndarray:
+        """All nodes as NODE_DTYPE rows, for vectorized processing without node objects."""
+        nodes = np.empty(self.n_count, dtype=NODE_DTYPE)
+        for axis in ("x", "y", "z"):
+            nodes[axis] = self._nodes[axis]
+        profiles = self._node_profiles[self._nodes["code"]]
+        for field in _NODE_PROFILE_FIELDS:
+            nodes[field] = profiles[field]
+        return nodes
+
+    def link_array(self) -> np.ndarray:
+        """All links as LINK_DTYPE rows in order of their index."""
+        links = np.empty(self.l_count, dtype=LINK_DTYPE)
+        links["source"] = self._link_sources()
+        links["target"] = self._link_targets
+        profiles = self._link_profiles[self._link_codes]
+        for field in _LINK_PROFILE_FIELDS:
+            links[field] = profiles[field]
+        return links
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored arrays and ids in bytes, the lazily built index of incoming links included."""
+        arrays = [
+            self._nodes,
+            self._node_profiles,
+            self._link_targets,
+            self._link_codes,
+            self._link_profiles,
+            self._link_offsets,
+            self._id_offsets,
+            self._id_order,
+            *(self._in_index or ()),
+        ]
+        return sum(array.nbytes for array in arrays) + len(self._id_data)
+
+    @property
+    def n_count(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def l_count(self) -> int:
+        return len(self._link_targets)
+
+    @property
+    def node_ids(self) -> list[NodeId]:
+        return [self.node_name_by_index(NodeIndex(i)) for i in range(self.n_count)]
+
+    @property
+    def end_node_id_pair_iterator(self) -> Iterator[EndNodeIdPair]:
+        return (
+            EndNodeIdPair((self.node_name_by_index(s), self.node_name_by_index(t))) for s, t in self.edge_tuple_iterator
+        )
+
+    @property
+    def edge_tuple_iterator(self) -> Iterator[tuple[NodeIndex, NodeIndex]]:
+        return zip(self._link_sources().tolist(), self._link_targets.tolist())
+
+    @property
+    def all_links(self) -> list[StateLink]:
+        return [self._links_by_code[code] for code in self._link_codes.tolist()]
+
+    @property
+    def all_nodes(self) -> list[StateNode]:
+        return self.nodes_by_indexes(range(self.n_count))
+
+    @property
+    def shallow_copy(self) -> "CompactStateNetwork":
+        # the arrays are read-only, so the copy can share them
+        return self.__class__(
+            self._nodes,
+            self._node_profiles,
+            self._link_targets,
+            self._link_codes,
+            self._link_profiles,
+            self._link_offsets,
+            self._id_data,
+            self._id_offsets,
+            self._id_order,
+        )
+
+    def node_index_by_name(self, node_name: NodeId) -> NodeIndex:
+        encoded = node_name.encode()
+        position = bisect_left(self._id_order, encoded, key=self._encoded_id)
+        if position == self.n_count or self._encoded_id(self._id_order[position]) != encoded:
+            raise ValueError(f"No node with id {node_name}")
+        return NodeIndex(int(self._id_order[position]))
+
+    def node_name_by_index(self, node_index: NodeIndex) -> NodeId:
+        return NodeId(self._encoded_id(node_index).decode())
+
+    def node_by_index(self, node_index: NodeIndex) -> StateNode:
+        return self.nodes_by_indexes((node_index,))[0]
+
+    def node_by_id(self, n_id: NodeId) -> StateNode:
+        return self.node_by_index(self.node_index_by_name(n_id))
+
+    def nodes_by_indexes(self, indexes: Iterable[NodeIndex]) -> list[StateNode]:
+        indexes = indexes if isinstance(indexes, range) else np.fromiter(indexes, dtype=np.int64)
+        rows = self._nodes[indexes].tolist()
+        profiles = self._node_profile_values
+        return [
+            StateNode(
+                node_type=profiles[code][0],
+                coordinates=ThreeDCoordinates(x, y, z),
+                id=self.node_name_by_index(i),
+                capacity=profiles[code][1],
+                length=profiles[code][2],
+                max_speed=profiles[code][3],
+            )
+            for i, (code, x, y, z) in zip(indexes, rows)
+        ]
+
+    def nodes_by_names(self, names: Iterable[NodeId]) -> list[StateNode]:
+        return self.nodes_by_indexes(sorted(self.node_index_by_name(name) for name in names))
+
+    def link_index_by_source_target(self, source: NodeId | NodeIndex, target: NodeId | NodeIndex) -> LinkIndex:
+        source, target = self._index(source), self._index(target)
+        start, stop = self._link_offsets[source], self._link_offsets[source + 1]
+        matches = np.flatnonzero(self._link_targets[start:stop] == target)
+        if not len(matches):
+            raise ValueError(f"No link from {source} to {target}")
+        return LinkIndex(int(start + matches[0]))
+
+    def link_source_target_by_index(self, idx: LinkIndex) -> tuple[NodeIndex, NodeIndex]:
+        source = int(np.searchsorted(self._link_offsets, idx, side="right")) - 1
+        return NodeIndex(source), NodeIndex(int(self._link_targets[idx]))
+
+    def link_index_by_end_node_id_pair(self, end_nodes: EndNodeIdPair) -> LinkIndex:
+        return self.link_index_by_source_target(end_nodes[0], end_nodes[1])
+
+    def link_by_index(self, idx: LinkIndex) -> StateLink:
+        return self._links_by_code[self._link_codes[idx]]
+
+    def links_by_indexes(self, indexes: Iterable[LinkIndex]) -> list[StateLink]:
+        return [self.link_by_index(i) for i in indexes]
+
+    def link_by_source_target(self, source_id: NodeId | NodeIndex, target_id: NodeId | NodeIndex) -> StateLink:
+        return self.link_by_index(self.link_index_by_source_target(source_id, target_id))
+
+    def link_by_end_node_id_pair(self, end_nodes: EndNodeIdPair) -> StateLink:
+        return self.link_by_index(self.link_index_by_source_target(end_nodes[0], end_nodes[1]))
+
+    def link_end_node_id_pair_by_index(self, index: LinkIndex) -> EndNodeIdPair:
+        source, target = self.link_source_target_by_index(index)
+        return EndNodeIdPair((self.node_name_by_index(source), self.node_name_by_index(target)))
+
+    def link_by_end_node_iterator(self) -> Iterator[tuple[EndNodeIdPair, StateLink]]:
+        return zip(self.end_node_id_pair_iterator, self.all_links)
+
+    def link_by_tuple_iterator(self) -> Iterator[tuple[tuple[NodeIndex, NodeIndex], StateLink]]:
+        return zip(self.edge_tuple_iterator, self.all_links)
+
+    def in_degrees(self) -> list[int]:
+        return np.bincount(self._link_targets, minlength=self.n_count).tolist()
+
+    def out_degrees(self) -> list[int]:
+        return np.diff(self._link_offsets).tolist()
+
+    def degrees(self) -> list[int]:
+        return (np.bincount(self._link_targets, minlength=self.n_count) + np.diff(self._link_offsets)).tolist()
+
+    def incident_links_per_node(
+        self, idx: NodeId | NodeIndex, mode: Literal["in", "out", "all"] = "all"
+    ) -> list[StateLink]:
+        return self.links_by_indexes(self.incident_link_idx_per_node(idx, mode))
+
+    def incident_link_idx_per_node(
+        self, idx: NodeId | NodeIndex, mode: Literal["in", "out", "all"] = "all"
+    ) -> list[LinkIndex]:
+        idx = self._index(idx)
+        incident: list[LinkIndex] = []
+        if mode in ("out", "all"):
+            incident.extend(range(self._link_offsets[idx], self._link_offsets[idx + 1]))
+        if mode in ("in", "all"):
+            in_links, in_offsets = self._incoming()
+            incident.extend(in_links[in_offsets[idx] : in_offsets[idx + 1]].tolist())
+        return incident
+
+    def neighbors(self, idx: NodeId | NodeIndex, mode: Literal["in", "out", "all"] = "all") -> list[StateNode]:
+        idx = self._index(idx)
+        neighbors = []
+        if mode in ("out", "all"):
+            neighbors.append(self._link_targets[self._link_offsets[idx] : self._link_offsets[idx + 1]])
+        if mode in ("in", "all"):
+            in_links, in_offsets = self._incoming()
+            neighbors.append(self._link_sources(in_links[in_offsets[idx] : in_offsets[idx + 1]]))
+        # sorted by index like igraph, a node linked in both directions appears twice
+        return self.nodes_by_indexes(np.sort(np.concatenate(neighbors)).tolist())
+
+    def _index(self, idx: NodeId | NodeIndex) -> int:
+        return self.node_index_by_name(idx) if isinstance(idx, str) else int(idx)
+
+    def _encoded_id(self, node_index: int) -> bytes:
+        return self._id_data[self._id_offsets[node_index] : self._id_offsets[node_index + 1]]
+
+    def _link_sources(self, link_indexes: np.ndarray | None = None) -> np.ndarray:
+        if link_indexes is None:
+            return np.repeat(np.arange(self.n_count, dtype=self._link_targets.dtype), np.diff(self._link_offsets))
+        return np.searchsorted(self._link_offsets, link_indexes, side="right") - 1
+
+    def _incoming(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._in_index is None:
+            in_links = np.argsort(self._link_targets, kind="stable").astype(self._link_offsets.dtype)
+            in_offsets = np.zeros(self.n_count + 1, dtype=self._link_offsets.dtype)
+            np.cumsum(np.bincount(self._link_targets, minlength=self.n_count), out=in_offsets[1:])
+            self._in_index = (_read_only(in_links), _read_only(in_offsets))
+        return self._in_index
+
+
+def _encode_ids(node_ids: Sequence[str] | np.ndarray) -> tuple[bytes, np.ndarray, np.ndarray]:
+    encoded = [str(node_id).encode() for node_id in node_ids]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    id_data = b"".join(encoded)
+    id_offsets = np.zeros(len(encoded) + 1, dtype=_index_dtype(len(id_data)))
+    np.cumsum(lengths, out=id_offsets[1:])
+    id_order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=_index_dtype(len(encoded)))
+    duplicates = [encoded[a] for a, b in zip(id_order[:-1], id_order[1:]) if encoded[a] == encoded[b]]
+    if duplicates:
+        raise ValueError(f"Duplicate node ids {[d.decode() for d in duplicates[:5]]}")
+    return id_data, _read_only(id_offsets), _read_only(id_order)
+
+
+def _profiles(rows: np.ndarray, fields: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct combinations of `fields` and the code of every row into them."""
+    # a lexsort of the columns is much faster than np.unique on structured rows
+    order = np.lexsort([rows[field] for field in reversed(fields)])
+    first = np.ones(len(rows), dtype=bool)
+    for field in fields:
+        column = rows[field][order]
+        first[1:] &= column[1:] == column[:-1]
+    first[1:] = ~first[1:]
+    profiles = repack_fields(rows[order[first]][fields])
+    code_dtype = np.uint8 if len(profiles) <= 1 << 8 else np.uint16 if len(profiles) <= 1 << 16 else np.uint32
+    codes = np.empty(len(rows), dtype=code_dtype)
+    codes[order] = np.cumsum(first) - 1
+    return profiles, codes
+
+
+def _index_dtype(size: int) -> type:
+    return np.int32 if size < 1 << 31 else np.int64
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def _xyz(coordinates: ThreeDCoordinates) -> tuple[float, float, float]:
+    return coordinates.x, coordinates.y, coordinates.z
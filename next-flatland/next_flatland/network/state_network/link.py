@@ -1,3 +1,5 @@
+import math
+from dataclasses import dataclass
 from enum import unique
 
 from ugraph import BaseLinkType, LinkABC
@@ -11,5 +13,11 @@ class StateLinkType(BaseLinkType):
     TRANSITION = 3
 
 
+@dataclass(frozen=True, slots=True)
 class StateLink(LinkABC):
     link_type: StateLinkType
+    max_speed: float = math.inf  # speed limit when taking a TRANSITION, e.g. over a diverging switch
+
+    def __reduce__(self):
+        # plain arguments unpickle several times faster than the generic state of slots dataclasses
+        return type(self), (self.link_type, self.max_speed)
@@ -1,11 +1,16 @@
-from collections import defaultdict
+from typing import TYPE_CHECKING
 
-from ugraph import MutableNetworkABC, NodeIndex
+from ugraph import MutableNetworkABC
 
 from next_flatland.network.state_network.link import StateLink, StateLinkType
 from next_flatland.network.state_network.node import StateNode, StateNodeType
 from next_flatland.utils.result import Result
 
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from next_flatland.network.state_network.validation import TopologyViolation
+
 
 class StateNetwork(MutableNetworkABC[StateNode, StateLink, StateNodeType, StateLinkType]):
 
@@ -34,77 +39,15 @@ class StateNetwork(MutableNetworkABC[StateNode, StateLink, StateNodeType, StateL
         copied.delete_nodes_without_type(frozenset((StateNodeType.INFRASTRUCTURE, StateNodeType.AGENT)))
         return copied
 
-    def validate_topology(self) -> Result[bool, str]:
-        return _validate_topology(self)
+    def validate_topology(self, executor: "Executor | None" = None) -> Result[bool, list["TopologyViolation"]]:
+        """
+        Check the link types per node type and that every weak component is a simple DAG.
 
+        A failure holds every TopologyViolation found, not only the first message, and no debug plot is written
+        any more. To look at a violation, plot the nodes it names, e.g. by
+        `network.sub_network(violation.node_ids).debug_plot(file_name)`.
+        """
+        # numpy and the component batching are only loaded when a network is validated
+        from next_flatland.network.state_network.validation import validate_topology
 
-def _validate_topology(state_network: StateNetwork) -> Result[bool, str]:
-    outgoing_links = defaultdict(list)
-    incoming_links = defaultdict(list)
-    for (s, t), link in state_network.link_by_tuple_iterator():
-        outgoing_links[s].append(link)
-        incoming_links[t].append(link)
-    for i, node in enumerate(state_network.all_nodes):
-        i: NodeIndex
-        if node.node_type == StateNodeType.AGENT:
-            if len(incoming_links[i]) > 0:
-                return Result.from_failure(f"Agent node {i} has incoming links")
-            for link in outgoing_links[i]:
-                if link.link_type not in {
-                    StateLinkType.OCCUPATION,
-                    StateLinkType.RESERVATION,
-                }:
-                    return Result.from_failure(f"Agent node {i} has non-occupation link")
-            continue
-        if node.node_type == StateNodeType.RESOURCE:
-            if len(outgoing_links[i]) > 0:
-                return Result.from_failure(f"Resource node {i} has outgoing links")
-            for link in incoming_links[i]:
-                if link.link_type != StateLinkType.ALLOCATION:
-                    return Result.from_failure(f"Resource node {i} has non-occupation link")
-            continue
-        if node.node_type == StateNodeType.INFRASTRUCTURE:
-            for link in incoming_links[i]:
-                if link.link_type not in {
-                    StateLinkType.RESERVATION,
-                    StateLinkType.OCCUPATION,
-                    StateLinkType.TRANSITION,
-                }:
-                    return Result.from_failure(
-                        f"Infrastructure node {i} has a non allowed incoming link {link.link_type}"
-                    )
-            for link in outgoing_links[i]:
-                if link.link_type not in {
-                    StateLinkType.ALLOCATION,
-                    StateLinkType.TRANSITION,
-                }:
-                    return Result.from_failure(
-                        f"Infrastructure node {i} has a non allowed outgoing link {link.link_type}"
-                    )
-            continue
-        return Result.from_failure(f"Node {i} has an unknown type {node.node_type}")
-    infra_only = state_network.reduce_to_transition_network()
-    for component in infra_only.weak_components():
-        if not component.underlying_digraph.is_dag():
-            component.debug_plot(
-                file_name=f"inconsistent_infra.png",
-            )
-            return Result.from_failure(f"Infrastructure component {component} is not a DAG")
-        if not component.underlying_digraph.is_simple():
-            component.debug_plot(
-                file_name=f"inconsistent_infra.png",
-            )
-            return Result.from_failure(f"Infrastructure component {component} has more than one node")
-    except_transitions = state_network.shallow_copy
-    for component in except_transitions.weak_components():
-        if not component.underlying_digraph.is_dag():
-            component.debug_plot(
-                file_name=f"inconsistent_transitions.png",
-            )
-            return Result.from_failure(f"Component {component} is not a DAG")
-        if not component.underlying_digraph.is_simple():
-            component.debug_plot(
-                file_name=f"inconsistent_transitions.png",
-            )
-            return Result.from_failure(f"Component {component} has more than one node")
-    return Result.from_success(True)
+        return validate_topology(self, executor)
@@ -1,3 +1,5 @@
+import math
+from dataclasses import dataclass
 from enum import unique
 
 from ugraph import BaseNodeType, NodeABC, NodeId, ThreeDCoordinates
@@ -10,7 +12,47 @@ class StateNodeType(BaseNodeType):
     AGENT = 2
 
 
+@dataclass(frozen=True, slots=True)
 class StateNode(NodeABC):
     node_type: StateNodeType
     coordinates: ThreeDCoordinates
     id: NodeId
+    capacity: int = 1  # number of agents a RESOURCE node can be allocated to at the same time
+    length: float = 0.0  # travel distance through an INFRASTRUCTURE node
+    max_speed: float = math.inf  # speed limit on an INFRASTRUCTURE node
+
+    def __reduce__(self):
+        # plain arguments unpickle several times faster than the generic state of slots dataclasses
+        c = self.coordinates
+        return _restore_node, (
+            type(self),
+            self.node_type,
+            c.x,
+            c.y,
+            c.z,
+            self.id,
+            self.capacity,
+            self.length,
+            self.max_speed,
+        )
+
+
+def _restore_node(
+    cls: type[StateNode],
+    node_type: StateNodeType,
+    x: float,
+    y: float,
+    z: float,
+    node_id: NodeId,
+    capacity: int,
+    length: float,
+    max_speed: float,
+) -> StateNode:
+    return cls(
+        node_type=node_type,
+        coordinates=ThreeDCoordinates(x, y, z),
+        id=node_id,
+        capacity=capacity,
+        length=length,
+        max_speed=max_speed,
+    )
@@ -0,0 +1,229 @@
+from collections import Counter, defaultdict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+
+COUNT_DTYPE = np.int32
+
+
+@dataclass(frozen=True, eq=False)
+class ResourceLayout:
+    """The static part of a ResourceOccupancy: resources of every infrastructure node and their capacities."""
+
+    # written once per checkpoint directory instead of into every checkpoint
+    checkpoint_static = True
+
+    resources_by_infrastructure: dict[NodeId, tuple[NodeId, ...]]
+    index_by_resource: dict[NodeId, int]
+    capacities: np.ndarray
+
+
+class ResourceOccupancy:
+    """
+    Incrementally maintained occupancy counters of the resource layer of a StateNetwork.
+
+    The mapping from infrastructure nodes to the resources they allocate and the resource capacities are
+    read once from the network. Afterwards every occupy/release only touches the resources of a single
+    infrastructure node, so checking a resource with a large capacity costs the same as checking a
+    single track. An agent standing on several infrastructure nodes of the same resource counts once.
+
+    The counters are kept in a NumPy array indexed by `resource_index`, which can be moved into shared
+    memory to be read by worker processes. Pickling keeps only the holdings of the agents besides the
+    static ResourceLayout, the counters are rebuilt from them.
+    """
+
+    def __init__(
+        self,
+        resources_by_infrastructure: Mapping[NodeId, tuple[NodeId, ...]],
+        capacity_by_resource: Mapping[NodeId, int],
+    ):
+        self._set_layout(
+            ResourceLayout(
+                resources_by_infrastructure=dict(resources_by_infrastructure),
+                index_by_resource={resource_id: i for i, resource_id in enumerate(capacity_by_resource)},
+                capacities=np.array(list(capacity_by_resource.values()), dtype=COUNT_DTYPE),
+            )
+        )
+        self._counts = np.zeros_like(self._capacities)
+        self._holdings_by_agent: defaultdict[NodeId, Counter[NodeId]] = defaultdict(Counter)
+        self._shared: SharedMemory | None = None
+        # called with (resource, +1/-1) whenever the number of agents on a resource changes
+        self.listeners: list[Callable[[NodeId, int], None]] = []
+
+    def _set_layout(self, layout: ResourceLayout) -> None:
+        self.layout = layout
+        self._resources_by_infrastructure = layout.resources_by_infrastructure
+        self._index_by_resource = layout.index_by_resource
+        self._capacities = layout.capacities
+
+    def __getstate__(self) -> dict:
+        holdings = {agent_id: +holdings for agent_id, holdings in self._holdings_by_agent.items()}
+        return {
+            "layout": self.layout,
+            "holdings": {agent_id: h for agent_id, h in holdings.items() if h},
+            "listeners": self.listeners,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self._set_layout(state["layout"])
+        self._holdings_by_agent = defaultdict(Counter, state["holdings"])
+        self._counts = np.zeros_like(self._capacities)
+        for holdings in self._holdings_by_agent.values():
+            for resource_id in holdings:
+                self._counts[self._index_by_resource[resource_id]] += 1
+        self._shared = None
+        self.listeners = state["listeners"]
+
+    @classmethod
+    def from_state_network(cls, state: StateNetwork) -> "ResourceOccupancy":
+        nodes = state.all_nodes
+        resources_by_infrastructure: defaultdict[NodeId, list[NodeId]] = defaultdict(list)
+        occupations: list[tuple[NodeId, NodeId]] = []
+        for (s, t), link in state.link_by_tuple_iterator():
+            if link.link_type == StateLinkType.ALLOCATION:
+                resources_by_infrastructure[nodes[s].id].append(nodes[t].id)
+            elif link.link_type == StateLinkType.OCCUPATION:
+                occupations.append((nodes[s].id, nodes[t].id))
+        occupancy = cls(
+            {infra_id: tuple(resources) for infra_id, resources in resources_by_infrastructure.items()},
+            {node.id: node.capacity for node in nodes if node.node_type == StateNodeType.RESOURCE},
+        )
+        for agent_id, infrastructure_id in occupations:
+            occupancy.occupy(agent_id, infrastructure_id)
+        return occupancy
+
+    @classmethod
+    def reading_shared_counts(cls, layout: ResourceLayout, shared_counts_name: str) -> "ResourceOccupancy":
+        """
+        Replica of an occupancy with the given layout that reads the counters shared by its `share_counts`,
+        e.g. in a worker process. The replica knows the holdings passed to `replace_holdings` only.
+        """
+        occupancy = cls.__new__(cls)
+        occupancy._set_layout(layout)
+        occupancy._holdings_by_agent = defaultdict(Counter)
+        occupancy._shared = None
+        occupancy._attached, occupancy._counts = attach_shared_counts(shared_counts_name, len(layout.capacities))
+        occupancy.listeners = []
+        return occupancy
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts
+
+    @property
+    def capacities(self) -> np.ndarray:
+        return self._capacities
+
+    @property
+    def resource_ids(self) -> list[NodeId]:
+        return list(self._index_by_resource)
+
+    def resource_index(self, resource_id: NodeId) -> int:
+        return self._index_by_resource[resource_id]
+
+    def resources_of(self, infrastructure_id: NodeId) -> tuple[NodeId, ...]:
+        return self._resources_by_infrastructure.get(infrastructure_id, ())
+
+    def capacity(self, resource_id: NodeId) -> int:
+        return int(self._capacities[self._index_by_resource[resource_id]])
+
+    def count(self, resource_id: NodeId) -> int:
+        return int(self._counts[self._index_by_resource[resource_id]])
+
+    def holds(self, agent_id: NodeId, resource_id: NodeId) -> bool:
+        return self._holdings_by_agent[agent_id][resource_id] > 0
+
+    def holdings_of(self, agent_id: NodeId) -> Counter[NodeId]:
+        """Number of occupied infrastructure nodes of `agent_id` per held resource."""
+        return +self._holdings_by_agent[agent_id]
+
+    def replace_holdings(self, holdings_by_agent: Mapping[NodeId, Mapping[NodeId, int]]) -> None:
+        """Replace the holdings of all agents without touching the counters, for replicas only."""
+        self._holdings_by_agent = defaultdict(Counter, {a: Counter(h) for a, h in holdings_by_agent.items()})
+
+    def claims(self, agent_id: NodeId, infrastructure_id: NodeId) -> list[NodeId]:
+        """Resources of `infrastructure_id` that `agent_id` would newly occupy by moving there."""
+        holdings = self._holdings_by_agent[agent_id]
+        return [resource_id for resource_id in self.resources_of(infrastructure_id) if holdings[resource_id] == 0]
+
+    def blocking_resources(
+        self,
+        agent_id: NodeId,
+        infrastructure_id: NodeId,
+        pending: Mapping[NodeId, int] | None = None,
+    ) -> list[NodeId]:
+        """
+        Resources of `infrastructure_id` that have no free capacity left for `agent_id`.
+
+        Args:
+            agent_id (NodeId): The agent that wants to occupy the infrastructure node.
+            infrastructure_id (NodeId): The infrastructure node to occupy.
+            pending (Mapping[NodeId, int] | None): Additional occupations per resource that were already
+                granted but are not yet propagated, e.g. accepted moves of the same step.
+
+        Returns:
+            list[NodeId]: The full resources, empty if the agent can occupy the infrastructure node.
+        """
+        blocking = []
+        for resource_id in self.claims(agent_id, infrastructure_id):
+            i = self._index_by_resource[resource_id]
+            used = self._counts[i] + (pending.get(resource_id, 0) if pending else 0)
+            if used >= self._capacities[i]:
+                blocking.append(resource_id)
+        return blocking
+
+    def occupy(self, agent_id: NodeId, infrastructure_id: NodeId) -> None:
+        holdings = self._holdings_by_agent[agent_id]
+        for resource_id in self.resources_of(infrastructure_id):
+            if holdings[resource_id] == 0:
+                self._counts[self._index_by_resource[resource_id]] += 1
+                for listener in self.listeners:
+                    listener(resource_id, 1)
+            holdings[resource_id] += 1
+
+    def release(self, agent_id: NodeId, infrastructure_id: NodeId) -> None:
+        holdings = self._holdings_by_agent[agent_id]
+        for resource_id in self.resources_of(infrastructure_id):
+            if holdings[resource_id] == 0:
+                raise ValueError(f"Agent {agent_id} does not hold resource {resource_id}")
+            holdings[resource_id] -= 1
+            if holdings[resource_id] == 0:
+                self._counts[self._index_by_resource[resource_id]] -= 1
+                for listener in self.listeners:
+                    listener(resource_id, -1)
+
+    def share_counts(self) -> str:
+        """
+        Move the counters into a new shared memory block, so worker processes can read them through
+        `attach_shared_counts`. Returns the name of the block, which lives until `unshare_counts`.
+        """
+        if self._shared is not None:
+            return self._shared.name
+        self._shared = SharedMemory(create=True, size=max(self._counts.nbytes, 1))
+        counts = np.ndarray(self._counts.shape, dtype=COUNT_DTYPE, buffer=self._shared.buf)
+        counts[:] = self._counts
+        self._counts = counts
+        return self._shared.name
+
+    def unshare_counts(self) -> None:
+        if self._shared is None:
+            return
+        self._counts = self._counts.copy()
+        self._shared.close()
+        self._shared.unlink()
+        self._shared = None
+
+
+def attach_shared_counts(name: str, n_resources: int) -> tuple[SharedMemory, np.ndarray]:
+    """Read-only view on counters shared by `ResourceOccupancy.share_counts`, keep the block referenced."""
+    shared = SharedMemory(name=name)
+    counts = np.ndarray((n_resources,), dtype=COUNT_DTYPE, buffer=shared.buf)
+    counts.flags.writeable = False
+    return shared, counts
@@ -0,0 +1,108 @@
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+import igraph
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+
+BOUNDARY = -1
+
+
+@dataclass(frozen=True)
+class NetworkPartition:
+    """
+    Assignment of the resources of a StateNetwork to regions.
+
+    A resource is a boundary resource if it shares an infrastructure node with, or has a transition
+    to or from, a resource of another region. Moves onto infrastructure nodes whose resources are all
+    interior resources of one region can only conflict with moves of the same region.
+    """
+
+    # written once per checkpoint directory instead of into every checkpoint
+    checkpoint_static = True
+
+    region_by_resource: Mapping[NodeId, int]
+    boundary_resources: frozenset[NodeId]
+    n_regions: int
+
+    def region_of(self, resource_ids: Iterable[NodeId]) -> int:
+        """Region all `resource_ids` are interior resources of, BOUNDARY otherwise."""
+        region = BOUNDARY
+        for resource_id in resource_ids:
+            if resource_id in self.boundary_resources:
+                return BOUNDARY
+            if region == BOUNDARY:
+                region = self.region_by_resource[resource_id]
+            elif region != self.region_by_resource[resource_id]:
+                return BOUNDARY
+        return region
+
+
+def partition_state_network(state: StateNetwork, max_region_size: int | None = None) -> NetworkPartition:
+    """
+    Partition the resource layer of `state` into regions.
+
+    Resources are connected if they are allocated by the same infrastructure node or if there is a
+    transition between infrastructure nodes allocating them. Every weak component of this resource
+    graph becomes a region. Components with more than `max_region_size` resources are cut into chunks
+    of consecutive resources in breadth-first order, which keeps the regions spatially compact.
+
+    Args:
+        state (StateNetwork): The network to partition.
+        max_region_size (int | None): Maximal number of resources per region, unlimited if None.
+
+    Returns:
+        NetworkPartition: The regions and boundary resources.
+    """
+    resource_graph = _resource_graph(state)
+    resource_ids: list[NodeId] = resource_graph.vs["name"] if resource_graph.vcount() > 0 else []
+    region_by_index = [BOUNDARY] * resource_graph.vcount()
+    n_regions = 0
+    for component in resource_graph.connected_components(mode="weak"):
+        if max_region_size is None or len(component) <= max_region_size:
+            for i in component:
+                region_by_index[i] = n_regions
+            n_regions += 1
+            continue
+        for chunk_start, i in enumerate(resource_graph.bfs(component[0])[0]):
+            region_by_index[i] = n_regions + chunk_start // max_region_size
+        n_regions += -(-len(component) // max_region_size)
+
+    boundary = set()
+    for s, t in resource_graph.get_edgelist():
+        if region_by_index[s] != region_by_index[t]:
+            boundary.update((resource_ids[s], resource_ids[t]))
+    return NetworkPartition(
+        region_by_resource=dict(zip(resource_ids, region_by_index)),
+        boundary_resources=frozenset(boundary),
+        n_regions=n_regions,
+    )
+
+
+def _resource_graph(state: StateNetwork) -> igraph.Graph:
+    nodes = state.all_nodes
+    resources_by_infra: dict[int, list[int]] = {}
+    transitions: list[tuple[int, int]] = []
+    for (s, t), link in state.link_by_tuple_iterator():
+        if link.link_type == StateLinkType.ALLOCATION:
+            resources_by_infra.setdefault(s, []).append(t)
+        elif link.link_type == StateLinkType.TRANSITION:
+            transitions.append((s, t))
+
+    resource_indexes = sorted({r for resources in resources_by_infra.values() for r in resources})
+    position = {r: i for i, r in enumerate(resource_indexes)}
+    edges = set()
+    for resources in resources_by_infra.values():
+        for a, b in zip(resources, resources[1:]):
+            edges.add((position[a], position[b]))
+    for s, t in transitions:
+        for a in resources_by_infra.get(s, ()):
+            for b in resources_by_infra.get(t, ()):
+                if a != b:
+                    edges.add((position[a], position[b]))
+
+    graph = igraph.Graph(n=len(resource_indexes), edges=sorted(edges), directed=False)
+    graph.vs["name"] = [nodes[r].id for r in resource_indexes]
+    return graph
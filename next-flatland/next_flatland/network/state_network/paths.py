@@ -0,0 +1,157 @@
+import math
+import warnings
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+
+import igraph
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+
+RouteKey = tuple[NodeId, NodeId]
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    infrastructure: tuple[NodeId, ...]  # from source to target, both included
+    cost: float
+
+
+@dataclass(slots=True)
+class _CacheEntry:
+    routes: list[Route]
+    vertices: set[int]  # transition graph vertices on any of the routes
+    blocked: frozenset[NodeId]  # resources blocked when the routes were computed
+
+
+class PathService:
+    """
+    The k shortest simple routes between infrastructure nodes of a StateNetwork, e.g. the alternatives of
+    an agent for rerouting or for a graph observation.
+
+    Routes are computed on the TRANSITION links with Yen's algorithm and kept in an LRU cache per
+    (source, target). Blocking a resource excludes entering its infrastructure nodes from all later routes.
+    Only the cached entries that pass through the resource are dropped on blocking, and on release only the
+    entries that were computed while it was blocked, all others stay valid. Build the service on the network
+    of a CollapsedNetwork to search over macro edges instead of single infrastructure nodes.
+    """
+
+    def __init__(self, network: StateNetwork, k: int = 4, max_entries: int = 10_000, use_length: bool = False):
+        """
+        Args:
+            network (StateNetwork): Network with infrastructure and resource nodes, agents are ignored.
+            k (int): Number of routes per (source, target).
+            max_entries (int): Number of cached (source, target) pairs, the least recently used is evicted.
+            use_length (bool): Cost of a route is the length of the entered infrastructure nodes instead of
+                the number of transitions.
+        """
+        self.k = k
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        nodes = network.all_nodes
+        infrastructure = [i for i, node in enumerate(nodes) if node.node_type == StateNodeType.INFRASTRUCTURE]
+        vertex_of = {node_index: vertex for vertex, node_index in enumerate(infrastructure)}
+        self._infra_ids = [nodes[i].id for i in infrastructure]
+        self._vertex_by_id = {infra_id: vertex for vertex, infra_id in enumerate(self._infra_ids)}
+        edges: list[tuple[int, int]] = []
+        self._vertices_by_resource: defaultdict[NodeId, list[int]] = defaultdict(list)
+        self._resources_by_vertex: defaultdict[int, list[NodeId]] = defaultdict(list)
+        for (s, t), link in network.link_by_tuple_iterator():
+            if link.link_type == StateLinkType.TRANSITION:
+                edges.append((vertex_of[s], vertex_of[t]))
+            elif link.link_type == StateLinkType.ALLOCATION:
+                self._vertices_by_resource[nodes[t].id].append(vertex_of[s])
+                self._resources_by_vertex[vertex_of[s]].append(nodes[t].id)
+        self._graph = igraph.Graph(n=len(infrastructure), edges=edges, directed=True)
+        self._costs = [nodes[infrastructure[t]].length if use_length else 1.0 for _, t in edges]
+        self._graph.es["weight"] = self._costs
+        self._blocked: set[NodeId] = set()
+        self._cache: OrderedDict[RouteKey, _CacheEntry] = OrderedDict()
+        self._keys_by_vertex: defaultdict[int, set[RouteKey]] = defaultdict(set)
+        self._keys_by_blocked: defaultdict[NodeId, set[RouteKey]] = defaultdict(set)
+
+    @property
+    def blocked(self) -> frozenset[NodeId]:
+        return frozenset(self._blocked)
+
+    def routes(self, source: NodeId, target: NodeId) -> list[Route]:
+        """Up to `k` routes from `source` to `target` avoiding blocked resources, shortest first."""
+        key = (source, target)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return entry.routes
+        self.misses += 1
+        entry = self._compute(source, target)
+        self._cache[key] = entry
+        for vertex in entry.vertices:
+            self._keys_by_vertex[vertex].add(key)
+        for resource_id in entry.blocked:
+            self._keys_by_blocked[resource_id].add(key)
+        if len(self._cache) > self.max_entries:
+            self._invalidate(next(iter(self._cache)))
+        return entry.routes
+
+    def block(self, resource_id: NodeId) -> None:
+        """Exclude the infrastructure nodes of `resource_id` from all routes until it is released."""
+        if resource_id in self._blocked:
+            return
+        self._blocked.add(resource_id)
+        vertices = self._vertices_by_resource.get(resource_id, [])
+        self._set_entering_costs(vertices, blocked=True)
+        for key in {key for vertex in vertices for key in self._keys_by_vertex.get(vertex, ())}:
+            self._invalidate(key)
+
+    def release(self, resource_id: NodeId) -> None:
+        if resource_id not in self._blocked:
+            return
+        self._blocked.discard(resource_id)
+        vertices = self._vertices_by_resource.get(resource_id, [])
+        # nodes allocating another blocked resource stay excluded
+        vertices = [v for v in vertices if not any(r in self._blocked for r in self._resources_by_vertex[v])]
+        self._set_entering_costs(vertices, blocked=False)
+        for key in list(self._keys_by_blocked.pop(resource_id, ())):
+            self._invalidate(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._keys_by_vertex.clear()
+        self._keys_by_blocked.clear()
+
+    def _compute(self, source: NodeId, target: NodeId) -> _CacheEntry:
+        with warnings.catch_warnings():
+            # igraph warns about every unreachable target, which is a valid answer here
+            warnings.simplefilter("ignore", RuntimeWarning)
+            paths = self._graph.get_k_shortest_paths(
+                self._vertex_by_id[source], self._vertex_by_id[target], k=self.k, weights="weight", output="epath"
+            )
+        routes: list[Route] = []
+        vertices: set[int] = set()
+        for path in paths:
+            route_vertices = [self._vertex_by_id[source]] + [self._graph.es[e].target for e in path]
+            vertices.update(route_vertices)
+            routes.append(
+                Route(
+                    infrastructure=tuple(self._infra_ids[v] for v in route_vertices),
+                    cost=float(sum(self._costs[e] for e in path)),
+                )
+            )
+        return _CacheEntry(routes=routes, vertices=vertices, blocked=frozenset(self._blocked))
+
+    def _set_entering_costs(self, vertices: list[int], blocked: bool) -> None:
+        edges = self._graph.es.select(_target_in=vertices)
+        # edges with infinite weight are ignored by the shortest path search
+        edges["weight"] = [math.inf] * len(edges) if blocked else [self._costs[edge.index] for edge in edges]
+
+    def _invalidate(self, key: RouteKey) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return
+        for vertex in entry.vertices:
+            self._keys_by_vertex[vertex].discard(key)
+        for resource_id in entry.blocked:
+            self._keys_by_blocked[resource_id].discard(key)
@@ -0,0 +1,233 @@
+import shutil
+import struct
+import subprocess
+import zlib
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+
+import numpy as np
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+
+RGB = tuple[int, int, int]
+
+BACKGROUND_COLOR: RGB = (255, 255, 255)
+TRANSITION_COLOR: RGB = (0, 0, 255)
+INFRASTRUCTURE_COLOR: RGB = (0, 0, 160)
+AGENT_COLORS: tuple[RGB, ...] = (
+    (128, 0, 128),
+    (230, 25, 75),
+    (60, 180, 75),
+    (245, 130, 48),
+    (70, 240, 240),
+    (240, 50, 230),
+    (128, 128, 0),
+    (0, 128, 128),
+)
+
+
+class RasterRenderer:
+    """
+    Headless 2D renderer of the infrastructure layer of a StateNetwork into NumPy RGB frames.
+
+    The infrastructure nodes are projected to the x/y plane of their ThreeDCoordinates and the
+    transitions are rasterized once into a cached background. A frame only copies the background and
+    draws one marker per agent, so long episodes can be rendered at hundreds of frames per second.
+    """
+
+    def __init__(
+        self,
+        network: StateNetwork,
+        width: int = 1280,
+        height: int = 720,
+        margin: int = 20,
+        marker_radius: int = 4,
+    ):
+        self.width = width
+        self.height = height
+        self.marker_radius = marker_radius
+        nodes = network.all_nodes
+        infrastructure = [i for i, node in enumerate(nodes) if node.node_type == StateNodeType.INFRASTRUCTURE]
+        xy = np.array([(nodes[i].coordinates.x, nodes[i].coordinates.y) for i in infrastructure], dtype=float)
+        pixels = _project(xy.reshape(-1, 2), width, height, margin)
+        self._pixel_by_infrastructure: dict[NodeId, tuple[int, int]] = {
+            nodes[i].id: (int(column), int(row)) for i, (column, row) in zip(infrastructure, pixels)
+        }
+        position = {node_index: k for k, node_index in enumerate(infrastructure)}
+        transitions = np.array(
+            [
+                (position[s], position[t])
+                for (s, t), link in network.link_by_tuple_iterator()
+                if link.link_type == StateLinkType.TRANSITION
+            ],
+            dtype=int,
+        ).reshape(-1, 2)
+        self._background = self._rasterize_background(pixels, transitions)
+        marker = np.arange(-marker_radius, marker_radius + 1)
+        self._marker_rows, self._marker_columns = (offsets.ravel() for offsets in np.meshgrid(marker, marker))
+
+    @property
+    def background(self) -> np.ndarray:
+        return self._background
+
+    def pixel_of(self, infrastructure_id: NodeId) -> tuple[int, int]:
+        """Column and row of an infrastructure node in the frame."""
+        return self._pixel_by_infrastructure[infrastructure_id]
+
+    def render_positions(self, positions: Mapping[NodeId, NodeId]) -> np.ndarray:
+        """
+        Render a frame with a marker for every agent.
+
+        Args:
+            positions (Mapping[NodeId, NodeId]): Infrastructure node by agent, agents keep their color over
+                frames as long as the mapping keeps its order.
+
+        Returns:
+            np.ndarray: RGB frame of shape (height, width, 3).
+        """
+        frame = self._background.copy()
+        if not positions:
+            return frame
+        centers = np.array([self._pixel_by_infrastructure[infra_id] for infra_id in positions.values()], dtype=int)
+        colors = np.array(AGENT_COLORS, dtype=np.uint8)[np.arange(len(centers)) % len(AGENT_COLORS)]
+        columns = (centers[:, 0:1] + self._marker_columns).ravel()
+        rows = (centers[:, 1:2] + self._marker_rows).ravel()
+        inside = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+        frame[rows[inside], columns[inside]] = np.repeat(colors, len(self._marker_rows), axis=0)[inside]
+        return frame
+
+    def render(self, state: StateNetwork, agent_ids: Iterable[NodeId]) -> np.ndarray:
+        """Render the current occupation of `agent_ids` in `state`."""
+        return self.render_positions({agent_id: state.neighbors(agent_id, "out")[0].id for agent_id in agent_ids})
+
+    def _rasterize_background(self, pixels: np.ndarray, transitions: np.ndarray) -> np.ndarray:
+        background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        background[:] = BACKGROUND_COLOR
+        if len(transitions) > 0:
+            start, end = pixels[transitions[:, 0]], pixels[transitions[:, 1]]
+            steps = np.abs(end - start).max(axis=1) + 1
+            owner = np.repeat(np.arange(len(steps)), steps)
+            offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+            share = offsets / np.maximum(steps - 1, 1)[owner]
+            points = np.rint(start[owner] + (end - start)[owner] * share[:, None]).astype(int)
+            background[points[:, 1], points[:, 0]] = TRANSITION_COLOR
+        if len(pixels) > 0:
+            background[pixels[:, 1], pixels[:, 0]] = INFRASTRUCTURE_COLOR
+        return background
+
+
+def _project(xy: np.ndarray, width: int, height: int, margin: int) -> np.ndarray:
+    """Scale x/y coordinates into the frame keeping the aspect ratio, rows grow downwards."""
+    if len(xy) == 0:
+        return np.empty((0, 2), dtype=int)
+    low, high = xy.min(axis=0), xy.max(axis=0)
+    extent = np.where(high - low > 0, high - low, 1.0)
+    scale = min((width - 1 - 2 * margin) / extent[0], (height - 1 - 2 * margin) / extent[1])
+    pixels = np.rint((xy - low) * scale).astype(int) + margin
+    pixels[:, 1] = height - 1 - pixels[:, 1]
+    return pixels
+
+
+def write_ppm(path: Path | str, frame: np.ndarray) -> None:
+    """Write a frame as binary PPM, the cheapest format to write."""
+    with open(path, "wb") as file:
+        file.write(f"P6 {frame.shape[1]} {frame.shape[0]} 255\n".encode())
+        file.write(np.ascontiguousarray(frame).tobytes())
+
+
+def write_png(path: Path | str, frame: np.ndarray, compression_level: int = 1) -> None:
+    """Write a frame as PNG without any imaging library."""
+    height, width = frame.shape[:2]
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = frame.reshape(height, width * 3)
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression_level)))
+        file.write(chunk(b"IEND", b""))
+
+
+class ImageSequenceWriter:
+    """Write frames as numbered PNG or PPM files into a directory."""
+
+    def __init__(self, directory: Path | str, file_format: str = "png"):
+        if file_format not in ("png", "ppm"):
+            raise ValueError(f"Unknown image format {file_format}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.file_format = file_format
+        self.n_frames = 0
+
+    def write(self, frame: np.ndarray) -> None:
+        path = self.directory / f"frame_{self.n_frames:06d}.{self.file_format}"
+        (write_png if self.file_format == "png" else write_ppm)(path, frame)
+        self.n_frames += 1
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ImageSequenceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class VideoWriter:
+    """
+    Stream raw frames into an ffmpeg process, which has to be installed on the machine. Frames with an odd
+    width or height are padded to even dimensions for the yuv420p encoding.
+    """
+
+    def __init__(self, path: Path | str, width: int, height: int, fps: int = 25):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("Writing videos requires ffmpeg, use an ImageSequenceWriter instead")
+        self.n_frames = 0
+        self._process = subprocess.Popen(
+            [
+                ffmpeg,
+                "-loglevel",
+                "error",
+                "-y",
+                "-f",
+                "rawvideo",
+                "-pix_fmt",
+                "rgb24",
+                "-s",
+                f"{width}x{height}",
+                "-r",
+                str(fps),
+                "-i",
+                "-",
+                # yuv420p needs even dimensions, odd frames get a one pixel border
+                "-vf",
+                "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                "-pix_fmt",
+                "yuv420p",
+                str(path),
+            ],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        self.n_frames += 1
+
+    def close(self) -> None:
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with exit code {self._process.returncode}")
+
+    def __enter__(self) -> "VideoWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
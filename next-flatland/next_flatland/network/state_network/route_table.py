@@ -0,0 +1,106 @@
+from collections import Counter, defaultdict
+from collections.abc import Hashable, Iterable, Mapping
+
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from next_flatland.network.state_network.link import StateLink, StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNode, StateNodeType
+
+RESOURCE_Z = -50
+RESOURCE_DISTANCE = 20
+ENTRY_OFFSET = 10
+
+# (resource, entered from, continue to): a train on the resource that came from the second one may
+# continue to the third. Entering from the resource itself marks trains starting on it.
+Route = tuple[Hashable, Hashable, Hashable]
+
+
+def compile_route_table(
+    routes: Iterable[Route],
+    capacities: Mapping[Hashable, int] | None = None,
+    coordinates: Mapping[Hashable, tuple[float, float]] | None = None,
+) -> StateNetwork:
+    """
+    Compile a route based resource model, e.g. switch aware valid routes per resource, into a StateNetwork.
+
+    Every resource gets one infrastructure node per side it is entered from, sides continuing to the same
+    resources share a node, so a plain track has a forward and a backward node. A route becomes a transition
+    from the node of the resource entered from `entry` to the node of `exit` entered from the resource, so a
+    switch only allows the listed routes. Entering a resource from a side without routes ends the line there.
+    Duplicate routes are dropped and the network is built with a single bulk insert of nodes and links, the
+    cost is linear in the number of routes.
+
+    Args:
+        routes (Iterable[Route]): (resource, entered from, continue to) of hashable resource ids.
+        capacities (Mapping[Hashable, int] | None): Capacity by resource, 1 by default.
+        coordinates (Mapping[Hashable, tuple[float, float]] | None): Position by resource, by default the
+            resources are lined up in order of appearance.
+
+    Returns:
+        StateNetwork: Resource and infrastructure nodes with allocation and transition links, node ids are
+            built from the string of the resource ids, so a ValueError is raised if they collide, e.g. for
+            1 and "1".
+    """
+    capacities = capacities if capacities is not None else {}
+    resources: dict[Hashable, None] = {}
+    exits_by_entry: defaultdict[tuple[Hashable, Hashable], dict[Hashable, None]] = defaultdict(dict)
+    for resource, entry, exit_ in routes:
+        resources.update(((resource, None), (entry, None), (exit_, None)))
+        exits_by_entry[(resource, entry)][exit_] = None
+        exits_by_entry[(exit_, resource)]
+    # entries of a resource continuing to the same resources are interchangeable and share a node
+    entries: dict[tuple[Hashable, Hashable], NodeId] = {}
+    resource_by_entry_node: dict[NodeId, Hashable] = {}
+    entries_by_exits: dict[tuple[Hashable, frozenset], list[Hashable]] = {}
+    for (resource, entry), exits in exits_by_entry.items():
+        entries_by_exits.setdefault((resource, frozenset(exits)), []).append(entry)
+    for (resource, _), shared_entries in entries_by_exits.items():
+        infra_id = _entry_id(resource, shared_entries)
+        resource_by_entry_node[infra_id] = resource
+        entries.update(((resource, entry), infra_id) for entry in shared_entries)
+    transitions = {
+        EndNodeIdPair((entries[(resource, entry)], entries[(exit_, resource)])): None
+        for (resource, entry), exits in exits_by_entry.items()
+        for exit_ in exits
+    }
+
+    positions = {resource: (i * RESOURCE_DISTANCE, 0.0) for i, resource in enumerate(resources)}
+    if coordinates is not None:
+        positions.update(coordinates)
+    resource_ids = {resource: NodeId(str(resource)) for resource in resources}
+    nodes: list[StateNode] = [
+        StateNode(
+            id=resource_ids[resource],
+            coordinates=ThreeDCoordinates(x=positions[resource][0], y=positions[resource][1], z=RESOURCE_Z),
+            node_type=StateNodeType.RESOURCE,
+            capacity=capacities.get(resource, 1),
+        )
+        for resource in resources
+    ]
+    # links are immutable, all links of a type share one instance
+    allocation = StateLink(link_type=StateLinkType.ALLOCATION)
+    transition = StateLink(link_type=StateLinkType.TRANSITION)
+    links: list[tuple[EndNodeIdPair, StateLink]] = []
+    n_entries: dict[Hashable, int] = dict.fromkeys(resources, 0)
+    for infra_id, resource in resource_by_entry_node.items():
+        x, y = positions[resource]
+        nodes.append(
+            StateNode(
+                id=infra_id,
+                coordinates=ThreeDCoordinates(x=x, y=y + n_entries[resource] * ENTRY_OFFSET, z=0),
+                node_type=StateNodeType.INFRASTRUCTURE,
+            )
+        )
+        n_entries[resource] += 1
+        links.append((EndNodeIdPair((infra_id, resource_ids[resource])), allocation))
+    links.extend((end_nodes, transition) for end_nodes in transitions)
+    duplicates = [node_id for node_id, n in Counter(node.id for node in nodes).items() if n > 1]
+    if duplicates:
+        raise ValueError(f"Different resources or entries are named alike, node ids {duplicates} are not unique")
+    return StateNetwork.create_new(nodes, links)
+
+
+def _entry_id(resource: Hashable, entries: list[Hashable]) -> NodeId:
+    sides = ("start" if entry == resource else f"from_{entry}" for entry in entries)
+    return NodeId(f"{resource}_{'_'.join(sides)}")
@@ -0,0 +1,170 @@
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import igraph
+import numpy as np
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.node import StateNodeType
+from next_flatland.utils.result import Result
+
+if TYPE_CHECKING:
+    from next_flatland.network.state_network.network import StateNetwork
+
+ALLOWED_AGENT_OUTGOING = (StateLinkType.OCCUPATION, StateLinkType.RESERVATION)
+ALLOWED_RESOURCE_INCOMING = (StateLinkType.ALLOCATION,)
+ALLOWED_INFRASTRUCTURE_INCOMING = (StateLinkType.RESERVATION, StateLinkType.OCCUPATION, StateLinkType.TRANSITION)
+ALLOWED_INFRASTRUCTURE_OUTGOING = (StateLinkType.ALLOCATION, StateLinkType.TRANSITION)
+
+
+@dataclass(frozen=True, slots=True)
+class TopologyViolation:
+    message: str
+    node_ids: tuple[NodeId, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class ComponentBatch:
+    """Plain arrays of one or more weak components, cheap to send to a worker process."""
+
+    node_ids: list[NodeId]
+    node_types: np.ndarray  # StateNodeType values
+    links: np.ndarray  # (n_links, 2) positions in node_ids
+    link_types: np.ndarray  # StateLinkType values
+    component_starts: np.ndarray  # position of the first node of every component, components are consecutive
+
+
+def split_into_component_batches(state_network: "StateNetwork", batch_size: int = 10_000) -> list[ComponentBatch]:
+    """
+    Weak components of `state_network` computed in a single pass and packed into batches, a batch is closed
+    at the first component boundary after `batch_size` nodes.
+    """
+    graph = state_network.underlying_digraph
+    if graph.vcount() == 0:
+        return []
+    membership = np.array(graph.connected_components(mode="weak").membership, dtype=np.int64)
+    node_types = np.array([node.node_type.value for node in state_network.all_nodes], dtype=np.int8)
+    links = np.array(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    link_types = np.array([link.link_type.value for link in graph.es[state_network.link_attribute_name]], np.int8)
+    node_ids = graph.vs["name"]
+
+    order = np.argsort(membership, kind="stable")
+    component_starts = np.concatenate(([0], np.cumsum(np.bincount(membership))[:-1]))
+    # components starting in the same stretch of `batch_size` nodes share a batch
+    batch_of_component = np.unique(component_starts // batch_size, return_inverse=True)[1].reshape(-1)
+    first_components = np.append(np.flatnonzero(np.diff(batch_of_component, prepend=-1)), len(component_starts))
+    batch_starts = np.append(component_starts[first_components[:-1]], len(order))
+    batch_of_node = batch_of_component[membership]
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order)) - batch_starts[batch_of_node[order]]
+    link_order = np.argsort(batch_of_node[links[:, 0]], kind="stable")
+    link_starts = np.searchsorted(batch_of_node[links[link_order, 0]], np.arange(len(batch_starts)))
+
+    batches = []
+    for b in range(len(batch_starts) - 1):
+        members = order[batch_starts[b] : batch_starts[b + 1]]
+        batch_links = link_order[link_starts[b] : link_starts[b + 1]]
+        batches.append(
+            ComponentBatch(
+                node_ids=[node_ids[i] for i in members],
+                node_types=node_types[members],
+                links=position[links[batch_links]].reshape(-1, 2),
+                link_types=link_types[batch_links],
+                component_starts=component_starts[first_components[b] : first_components[b + 1]] - batch_starts[b],
+            )
+        )
+    return batches
+
+
+def check_component_batch(batch: ComponentBatch) -> list[TopologyViolation]:
+    """All violations of the node type rules and of the DAG and simplicity checks in `batch`."""
+    violations = list(_check_node_types(batch))
+    graph = igraph.Graph(n=len(batch.node_ids), edges=batch.links.tolist(), directed=True)
+    infrastructure = np.flatnonzero(batch.node_types == StateNodeType.INFRASTRUCTURE.value).tolist()
+    # a union of components is a DAG and simple iff every component is, only failing batches are split
+    infra_only = graph.induced_subgraph(infrastructure)
+    if not (infra_only.is_dag() and infra_only.is_simple()):
+        for members in infra_only.connected_components(mode="weak"):
+            node_ids = tuple(batch.node_ids[infrastructure[i]] for i in members)
+            violations.extend(_check_dag_and_simple(infra_only, members, node_ids, "Infrastructure component"))
+    if not (graph.is_dag() and graph.is_simple()):
+        ends = np.append(batch.component_starts[1:], len(batch.node_ids))
+        for start, end in zip(batch.component_starts.tolist(), ends.tolist()):
+            node_ids = tuple(batch.node_ids[start:end])
+            violations.extend(_check_dag_and_simple(graph, list(range(start, end)), node_ids, "Component"))
+    return violations
+
+
+def validate_topology(
+    state_network: "StateNetwork", executor: Executor | None = None, batch_size: int = 10_000
+) -> Result[bool, list[TopologyViolation]]:
+    """
+    Check every weak component of `state_network` independently and collect all violations.
+
+    Args:
+        state_network (StateNetwork): The network to validate.
+        executor (Executor | None): Checks the component batches in parallel, e.g. a ProcessPoolExecutor.
+            By default they are checked one after another.
+        batch_size (int): Minimal number of nodes per batch sent to the executor.
+
+    Returns:
+        Result[bool, list[TopologyViolation]]: Success or every violation found.
+    """
+    batches = split_into_component_batches(state_network, batch_size)
+    results = map(check_component_batch, batches) if executor is None else executor.map(check_component_batch, batches)
+    violations = [violation for batch_violations in results for violation in batch_violations]
+    if violations:
+        return Result.from_failure(violations)
+    return Result.from_success(True)
+
+
+def _values(link_types: Iterable[StateLinkType]) -> list[int]:
+    return [link_type.value for link_type in link_types]
+
+
+def _check_node_types(batch: ComponentBatch) -> Iterable[TopologyViolation]:
+    sources, targets = batch.links[:, 0], batch.links[:, 1]
+    source_types, target_types = batch.node_types[sources], batch.node_types[targets]
+    resource, infrastructure, agent = (
+        StateNodeType.RESOURCE.value,
+        StateNodeType.INFRASTRUCTURE.value,
+        StateNodeType.AGENT.value,
+    )
+    link_types = batch.link_types
+
+    def nodes_of(mask: np.ndarray, ends: np.ndarray) -> list[int]:
+        return np.unique(ends[mask]).tolist()
+
+    def links_of(mask: np.ndarray, ends: np.ndarray) -> list[tuple[int, StateLinkType]]:
+        return [(i, StateLinkType(t)) for i, t in zip(ends[mask].tolist(), link_types[mask].tolist())]
+
+    ids = batch.node_ids
+    for i in nodes_of(target_types == agent, targets):
+        yield TopologyViolation(f"Agent node {ids[i]} has incoming links", (ids[i],))
+    for i in nodes_of((source_types == agent) & ~np.isin(link_types, _values(ALLOWED_AGENT_OUTGOING)), sources):
+        yield TopologyViolation(f"Agent node {ids[i]} has non-occupation link", (ids[i],))
+    for i in nodes_of(source_types == resource, sources):
+        yield TopologyViolation(f"Resource node {ids[i]} has outgoing links", (ids[i],))
+    for i in nodes_of((target_types == resource) & ~np.isin(link_types, _values(ALLOWED_RESOURCE_INCOMING)), targets):
+        yield TopologyViolation(f"Resource node {ids[i]} has non-allocation link", (ids[i],))
+    incoming = (target_types == infrastructure) & ~np.isin(link_types, _values(ALLOWED_INFRASTRUCTURE_INCOMING))
+    for i, link_type in links_of(incoming, targets):
+        yield TopologyViolation(f"Infrastructure node {ids[i]} has a non allowed incoming link {link_type}", (ids[i],))
+    outgoing = (source_types == infrastructure) & ~np.isin(link_types, _values(ALLOWED_INFRASTRUCTURE_OUTGOING))
+    for i, link_type in links_of(outgoing, sources):
+        yield TopologyViolation(f"Infrastructure node {ids[i]} has a non allowed outgoing link {link_type}", (ids[i],))
+    for i in np.flatnonzero(~np.isin(batch.node_types, [resource, infrastructure, agent])).tolist():
+        yield TopologyViolation(f"Node {ids[i]} has an unknown type {batch.node_types[i]}", (ids[i],))
+
+
+def _check_dag_and_simple(
+    graph: igraph.Graph, members: list[int], node_ids: tuple[NodeId, ...], kind: str
+) -> Iterable[TopologyViolation]:
+    component = graph.induced_subgraph(members)
+    if not component.is_dag():
+        yield TopologyViolation(f"{kind} with {len(node_ids)} nodes is not a DAG", node_ids)
+    if not component.is_simple():
+        yield TopologyViolation(f"{kind} with {len(node_ids)} nodes has parallel links or loops", node_ids)
@@ -0,0 +1,33 @@
+from importlib import import_module
+
+# the modules are imported on first use, so importing one of them doesn't load the dependencies of all others,
+# e.g. asyncio for streaming or pandas for timetables
+_MODULE_BY_NAME = {
+    "CheckpointStore": ".checkpoint",
+    "KpiAggregator": ".metrics",
+    "QuantileSketch": ".metrics",
+    "RunningStats": ".metrics",
+    "MovementModel": ".movement",
+    "Passage": ".movement",
+    "TimedMovement": ".movement",
+    "EffectLog": ".replay",
+    "Replay": ".replay",
+    "StateStreamServer": ".streaming",
+    "stream_frames": ".streaming",
+    "DepartureIndex": ".timetable",
+    "Stop": ".timetable",
+    "Timetable": ".timetable",
+    "TrainRun": ".timetable",
+    "BufferedEnv": ".vector_env",
+    "ParallelEnv": ".vector_env",
+    "SharedBuffers": ".vector_env",
+    "VectorEnv": ".vector_env",
+}
+
+__all__ = list(_MODULE_BY_NAME)
+
+
+def __getattr__(name: str):
+    if name in _MODULE_BY_NAME:
+        return getattr(import_module(_MODULE_BY_NAME[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,233 @@
+import gc
+import hashlib
+import io
+import os
+import pickle
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from ugraph import EndNodeIdPair
+
+from next_flatland.network.state_network.link import StateLink
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNode, StateNodeType
+
+CHECKPOINT_FORMAT = 2
+
+
+class CheckpointStore:
+    """
+    Directory of checkpoints of a running simulation.
+
+    The infrastructure and resource layers of the StateNetwork are static. They are written once into a
+    file named by the hash of their content, while every checkpoint only holds the dynamic state: the agent
+    nodes with their links and the pickled simulation objects. Structures derived from the static network,
+    e.g. the capacities of a ResourceOccupancy or a MovementModel, mark their class with
+    `checkpoint_static = True` and are written once in the same way. They must not change after the first
+    checkpoint. Inside the pickle the network, these structures and every object of `static` are replaced
+    by references, so the write cost follows the number of agents and not the size of the network. Objects
+    that can't be pickled, e.g. executors or lambdas used as clocks, have to be registered in `static` and
+    passed again when loading.
+
+    Agent nodes have to be added after all static nodes, which is how agents enter a StateNetwork.
+    """
+
+    def __init__(self, directory: Path | str, static: Mapping[str, Any] | None = None, keep: int = 2):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.static = dict(static) if static is not None else {}
+        self.keep = keep
+        # (number of static nodes, hash of the static network) by id of the live network
+        self._static_by_network: dict[int, tuple[int, str]] = {}
+        self._networks: dict[str, StateNetwork] = {}
+        # (hash, object) by id of static structures, the object is kept so its id is not reused
+        self._part_by_object: dict[int, tuple[str, Any]] = {}
+        self._parts: dict[str, Any] = {}
+
+    def __getstate__(self) -> dict:
+        # a store pickled with a simulation, e.g. by an EffectRecorder, reloads its static files on demand
+        return {"directory": self.directory, "static": self.static, "keep": self.keep}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["directory"], state["static"], state["keep"])
+
+    def save(self, root: Any, network: StateNetwork, step: int) -> Path:
+        """
+        Write `root` with `network` as dynamic state of `step`, only the newest `keep` checkpoints are kept.
+
+        Args:
+            root (Any): The simulation objects, they may reference `network` and the objects in `static`.
+            network (StateNetwork): The live network, agents are stored with the checkpoint.
+            step (int): Step counter used to name and order the checkpoints.
+
+        Returns:
+            Path: The written checkpoint.
+        """
+        n_static, network_hash = self._write_static(network)
+        buffer = io.BytesIO()
+        pickler = _CheckpointPickler(buffer, self, network, n_static, network_hash)
+        pickler.dump({"format": CHECKPOINT_FORMAT, "step": step, "root": root})
+        path = self.path(step)
+        _write_atomic(path, buffer.getvalue())
+        for outdated in self.checkpoints()[: -self.keep] if self.keep > 0 else []:
+            outdated.unlink()
+        return path
+
+    def path(self, step: int) -> Path:
+        return self.directory / f"checkpoint-{step:012d}.pickle"
+
+    def checkpoints(self) -> list[Path]:
+        return sorted(self.directory.glob("checkpoint-*.pickle"))
+
+    def steps(self) -> list[int]:
+        return [int(path.stem.split("-")[1]) for path in self.checkpoints()]
+
+    def latest(self) -> Path | None:
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load(self, path: Path | str | None = None) -> tuple[int, Any]:
+        """Step and root objects of the checkpoint at `path`, by default of the latest one."""
+        path = self.latest() if path is None else Path(path)
+        if path is None:
+            raise FileNotFoundError(f"No checkpoint in {self.directory}")
+        with open(path, "rb") as file:
+            data = _CheckpointUnpickler(file, self).load()
+        if data["format"] != CHECKPOINT_FORMAT:
+            raise ValueError(f"Unsupported checkpoint format {data['format']}")
+        return data["step"], data["root"]
+
+    def static_network(self, network_hash: str) -> StateNetwork:
+        if network_hash not in self._networks:
+            with open(self.directory / f"network-{network_hash}.pickle", "rb") as file, _gc_paused():
+                self._networks[network_hash] = pickle.load(file)
+        return self._networks[network_hash]
+
+    def static_part(self, part_hash: str) -> Any:
+        if part_hash not in self._parts:
+            with open(self.directory / f"part-{part_hash}.pickle", "rb") as file, _gc_paused():
+                self._parts[part_hash] = pickle.load(file)
+        return self._parts[part_hash]
+
+    def _write_part(self, part: Any) -> str:
+        if id(part) in self._part_by_object:
+            return self._part_by_object[id(part)][0]
+        data = pickle.dumps(part, protocol=pickle.HIGHEST_PROTOCOL)
+        part_hash = hashlib.sha256(data).hexdigest()[:16]
+        path = self.directory / f"part-{part_hash}.pickle"
+        if not path.exists():
+            _write_atomic(path, data)
+        self._part_by_object[id(part)] = (part_hash, part)
+        self._parts[part_hash] = part
+        return part_hash
+
+    def _write_static(self, network: StateNetwork) -> tuple[int, str]:
+        if id(network) in self._static_by_network:
+            return self._static_by_network[id(network)]
+        nodes = network.all_nodes
+        n_static = sum(node.node_type != StateNodeType.AGENT for node in nodes)
+        if any(node.node_type != StateNodeType.AGENT for node in nodes[n_static:]):
+            raise ValueError("Checkpoints require all agent nodes to be added after the static nodes")
+        static = network.shallow_copy
+        static.delete_nodes(range(n_static, len(nodes)))
+        data = pickle.dumps(static, protocol=pickle.HIGHEST_PROTOCOL)
+        network_hash = hashlib.sha256(data).hexdigest()[:16]
+        path = self.directory / f"network-{network_hash}.pickle"
+        if not path.exists():
+            _write_atomic(path, data)
+        self._networks[network_hash] = static
+        self._static_by_network[id(network)] = (n_static, network_hash)
+        return n_static, network_hash
+
+
+class _CheckpointPickler(pickle.Pickler):
+    def __init__(
+        self,
+        file: io.BytesIO,
+        store: CheckpointStore,
+        network: StateNetwork,
+        n_static: int,
+        network_hash: str,
+    ):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store = store
+        self._network = network
+        self._n_static = n_static
+        self._network_hash = network_hash
+        self._static_names = {id(obj): name for name, obj in store.static.items()}
+        self._network_reference: tuple | None = None
+
+    def persistent_id(self, obj: Any) -> Any:
+        if obj is self._network:
+            # persistent references are not memoized, every reference to the network is replaced by the same one
+            if self._network_reference is None:
+                graph = self._network.underlying_digraph
+                agent_indexes = range(self._n_static, self._network.n_count)
+                agents = self._network.nodes_by_indexes(agent_indexes)
+                # only the incidence lists of the agents are read, not every edge of the network
+                link_indexes = sorted({i for v in agent_indexes for i in graph.incident(v, mode="all")})
+                links = [
+                    (EndNodeIdPair((graph.vs[s]["name"], graph.vs[t]["name"])), link)
+                    for (s, t), link in zip(
+                        (graph.es[i].tuple for i in link_indexes), self._network.links_by_indexes(link_indexes)
+                    )
+                ]
+                self._network_reference = ("network", self._network_hash, agents, links)
+                return self._network_reference
+            return "network", self._network_hash
+        if id(obj) in self._static_names:
+            return "static", self._static_names[id(obj)]
+        if getattr(type(obj), "checkpoint_static", False):
+            return "part", self._store._write_part(obj)
+        return None
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BufferedReader, store: CheckpointStore):
+        super().__init__(file)
+        self._store = store
+        self._network: StateNetwork | None = None
+
+    def persistent_load(self, pid: Any) -> Any:
+        if pid[0] == "network":
+            if self._network is None:
+                _, network_hash, agents, links = pid
+                self._network = _with_agents(self._store.static_network(network_hash), agents, links)
+            return self._network
+        if pid[0] == "static":
+            if pid[1] not in self._store.static:
+                raise KeyError(f"Checkpoint references static object {pid[1]} that is not registered")
+            return self._store.static[pid[1]]
+        if pid[0] == "part":
+            return self._store.static_part(pid[1])
+        raise pickle.UnpicklingError(f"Unknown persistent reference {pid[0]}")
+
+
+def _with_agents(
+    static: StateNetwork, agents: list[StateNode], links: list[tuple[EndNodeIdPair, StateLink]]
+) -> StateNetwork:
+    network = static.shallow_copy
+    network.add_nodes(agents)
+    network.add_links(links)
+    return network
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # unpickling creates an object per node and link, the cyclic collector would run over them many times
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
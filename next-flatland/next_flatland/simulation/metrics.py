@@ -0,0 +1,270 @@
+import math
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import numpy as np
+from ugraph import NodeId
+
+from next_flatland.network.state_network.occupancy import ResourceOccupancy
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass(slots=True)
+class RunningStats:
+    """Count, mean, variance, minimum and maximum of a stream of values (Welford's algorithm)."""
+
+    count: int = 0
+    mean: float = 0.0
+    _m2: float = 0.0
+    minimum: float = math.inf
+    maximum: float = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+@dataclass(slots=True)
+class QuantileSketch:
+    """
+    Histogram with logarithmic buckets for non-negative values. Every quantile is returned with a
+    relative error of at most `relative_accuracy`, the memory depends only on the range of the values.
+    """
+
+    relative_accuracy: float = 0.01
+    _buckets: Counter[int] = field(default_factory=Counter)
+    _zeros: int = 0
+    count: int = 0
+    _gamma: float = field(init=False)
+
+    def __post_init__(self):
+        self._gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    def add(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"QuantileSketch only supports non-negative values, got {value}")
+        self.count += 1
+        if value == 0:
+            self._zeros += 1
+            return
+        self._buckets[math.ceil(math.log(value, self._gamma))] += 1
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self._zeros:
+            return 0.0
+        seen = self._zeros
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen > rank:
+                return 2 * self._gamma**bucket / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+    def histogram(self) -> list[tuple[float, float, int]]:
+        """(lower bound, upper bound, count) of every non-empty bucket."""
+        bins = [(0.0, 0.0, self._zeros)] if self._zeros else []
+        bins.extend((self._gamma ** (b - 1), self._gamma**b, self._buckets[b]) for b in sorted(self._buckets))
+        return bins
+
+
+@dataclass(slots=True)
+class AgentKpis:
+    moves: int = 0
+    rejected_moves: int = 0
+    travel_time: float = 0.0
+    wait_time: float = 0.0
+    first_departure: float = math.nan
+    last_arrival: float = math.nan
+    scheduled_arrivals: int = 0
+    punctual_arrivals: int = 0
+    delay: float = math.nan  # at the last scheduled arrival, negative if early
+
+
+class KpiAggregator:
+    """
+    Streaming operational KPIs of a simulation, every event is aggregated in O(1) without keeping any
+    history of states or effects.
+
+    - Resource occupancy time: the integral of the number of agents on a resource over time, fed by the
+      count changes of a ResourceOccupancy.
+    - Per agent travel time, i.e. the time between departure and arrival of accepted moves.
+    - Per agent wait time, i.e. the time between the first rejected move and the next departure.
+    - Rejected moves per agent and sketches of the move and wait time distributions.
+    - Punctuality against a schedule: the delay of every scheduled arrival and the share of arrivals that
+      are at most `punctuality_threshold` late.
+    """
+
+    def __init__(
+        self, clock: Callable[[], float], relative_accuracy: float = 0.01, punctuality_threshold: float = 180.0
+    ):
+        self._clock = clock
+        self.punctuality_threshold = punctuality_threshold
+        self.start = clock()
+        self.agents: defaultdict[NodeId, AgentKpis] = defaultdict(AgentKpis)
+        self.move_time = QuantileSketch(relative_accuracy)
+        self.wait_time = QuantileSketch(relative_accuracy)
+        self.move_time_stats = RunningStats()
+        self.wait_time_stats = RunningStats()
+        self.delay_stats = RunningStats()
+        self.lateness = QuantileSketch(relative_accuracy)  # delays with early arrivals counted as on time
+        self._waiting_since: dict[NodeId, float] = {}
+        self._occupancy: ResourceOccupancy | None = None
+        # only resources with agents on them or with occupied time are kept, not the whole network
+        self._count: dict[NodeId, int] = {}
+        self._last_change: dict[NodeId, float] = {}
+        self._occupied_time: defaultdict[NodeId, float] = defaultdict(float)
+
+    def attach(self, occupancy: ResourceOccupancy) -> None:
+        """Start the occupancy time of every resource at the current counts and follow their changes."""
+        now = self._clock()
+        self._occupancy = occupancy
+        resource_ids = occupancy.resource_ids
+        for i in np.flatnonzero(occupancy.counts):
+            self._count[resource_ids[i]] = int(occupancy.counts[i])
+            self._last_change[resource_ids[i]] = now
+        occupancy.listeners.append(self.resource_count_changed)
+
+    def resource_count_changed(self, resource_id: NodeId, delta: int) -> None:
+        now = self._clock()
+        count = self._count.pop(resource_id, 0)
+        if count:
+            self._occupied_time[resource_id] += count * (now - self._last_change.pop(resource_id))
+        if count + delta:
+            self._count[resource_id] = count + delta
+            self._last_change[resource_id] = now
+
+    def move(self, agent_id: NodeId, departure: float, arrival: float) -> None:
+        kpis = self.agents[agent_id]
+        kpis.moves += 1
+        kpis.travel_time += arrival - departure
+        if kpis.moves == 1:
+            kpis.first_departure = departure
+        kpis.last_arrival = arrival
+        self.move_time.add(arrival - departure)
+        self.move_time_stats.add(arrival - departure)
+        if agent_id in self._waiting_since:
+            waited = departure - self._waiting_since.pop(agent_id)
+            kpis.wait_time += waited
+            self.wait_time.add(waited)
+            self.wait_time_stats.add(waited)
+
+    def arrive(self, agent_id: NodeId, scheduled: float, actual: float) -> None:
+        """An arrival of `agent_id` at a stop it was scheduled to reach at `scheduled`."""
+        delay = actual - scheduled
+        kpis = self.agents[agent_id]
+        kpis.scheduled_arrivals += 1
+        kpis.delay = delay
+        if delay <= self.punctuality_threshold:
+            kpis.punctual_arrivals += 1
+        self.delay_stats.add(delay)
+        self.lateness.add(max(delay, 0.0))
+
+    def reject(self, agent_id: NodeId, time: float) -> None:
+        self.agents[agent_id].rejected_moves += 1
+        self._waiting_since.setdefault(agent_id, time)
+
+    def occupied_time(self, resource_id: NodeId) -> float:
+        """Agent time spent on `resource_id` until now."""
+        now = self._clock()
+        since_last_change = now - self._last_change.get(resource_id, now)
+        return self._occupied_time.get(resource_id, 0.0) + self._count.get(resource_id, 0) * since_last_change
+
+    def agents_frame(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        frame = pd.DataFrame.from_records(
+            [
+                {
+                    "agent_id": agent_id,
+                    "moves": kpis.moves,
+                    "rejected_moves": kpis.rejected_moves,
+                    "travel_time": kpis.travel_time,
+                    "wait_time": kpis.wait_time + self._open_wait(agent_id),
+                    "first_departure": kpis.first_departure,
+                    "last_arrival": kpis.last_arrival,
+                    "scheduled_arrivals": kpis.scheduled_arrivals,
+                    "punctual_arrivals": kpis.punctual_arrivals,
+                    "delay": kpis.delay,
+                }
+                for agent_id, kpis in self.agents.items()
+            ],
+            columns=[
+                "agent_id",
+                "moves",
+                "rejected_moves",
+                "travel_time",
+                "wait_time",
+                "first_departure",
+                "last_arrival",
+                "scheduled_arrivals",
+                "punctual_arrivals",
+                "delay",
+            ],
+        )
+        return frame.set_index("agent_id")
+
+    def resources_frame(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        elapsed = self._clock() - self.start
+        resource_ids = self._occupancy.resource_ids if self._occupancy is not None else []
+        capacities = self._occupancy.capacities.tolist() if self._occupancy is not None else []
+        frame = pd.DataFrame.from_records(
+            [
+                {
+                    "resource_id": resource_id,
+                    "capacity": capacity,
+                    "occupied_time": self.occupied_time(resource_id),
+                    "utilization": self.occupied_time(resource_id) / (capacity * elapsed) if elapsed > 0 else 0.0,
+                }
+                for resource_id, capacity in zip(resource_ids, capacities)
+            ],
+            columns=["resource_id", "capacity", "occupied_time", "utilization"],
+        )
+        return frame.set_index("resource_id")
+
+    def summary_frame(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> "pd.DataFrame":
+        """One row per KPI with totals, throughput, punctuality and quantiles of the move, wait and delay times."""
+        import pandas as pd
+
+        elapsed = self._clock() - self.start
+        moves = sum(kpis.moves for kpis in self.agents.values())
+        rows = {
+            "elapsed_time": elapsed,
+            "moves": moves,
+            "rejected_moves": sum(kpis.rejected_moves for kpis in self.agents.values()),
+            "throughput": moves / elapsed if elapsed > 0 else 0.0,
+            "mean_move_time": self.move_time_stats.mean,
+            "mean_wait_time": self.wait_time_stats.mean,
+            "scheduled_arrivals": self.delay_stats.count,
+            "punctuality": (
+                sum(kpis.punctual_arrivals for kpis in self.agents.values()) / self.delay_stats.count
+                if self.delay_stats.count
+                else math.nan
+            ),
+            "mean_delay": self.delay_stats.mean if self.delay_stats.count else math.nan,
+        }
+        for q in quantiles:
+            rows[f"move_time_q{q:g}"] = self.move_time.quantile(q)
+            rows[f"wait_time_q{q:g}"] = self.wait_time.quantile(q)
+            rows[f"lateness_q{q:g}"] = self.lateness.quantile(q)
+        return pd.DataFrame({"value": rows})
+
+    def _open_wait(self, agent_id: NodeId) -> float:
+        if agent_id not in self._waiting_since:
+            return 0.0
+        return self._clock() - self._waiting_since[agent_id]
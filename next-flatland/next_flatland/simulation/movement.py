@@ -0,0 +1,199 @@
+import heapq
+import math
+from bisect import bisect_left
+from collections.abc import Sequence
+from dataclasses import dataclass
+from itertools import count
+
+from ugraph import NodeId
+
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+from next_flatland.network.state_network.occupancy import ResourceOccupancy
+
+
+@dataclass(frozen=True, slots=True)
+class Passage:
+    """Time the head of an agent enters an infrastructure node and the time its tail clears it again."""
+
+    infrastructure_id: NodeId
+    entry: float
+    exit: float  # math.inf if the agent still stands on the node at the end of the move
+
+
+class MovementModel:
+    """
+    Analytic travel times on a StateNetwork from the `length` and `max_speed` of the infrastructure nodes
+    and the `max_speed` of the transitions between them. The speed is constant on every node, so the
+    position of an agent is piecewise linear in time and every entry and exit time has a closed form.
+    """
+
+    # written once per checkpoint directory instead of into every checkpoint
+    checkpoint_static = True
+
+    def __init__(
+        self,
+        length_by_infrastructure: dict[NodeId, float],
+        max_speed_by_infrastructure: dict[NodeId, float],
+        max_speed_by_transition: dict[tuple[NodeId, NodeId], float],
+    ):
+        self._length = length_by_infrastructure
+        self._max_speed = max_speed_by_infrastructure
+        self._transition_max_speed = max_speed_by_transition
+
+    @classmethod
+    def from_state_network(cls, state: StateNetwork) -> "MovementModel":
+        nodes = state.all_nodes
+        infrastructure = [node for node in nodes if node.node_type == StateNodeType.INFRASTRUCTURE]
+        return cls(
+            {node.id: node.length for node in infrastructure},
+            {node.id: node.max_speed for node in infrastructure},
+            {
+                (nodes[s].id, nodes[t].id): link.max_speed
+                for (s, t), link in state.link_by_tuple_iterator()
+                if link.link_type == StateLinkType.TRANSITION and link.max_speed != math.inf
+            },
+        )
+
+    def profile(self, path: Sequence[NodeId], departure: float, speed: float) -> tuple[list[float], list[float]]:
+        """
+        Distance and time the head of an agent reaches the end of every node of `path`, starting from the
+        end of `path[0]` at `departure` and travelling at most at `speed`.
+        """
+        distances = [0.0]
+        times = [departure]
+        for previous, infra_id in zip(path, path[1:]):
+            velocity = min(
+                speed, self._max_speed[infra_id], self._transition_max_speed.get((previous, infra_id), math.inf)
+            )
+            if velocity <= 0:
+                raise ValueError(f"Infrastructure node {infra_id} can't be passed with speed {velocity}")
+            distances.append(distances[-1] + self._length[infra_id])
+            times.append(times[-1] + self._length[infra_id] / velocity)
+        return distances, times
+
+
+def _time_at(distances: list[float], times: list[float], distance: float) -> float:
+    i = bisect_left(distances, distance)
+    if distances[i] == distance:
+        return times[i]
+    share = (distance - distances[i - 1]) / (distances[i] - distances[i - 1])
+    return times[i - 1] + share * (times[i] - times[i - 1])
+
+
+class TimedMovement:
+    """
+    Continuous-time movement of agents over the resource occupancy.
+
+    A started move occupies every entered infrastructure node at once and schedules the release of every
+    node at the time the tail of the agent clears it. The clock jumps from event to event, arrivals and
+    releases, so long or slow sections cost no more than short ones and no per-tick updates are needed.
+    """
+
+    def __init__(self, model: MovementModel, occupancy: ResourceOccupancy, now: float = 0.0):
+        self.model = model
+        self.occupancy = occupancy
+        self.now = now
+        self._releases: list[tuple[float, int, NodeId, NodeId]] = []
+        self._arrivals: list[tuple[float, int, NodeId]] = []
+        self._wake_ups: list[float] = []
+        self._sequence = count()
+        self._arrival: dict[NodeId, float] = {}
+        self._departure: dict[NodeId, float] = {}
+        self._speed: dict[NodeId, float] = {}
+        self._train_length: dict[NodeId, float] = {}
+        # infrastructure nodes still below an agent with the distance it has to travel until its tail clears them
+        self._standing: dict[NodeId, list[tuple[NodeId, float]]] = {}
+
+    def register(self, agent_id: NodeId, infrastructure_id: NodeId, speed: float, train_length: float = 0.0) -> None:
+        """Add an agent that stands at the end of `infrastructure_id` and already occupies it."""
+        self._speed[agent_id] = speed
+        self._train_length[agent_id] = train_length
+        self._standing[agent_id] = [(infrastructure_id, train_length)]
+        self._arrival[agent_id] = self.now
+
+    def unregister(self, agent_id: NodeId) -> None:
+        """Remove an agent that stands still and release every infrastructure node it still occupies."""
+        if self.is_moving(agent_id):
+            raise ValueError(f"Agent {agent_id} can't be removed while moving")
+        for infra_id, _ in self._standing.pop(agent_id):
+            self.occupancy.release(agent_id, infra_id)
+        for agent_data in (self._arrival, self._departure, self._speed, self._train_length):
+            agent_data.pop(agent_id, None)
+
+    def wake_up_at(self, time: float) -> None:
+        """Schedule an event without any occupation change, e.g. a departure from the timetable."""
+        if time > self.now:
+            heapq.heappush(self._wake_ups, time)
+
+    def is_moving(self, agent_id: NodeId) -> bool:
+        return self._arrival.get(agent_id, self.now) > self.now
+
+    def arrival(self, agent_id: NodeId) -> float:
+        return self._arrival[agent_id]
+
+    def departure(self, agent_id: NodeId) -> float:
+        """Start time of the latest move of `agent_id`."""
+        return self._departure.get(agent_id, self._arrival[agent_id])
+
+    @property
+    def has_pending_events(self) -> bool:
+        return bool(self._releases) or bool(self._arrivals) or bool(self._wake_ups)
+
+    def start(self, agent_id: NodeId, path: Sequence[NodeId]) -> list[Passage]:
+        """
+        Start moving `agent_id` from the end of `path[0]`, where it stands, to the end of `path[-1]`.
+        The entered nodes are occupied immediately, their releases are scheduled.
+        """
+        distances, times = self.model.profile(path, self.now, self._speed[agent_id])
+        train_length = self._train_length[agent_id]
+        # (node, entry time, distance until the tail clears it)
+        to_clear = [(infra_id, self.now, remaining) for infra_id, remaining in self._standing[agent_id]]
+        to_clear.extend((infra_id, times[k - 1], distances[k] + train_length) for k, infra_id in enumerate(path[1:], 1))
+        for infra_id in path[1:]:
+            self.occupancy.occupy(agent_id, infra_id)
+
+        passages = []
+        standing = []
+        for infra_id, entry, remaining in to_clear:
+            if remaining <= distances[-1] and infra_id != path[-1]:
+                exit_ = _time_at(distances, times, remaining)
+                heapq.heappush(self._releases, (exit_, next(self._sequence), agent_id, infra_id))
+            else:
+                exit_ = math.inf
+                standing.append((infra_id, remaining - distances[-1]))
+            passages.append(Passage(infra_id, entry, exit_))
+        self._standing[agent_id] = standing
+        self._departure[agent_id] = self.now
+        self._arrival[agent_id] = times[-1]
+        if times[-1] > self.now:
+            heapq.heappush(self._arrivals, (times[-1], next(self._sequence), agent_id))
+        return passages
+
+    def next_event_time(self) -> float:
+        next_arrival = self._arrivals[0][0] if self._arrivals else math.inf
+        next_release = self._releases[0][0] if self._releases else math.inf
+        next_wake_up = self._wake_ups[0] if self._wake_ups else math.inf
+        return min(next_arrival, next_release, next_wake_up)
+
+    def advance(self, until: float | None = None) -> list[tuple[NodeId, NodeId]]:
+        """
+        Move the clock to `until`, by default to the next event, and release every occupation
+        that ends until then. Returns the released (agent, infrastructure node) pairs.
+        """
+        until = self.next_event_time() if until is None else until
+        if until == math.inf:
+            until = self.now
+        released = []
+        while self._releases and self._releases[0][0] <= until:
+            release_time, _, agent_id, infra_id = heapq.heappop(self._releases)
+            self.now = max(self.now, release_time)
+            self.occupancy.release(agent_id, infra_id)
+            released.append((agent_id, infra_id))
+        while self._arrivals and self._arrivals[0][0] <= until:
+            heapq.heappop(self._arrivals)
+        while self._wake_ups and self._wake_ups[0] <= until:
+            heapq.heappop(self._wake_ups)
+        self.now = max(self.now, until)
+        return released
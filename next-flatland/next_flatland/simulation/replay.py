@@ -0,0 +1,199 @@
+import os
+import pickle
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import numpy as np
+
+from next_flatland.simulation.checkpoint import CheckpointStore
+
+EFFECTS_FILE = "effects.pickle"
+INDEX_FILE = "effects.index"
+OFFSET_DTYPE = np.int64
+
+
+class EffectLog:
+    """
+    Append-only log of every step: the changes of the environment processes and the accepted effects are
+    pickled one record per step, a second file holds the byte offset of every record, so any step can be read
+    without scanning the log. Objects of `static`, e.g. the clock of a timetable, are written as references.
+
+    A log being written can be pickled with the simulation: the file handles are reopened on unpickling and
+    the records written after the checkpoint are dropped, so a resumed run continues the log.
+    """
+
+    def __init__(self, directory: Path | str, mode: str = "r", static: Mapping[str, Any] | None = None):
+        """
+        Args:
+            directory (Path | str): Directory of the log, created when writing.
+            mode (str): "w" starts a new log, "r" reads an existing one.
+            static (Mapping[str, Any] | None): Objects written as references, passed again when reading.
+        """
+        if mode not in ("r", "w"):
+            raise ValueError(f"Unknown mode {mode}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.static = dict(static) if static is not None else {}
+        if mode == "w":
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._open_for_writing(0)
+        else:
+            self._effects = open(self.directory / EFFECTS_FILE, "rb")
+            self._index = None
+            self._offsets = np.fromfile(self.directory / INDEX_FILE, dtype=OFFSET_DTYPE)
+            self._n_steps = len(self._offsets)
+
+    def _open_for_writing(self, n_steps: int) -> None:
+        # records after the first `n_steps` steps are dropped, they were written after the checkpoint resumed from
+        file_mode = "r+b" if n_steps else "wb"
+        self._effects = open(self.directory / EFFECTS_FILE, file_mode)
+        self._index = open(self.directory / INDEX_FILE, file_mode)
+        if n_steps:
+            offsets = np.fromfile(self._index, dtype=OFFSET_DTYPE)
+            if len(offsets) < n_steps:
+                raise ValueError(f"The log in {self.directory} has {len(offsets)} of {n_steps} steps")
+            end = int(offsets[n_steps]) if n_steps < len(offsets) else self._effects.seek(0, os.SEEK_END)
+            self._effects.truncate(end)
+            self._effects.seek(end)
+            self._index.truncate(n_steps * OFFSET_DTYPE().itemsize)
+            self._index.seek(0, os.SEEK_END)
+        self._n_steps = n_steps
+        self._in_step = False
+
+    def __getstate__(self) -> dict:
+        if self.mode == "w":
+            self.flush()
+        return {"directory": self.directory, "mode": self.mode, "static": self.static, "n_steps": self._n_steps}
+
+    def __setstate__(self, state: dict) -> None:
+        if state["mode"] == "r":
+            self.__init__(state["directory"], "r", state["static"])
+            return
+        self.directory = state["directory"]
+        self.mode = "w"
+        self.static = state["static"]
+        self._open_for_writing(state["n_steps"])
+
+    def __len__(self) -> int:
+        return self._n_steps
+
+    def begin_step(self, environment_effects: list[Any]) -> None:
+        """Start the record of the next step with the changes of the environment processes."""
+        # written right away, the changed objects, e.g. spawned agents, change again during the step
+        self._index.write(np.array([self._effects.tell()], dtype=OFFSET_DTYPE).tobytes())
+        self._dump(environment_effects)
+        self._in_step = True
+
+    def append(self, effects: list[Any]) -> None:
+        """Complete the record of the step with its accepted effects."""
+        if not self._in_step:
+            self.begin_step([])
+        self._dump(effects)
+        self._in_step = False
+        self._n_steps += 1
+
+    def read(self, start: int, stop: int) -> Iterator[tuple[list[Any], list[Any]]]:
+        """Environment changes and accepted effects of the steps `start` to `stop` - 1, in order."""
+        if not 0 <= start <= stop <= self._n_steps:
+            raise IndexError(f"Steps {start} to {stop} are not in the log of {self._n_steps} steps")
+        if start == stop:
+            return
+        self._effects.seek(int(self._offsets[start]))
+        for _ in range(stop - start):
+            yield self._load(), self._load()
+
+    def flush(self) -> None:
+        self._effects.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        self._effects.close()
+        if self._index is not None:
+            self._index.close()
+
+    def _dump(self, records: list[Any]) -> None:
+        _StaticPickler(self._effects, self.static).dump(records)
+
+    def _load(self) -> list[Any]:
+        return _StaticUnpickler(self._effects, self.static).load()
+
+
+class _StaticPickler(pickle.Pickler):
+    def __init__(self, file: BinaryIO, static: Mapping[str, Any]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._static_names = {id(obj): name for name, obj in static.items()}
+
+    def persistent_id(self, obj: Any) -> str | None:
+        return self._static_names.get(id(obj))
+
+
+class _StaticUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, static: Mapping[str, Any]):
+        super().__init__(file)
+        self._static = static
+
+    def persistent_load(self, pid: str) -> Any:
+        if pid not in self._static:
+            raise KeyError(f"The log references static object {pid} that is not registered")
+        return self._static[pid]
+
+
+class Replay:
+    """
+    Reconstructs any step of a recorded run without agents and arbitration: the latest keyframe at or before
+    the step is loaded, then the logged environment changes of the steps in between are applied to the state
+    and their accepted effects through the recorded propagator. Seeking forward from the current step continues from there when that is closer than the
+    keyframe, so stepping through a run costs one propagation per step.
+
+    The returned state is the live object of the replay, it changes with the next seek.
+    """
+
+    def __init__(self, directory: Path | str, static: Mapping[str, Any] | None = None):
+        """
+        Args:
+            directory (Path | str): Directory written by an EffectRecorder.
+            static (Mapping[str, Any] | None): Objects registered as static when recording, e.g. clocks.
+        """
+        self.log = EffectLog(directory, "r", static)
+        self.keyframes = CheckpointStore(directory, static, keep=0)
+        self._keyframe_steps = self.keyframes.steps()
+        self._step: int | None = None
+        self._root: dict[str, Any] | None = None
+
+    @property
+    def n_steps(self) -> int:
+        return len(self.log)
+
+    @property
+    def step(self) -> int | None:
+        return self._step
+
+    def seek(self, step: int) -> Any:
+        """The SystemState after `step` steps of the recorded run."""
+        if not 0 <= step <= self.n_steps:
+            raise IndexError(f"Step {step} is not in the recorded {self.n_steps} steps")
+        position = np.searchsorted(self._keyframe_steps, step, side="right") - 1
+        if position < 0:
+            raise ValueError(f"No keyframe at or before step {step}")
+        keyframe = self._keyframe_steps[position]
+        if self._step is None or not keyframe <= self._step <= step:
+            self._step, self._root = self.keyframes.load(self.keyframes.path(keyframe))
+        state, propagator = self._root["state"], self._root["propagator"]
+        for environment_effects, effects in self.log.read(self._step, step):
+            for environment_effect in environment_effects:
+                environment_effect.apply(state)
+            propagator.propagate(state.state, effects)
+        self._step = step
+        return state
+
+    def effects(self, step: int) -> list[Any]:
+        """Accepted effects of `step`, they lead from the state after `step` steps to the next one."""
+        return next(self.log.read(step, step + 1))[1]
+
+    def environment_effects(self, step: int) -> list[Any]:
+        """Changes of the environment processes at the start of `step`, before its effects were proposed."""
+        return next(self.log.read(step, step + 1))[0]
+
+    def close(self) -> None:
+        self.log.close()
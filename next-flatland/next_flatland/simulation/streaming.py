@@ -0,0 +1,182 @@
+import asyncio
+import json
+import socket
+import threading
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+
+from ugraph import NodeId
+
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.network.state_network.node import StateNodeType
+
+Link = tuple[NodeId, NodeId]
+
+
+class _Client:
+    def __init__(self, max_queued_frames: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=max_queued_frames)
+        self.dropped_frames = 0
+
+
+class StateStreamServer:
+    """
+    Local TCP endpoint streaming a running simulation to viewers as newline-delimited JSON.
+
+    A connecting viewer receives the static network once, then a snapshot of the agent links and afterwards
+    one delta per step with the added and removed agent links. The server runs its own asyncio loop in a
+    background thread, `publish` only hands the delta over to that loop, so the simulation never waits for
+    a viewer. Every viewer has a bounded queue of frames: a viewer that falls behind loses its queued
+    deltas and gets a fresh snapshot instead, so it skips steps but never sees an inconsistent state. The
+    socket send buffer is limited to `send_buffer_size`, so the backlog can't hide in the operating system.
+
+    Messages:
+        {"type": "static", "nodes": [[id, node type, x, y, z], ...], "links": [[source, target, link type], ...]}
+        {"type": "snapshot", "step": n, "links": {agent: [infrastructure, ...], ...}}
+        {"type": "delta", "step": n, "added": [[agent, infrastructure], ...], "removed": [...],
+         "removed_agents": [agent, ...]}
+    Removed links and agents of a delta are applied before the added links.
+    """
+
+    def __init__(
+        self,
+        network: StateNetwork,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_queued_frames: int = 64,
+        send_buffer_size: int = 1 << 16,
+    ):
+        self.host = host
+        self.port = port
+        self.max_queued_frames = max_queued_frames
+        self.send_buffer_size = send_buffer_size
+        nodes = network.all_nodes
+        static = {
+            "type": "static",
+            "nodes": [
+                [node.id, node.node_type.name, node.coordinates.x, node.coordinates.y, node.coordinates.z]
+                for node in nodes
+                if node.node_type != StateNodeType.AGENT
+            ],
+            "links": [
+                [nodes[s].id, nodes[t].id, link.link_type.name]
+                for (s, t), link in network.link_by_tuple_iterator()
+                if nodes[s].node_type != StateNodeType.AGENT
+            ],
+        }
+        self._static_frame = _encode(static)
+        self._links: defaultdict[NodeId, set[NodeId]] = defaultdict(set)
+        for (s, t), _ in network.link_by_tuple_iterator():
+            if nodes[s].node_type == StateNodeType.AGENT:
+                self._links[nodes[s].id].add(nodes[t].id)
+        self._step = 0
+        self._clients: set[_Client] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.Server | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def n_clients(self) -> int:
+        return len(self._clients)
+
+    def start(self) -> None:
+        """Start serving in a background thread, `port` is set to the bound port once this returns."""
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def serve() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="state-stream-server", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+
+        async def close() -> None:
+            self._server.close()
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def publish(
+        self,
+        step: int,
+        added: Iterable[Link],
+        removed: Iterable[Link] = (),
+        removed_agents: Iterable[NodeId] = (),
+    ) -> None:
+        """Hand the changes of `step` over to the server thread, safe to call from the simulation thread."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._broadcast, step, list(added), list(removed), list(removed_agents))
+
+    def _broadcast(self, step: int, added: list[Link], removed: list[Link], removed_agents: list[NodeId]) -> None:
+        for agent_id, infra_id in removed:
+            self._links[agent_id].discard(infra_id)
+        for agent_id in removed_agents:
+            self._links.pop(agent_id, None)
+        for agent_id, infra_id in added:
+            self._links[agent_id].add(infra_id)
+        self._step = step
+        if not self._clients:
+            return
+        frame = _encode(
+            {"type": "delta", "step": step, "added": added, "removed": removed, "removed_agents": removed_agents}
+        )
+        snapshot = None
+        for client in self._clients:
+            if client.queue.full():
+                # the viewer is too slow, its queued deltas are replaced by the current state
+                client.dropped_frames += client.queue.qsize() + 1
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                snapshot = snapshot or self._snapshot_frame()
+                client.queue.put_nowait(snapshot)
+            else:
+                client.queue.put_nowait(frame)
+
+    def _snapshot_frame(self) -> bytes:
+        links = {agent_id: sorted(infra_ids) for agent_id, infra_ids in self._links.items()}
+        return _encode({"type": "snapshot", "step": self._step, "links": links})
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = _Client(self.max_queued_frames)
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+        writer.transport.set_write_buffer_limits(high=self.send_buffer_size)
+        # queued before any later delta, so the viewer starts from a consistent state
+        client.queue.put_nowait(self._snapshot_frame())
+        self._clients.add(client)
+        try:
+            writer.write(self._static_frame)
+            await writer.drain()
+            while True:
+                writer.write(await client.queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(client)
+            writer.close()
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def stream_frames(host: str, port: int) -> Iterator[dict]:
+    """Blocking viewer side of a StateStreamServer, yields the decoded messages until the server closes."""
+    with socket.create_connection((host, port)) as connection, connection.makefile("rb") as stream:
+        for line in stream:
+            yield json.loads(line)
@@ -0,0 +1,190 @@
+from collections.abc import Collection, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from ugraph import NodeId
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass(frozen=True, slots=True)
+class Stop:
+    infrastructure_id: NodeId
+    arrival: float  # math.nan at the origin
+    departure: float  # math.nan at the destination
+
+
+@dataclass(frozen=True, slots=True)
+class TrainRun:
+    train_id: str
+    stops: tuple[Stop, ...]
+
+    @property
+    def origin(self) -> NodeId:
+        return self.stops[0].infrastructure_id
+
+    @property
+    def destination(self) -> NodeId:
+        return self.stops[-1].infrastructure_id
+
+    @property
+    def departure(self) -> float:
+        return self.stops[0].departure
+
+
+class Timetable:
+    """
+    Columnar storage of the train runs of a schedule, sorted by the departure at the origin.
+
+    The stops of all runs are kept in flat NumPy arrays, a TrainRun is only materialized when it is requested,
+    so a day's timetable costs a few bytes per stop until its trains actually depart.
+    """
+
+    def __init__(
+        self,
+        train_ids: np.ndarray,
+        run_offsets: np.ndarray,
+        locations: np.ndarray,
+        arrivals: np.ndarray,
+        departures: np.ndarray,
+    ):
+        self._train_ids = train_ids
+        self._run_offsets = run_offsets  # stops of run i are [run_offsets[i], run_offsets[i + 1])
+        self._locations = locations
+        self._arrivals = arrivals
+        self._departures = departures
+        self._run_departures = departures[run_offsets[:-1]]
+        if np.any(np.isnan(self._run_departures)):
+            raise ValueError("Every train run needs a departure time at its origin")
+        if np.any(np.diff(self._run_departures) < 0):
+            raise ValueError("Train runs must be sorted by their departure")
+
+    def __len__(self) -> int:
+        return len(self._train_ids)
+
+    @property
+    def run_departures(self) -> np.ndarray:
+        return self._run_departures
+
+    def run(self, index: int) -> TrainRun:
+        start, end = self._run_offsets[index], self._run_offsets[index + 1]
+        return TrainRun(
+            train_id=str(self._train_ids[index]),
+            stops=tuple(
+                Stop(NodeId(str(location)), float(arrival), float(departure))
+                for location, arrival, departure in zip(
+                    self._locations[start:end], self._arrivals[start:end], self._departures[start:end]
+                )
+            ),
+        )
+
+    @classmethod
+    def read_csv(
+        cls,
+        path: Path | str,
+        infrastructure_ids: Collection[NodeId] | None = None,
+        stop_mapping: Mapping[str, NodeId] | None = None,
+    ) -> "Timetable":
+        """
+        Read a timetable with one row per stop and the columns `train_id`, `location`, `arrival` and
+        `departure`. Rows of different trains may be interleaved, e.g. in order of time, the rows of a train
+        are in travel order unless there is a `sequence` column. Times are seconds or `HH:MM[:SS]`, an empty
+        arrival marks the origin and an empty departure the destination.
+
+        Args:
+            path (Path | str): The CSV file.
+            infrastructure_ids (Collection[NodeId] | None): Infrastructure nodes of the network, every mapped
+                location must be one of them.
+            stop_mapping (Mapping[str, NodeId] | None): Infrastructure node by location, e.g. for station
+                codes. Locations without mapping are taken as infrastructure node ids.
+
+        Returns:
+            Timetable: The train runs sorted by departure.
+        """
+        import pandas as pd
+
+        stops = pd.read_csv(path, dtype={"train_id": str, "location": str, "arrival": str, "departure": str})
+        # the stable sort groups the rows by train and keeps their order within the train
+        stops = stops.sort_values(
+            ["train_id", "sequence"] if "sequence" in stops.columns else "train_id", kind="stable"
+        )
+        if stop_mapping is not None:
+            stops["location"] = stops["location"].map(lambda location: stop_mapping.get(location, location))
+        if infrastructure_ids is not None:
+            known = set(infrastructure_ids)
+            unknown = sorted(set(stops["location"]) - known)
+            if unknown:
+                raise ValueError(f"Timetable locations without infrastructure node: {unknown[:10]}")
+        stops["arrival"] = _parse_times(stops["arrival"])
+        stops["departure"] = _parse_times(stops["departure"])
+        return cls.from_stops(
+            stops["train_id"].to_numpy(),
+            stops["location"].to_numpy(),
+            stops["arrival"].to_numpy(dtype=float),
+            stops["departure"].to_numpy(dtype=float),
+        )
+
+    @classmethod
+    def from_stops(
+        cls, train_ids: np.ndarray, locations: np.ndarray, arrivals: np.ndarray, departures: np.ndarray
+    ) -> "Timetable":
+        """Build a timetable from flat stop arrays, the stops of every train consecutive and in travel order."""
+        is_first = np.ones(len(train_ids), dtype=bool)
+        is_first[1:] = train_ids[1:] != train_ids[:-1]
+        starts = np.flatnonzero(is_first)
+        if len(np.unique(train_ids[starts])) != len(starts):
+            raise ValueError("The stops of every train must be consecutive")
+        lengths = np.diff(np.append(starts, len(train_ids)))
+        order = np.argsort(departures[starts], kind="stable")
+        stop_order = np.concatenate([np.arange(starts[i], starts[i] + lengths[i]) for i in order]) if len(order) else []
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths[order], out=offsets[1:])
+        return cls(
+            train_ids[starts[order]],
+            offsets,
+            locations[stop_order],
+            arrivals[stop_order],
+            departures[stop_order],
+        )
+
+
+class DepartureIndex:
+    """Cursor over a Timetable handing out every train run once, as soon as it is due."""
+
+    def __init__(self, timetable: Timetable):
+        self.timetable = timetable
+        self._next = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next >= len(self.timetable)
+
+    @property
+    def next_departure(self) -> float:
+        return float(self.timetable.run_departures[self._next]) if not self.exhausted else float("inf")
+
+    def pop_due(self, now: float) -> list[TrainRun]:
+        """Train runs departing until `now` that were not handed out yet, in order of departure."""
+        end = int(np.searchsorted(self.timetable.run_departures, now, side="right"))
+        due = [self.timetable.run(i) for i in range(self._next, end)]
+        self._next = max(self._next, end)
+        return due
+
+
+def _parse_times(times: "pd.Series") -> "pd.Series":
+    import pandas as pd
+
+    def parse(value: str | float) -> float:
+        if pd.isna(value) or value == "":
+            return float("nan")
+        if ":" not in value:
+            return float(value)
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds * (60 if value.count(":") == 1 else 1)
+
+    return times.map(parse)
@@ -0,0 +1,263 @@
+import multiprocessing
+from abc import ABCMeta, abstractmethod
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+OBSERVATION_DTYPE = np.float32
+ACTION_DTYPE = np.int64
+REWARD_DTYPE = np.float32
+
+
+class BufferedEnv(metaclass=ABCMeta):
+    """
+    Multi-agent environment with a fixed number of agents that writes its results into arrays owned by the
+    caller, so a vectorized environment can hand out views on shared memory without copying. Agents that are
+    done stay in the arrays with zero observations until the next reset.
+    """
+
+    n_agents: int
+    observation_size: int
+    n_actions: int
+
+    @abstractmethod
+    def reset(self, seed: int | None, observations: np.ndarray) -> None:
+        """Start a new episode and write the first (n_agents, observation_size) observations."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def step(
+        self,
+        actions: np.ndarray,
+        observations: np.ndarray,
+        rewards: np.ndarray,
+        terminations: np.ndarray,
+        truncations: np.ndarray,
+    ) -> None:
+        """Apply one action per agent and write the results, every array has one row per agent."""
+        raise NotImplementedError()
+
+
+@dataclass()
+class SharedBuffers:
+    """The arrays of all sub-environments, every one in its own shared memory block, first axis is the env."""
+
+    observations: np.ndarray  # (n_envs, n_agents, observation_size)
+    final_observations: np.ndarray  # last observations of an episode that was reset automatically
+    actions: np.ndarray  # (n_envs, n_agents)
+    rewards: np.ndarray
+    terminations: np.ndarray
+    truncations: np.ndarray
+    autoreset: np.ndarray  # (n_envs,) whether the env was reset after its last step
+    _blocks: list[SharedMemory]
+
+    @classmethod
+    def create(cls, n_envs: int, n_agents: int, observation_size: int) -> "SharedBuffers":
+        return cls._from_blocks(n_envs, n_agents, observation_size, names=None)
+
+    @classmethod
+    def attach(cls, n_envs: int, n_agents: int, observation_size: int, names: list[str]) -> "SharedBuffers":
+        return cls._from_blocks(n_envs, n_agents, observation_size, names=names)
+
+    @property
+    def names(self) -> list[str]:
+        return [block.name for block in self._blocks]
+
+    def unlink(self) -> None:
+        """Free the blocks once all processes dropped them, the arrays stay usable until then."""
+        for block in self._blocks:
+            block.unlink()
+
+    @classmethod
+    def _from_blocks(
+        cls, n_envs: int, n_agents: int, observation_size: int, names: list[str] | None
+    ) -> "SharedBuffers":
+        layout = [
+            ((n_envs, n_agents, observation_size), OBSERVATION_DTYPE),
+            ((n_envs, n_agents, observation_size), OBSERVATION_DTYPE),
+            ((n_envs, n_agents), ACTION_DTYPE),
+            ((n_envs, n_agents), REWARD_DTYPE),
+            ((n_envs, n_agents), np.bool_),
+            ((n_envs, n_agents), np.bool_),
+            ((n_envs,), np.bool_),
+        ]
+        blocks, arrays = [], []
+        for i, (shape, dtype) in enumerate(layout):
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            block = SharedMemory(create=True, size=size) if names is None else SharedMemory(name=names[i])
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            if names is None:
+                array.fill(0)
+            blocks.append(block)
+            arrays.append(array)
+        return cls(*arrays, _blocks=blocks)
+
+
+class VectorEnv:
+    """
+    Runs BufferedEnvs in worker processes, one per factory, that read their actions from and write their
+    results into SharedBuffers. Only short commands go through the pipes, the returned arrays are views on the
+    shared memory and stay valid until the next step. An env is reset automatically after a step in which all
+    its agents terminated or were truncated: the arrays hold the first observations of the new episode, the
+    last ones of the old episode are in `buffers.final_observations` and `autoreset` marks the env.
+    """
+
+    def __init__(self, env_factories: Sequence[Callable[[], BufferedEnv]], context: str | None = None):
+        """
+        Args:
+            env_factories (Sequence[Callable[[], BufferedEnv]]): Picklable factories of the sub-environments,
+                e.g. functools.partial of a class, they must all have the same agents and spaces.
+            context (str | None): Multiprocessing start method, by default the one of the platform.
+        """
+        probe = env_factories[0]()
+        self.n_agents, self.observation_size, self.n_actions = probe.n_agents, probe.observation_size, probe.n_actions
+        self.n_envs = len(env_factories)
+        # created before the workers start, so they share the resource tracker of this process
+        self.buffers = SharedBuffers.create(self.n_envs, self.n_agents, self.observation_size)
+        spaces = (self.n_agents, self.observation_size, self.n_actions)
+        mp_context = multiprocessing.get_context(context)
+        self._connections: list[Connection] = []
+        self._processes = []
+        for index, factory in enumerate(env_factories):
+            parent, child = mp_context.Pipe()
+            process = mp_context.Process(
+                target=_work, args=(child, factory, index, self.n_envs, spaces, self.buffers.names), daemon=True
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._receive_all()
+        self._waiting = False
+
+    def reset(self, seed: int | None = None) -> np.ndarray:
+        """Reset all envs, `seed` + index of the env if given. Returns the observations."""
+        for index, connection in enumerate(self._connections):
+            connection.send(("reset", None if seed is None else seed + index))
+        self._receive_all()
+        return self.buffers.observations
+
+    def step_async(self, actions: np.ndarray | None = None) -> None:
+        """
+        Start a step of all envs and return at once. The actions can also be written into `buffers.actions`
+        beforehand, then nothing is copied.
+        """
+        if self._waiting:
+            raise RuntimeError("The previous step is still running, call step_wait first")
+        if actions is not None:
+            np.copyto(self.buffers.actions, actions, casting="same_kind")
+        for connection in self._connections:
+            connection.send(("step", None))
+        self._waiting = True
+
+    def step_wait(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Wait for the running step. Returns observations, rewards, terminations, truncations and autoreset."""
+        if not self._waiting:
+            raise RuntimeError("No step is running, call step_async first")
+        self._receive_all()
+        self._waiting = False
+        buffers = self.buffers
+        return buffers.observations, buffers.rewards, buffers.terminations, buffers.truncations, buffers.autoreset
+
+    def step(
+        self, actions: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self) -> None:
+        if self._waiting:
+            self._receive_all()
+        for connection in self._connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self.buffers.unlink()
+        self._connections = []
+        self._processes = []
+
+    def _receive_all(self) -> None:
+        errors = [error for error in (connection.recv() for connection in self._connections) if error is not None]
+        if errors:
+            raise RuntimeError(f"Sub-environment failed: {errors[0]}")
+
+
+def _work(
+    connection: Connection,
+    factory: Callable[[], BufferedEnv],
+    index: int,
+    n_envs: int,
+    spaces: tuple[int, int, int],
+    names: list[str],
+) -> None:
+    env = factory()
+    if (env.n_agents, env.observation_size, env.n_actions) != spaces:
+        connection.send(f"agents and spaces {(env.n_agents, env.observation_size, env.n_actions)} instead of {spaces}")
+        return
+    buffers = SharedBuffers.attach(n_envs, *spaces[:2], names)
+    observations, rewards = buffers.observations[index], buffers.rewards[index]
+    terminations, truncations = buffers.terminations[index], buffers.truncations[index]
+    connection.send(None)
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == "close":
+                break
+            try:
+                if command == "reset":
+                    env.reset(argument, observations)
+                    buffers.autoreset[index] = False
+                elif command == "step":
+                    env.step(buffers.actions[index], observations, rewards, terminations, truncations)
+                    buffers.autoreset[index] = bool(np.all(terminations | truncations))
+                    if buffers.autoreset[index]:
+                        buffers.final_observations[index] = observations
+                        env.reset(None, observations)
+                connection.send(None)
+            except Exception as error:
+                connection.send(repr(error))
+    finally:
+        connection.close()
+
+
+class ParallelEnv:
+    """
+    PettingZoo style parallel API of a single BufferedEnv: dictionaries by agent name, agents that terminated
+    or were truncated leave `agents`. The observations are views on the arrays of the wrapper.
+    """
+
+    def __init__(self, env: BufferedEnv):
+        self.env = env
+        self.possible_agents = [f"agent_{i}" for i in range(env.n_agents)]
+        self._index_by_agent = {agent: i for i, agent in enumerate(self.possible_agents)}
+        self.agents: list[str] = []
+        self._observations = np.zeros((env.n_agents, env.observation_size), dtype=OBSERVATION_DTYPE)
+        self._actions = np.zeros(env.n_agents, dtype=ACTION_DTYPE)
+        self._rewards = np.zeros(env.n_agents, dtype=REWARD_DTYPE)
+        self._terminations = np.zeros(env.n_agents, dtype=np.bool_)
+        self._truncations = np.zeros(env.n_agents, dtype=np.bool_)
+
+    def reset(self, seed: int | None = None, options: dict | None = None) -> tuple[dict, dict]:
+        self.env.reset(seed, self._observations)
+        self.agents = list(self.possible_agents)
+        return {agent: self._observations[i] for i, agent in enumerate(self.agents)}, {
+            agent: {} for agent in self.agents
+        }
+
+    def step(self, actions: dict[str, int]) -> tuple[dict, dict, dict, dict, dict]:
+        """Missing actions are 0."""
+        self._actions.fill(0)
+        for agent, action in actions.items():
+            self._actions[self._index_by_agent[agent]] = action
+        self.env.step(self._actions, self._observations, self._rewards, self._terminations, self._truncations)
+        stepped = [(self._index_by_agent[agent], agent) for agent in self.agents]
+        observations = {agent: self._observations[i] for i, agent in stepped}
+        rewards = {agent: float(self._rewards[i]) for i, agent in stepped}
+        terminations = {agent: bool(self._terminations[i]) for i, agent in stepped}
+        truncations = {agent: bool(self._truncations[i]) for i, agent in stepped}
+        self.agents = [agent for i, agent in stepped if not (self._terminations[i] or self._truncations[i])]
+        return observations, rewards, terminations, truncations, {agent: {} for _, agent in stepped}
@@ -0,0 +1,119 @@
+from collections.abc import Sequence
+
+import numpy as np
+from ugraph import NodeId
+
+from gen_env import GenEnvSimulation
+from next_flatland.network.state_network.link import StateLinkType
+from next_flatland.network.state_network.network import StateNetwork
+from next_flatland.simulation.vector_env import BufferedEnv
+from rail_prototyp import ExternalPolicy, RailArbiter, RailPropagator, RailState, TrainAgent
+
+
+class RailEnv(BufferedEnv):
+    """
+    Multi-agent environment of trains that have to reach their targets, one GenEnvSimulation per episode.
+
+    Action of an agent: 0 waits, i > 0 takes the i-th transition out of its current position.
+    Observation of an agent: the distance to its target, then per transition whether it exists, whether its
+    resources are free and the distance to the target from there. Distances are in transitions scaled by the
+    longest one, -1 if the target can't be reached. An agent gets a reward of 1 and terminates when it reaches
+    its target and leaves the network, every other step costs 1 / max_steps. All agents are truncated after
+    `max_steps`. Episodes are deterministic, the seed is only accepted for the API.
+    """
+
+    def __init__(
+        self, network: StateNetwork, starts: Sequence[NodeId], targets: Sequence[NodeId], max_steps: int = 200
+    ):
+        """
+        Args:
+            network (StateNetwork): Infrastructure and resources without agents, every episode runs on a copy.
+            starts (Sequence[NodeId]): Infrastructure node of every agent at the start of an episode.
+            targets (Sequence[NodeId]): Infrastructure node every agent has to reach.
+            max_steps (int): Length of an episode.
+        """
+        if len(starts) != len(targets):
+            raise ValueError("Every agent needs a start and a target")
+        self.network = network
+        self.starts = list(starts)
+        self.targets = list(targets)
+        self.max_steps = max_steps
+        nodes = network.all_nodes
+        successors: dict[NodeId, list[NodeId]] = {}
+        transitions: list[int] = []
+        for edge, ((s, t), link) in enumerate(network.link_by_tuple_iterator()):
+            if link.link_type == StateLinkType.TRANSITION:
+                successors.setdefault(nodes[s].id, []).append(nodes[t].id)
+                transitions.append(edge)
+        self._successors = {infra_id: tuple(sorted(options)) for infra_id, options in successors.items()}
+        self._vertex_by_id = {node.id: i for i, node in enumerate(nodes)}
+        graph = network.underlying_digraph.subgraph_edges(transitions, delete_vertices=False)
+        distances = np.array(graph.distances(target=[self._vertex_by_id[t] for t in self.targets], mode="out"))
+        finite = distances[np.isfinite(distances)]
+        scale = max(float(finite.max()), 1.0) if finite.size else 1.0
+        # (n_agents, n_nodes) scaled distance of every node to the target of the agent
+        self._distances = np.where(np.isfinite(distances), distances / scale, -1.0).T.astype(np.float32)
+
+        self.n_agents = len(self.starts)
+        self.max_branches = max((len(options) for options in self._successors.values()), default=0)
+        self.n_actions = 1 + self.max_branches
+        self.observation_size = 1 + 3 * self.max_branches
+        self._simulation: GenEnvSimulation | None = None
+        self._steps = 0
+
+    def reset(self, seed: int | None, observations: np.ndarray) -> None:
+        state = RailState(self.network.shallow_copy)
+        for i, start in enumerate(self.starts):
+            state.add_agent_to_network(TrainAgent(id=i, policy=ExternalPolicy(self._successors)), start)
+        self._simulation = GenEnvSimulation(
+            propagator=RailPropagator(occupancy=state.occupancy),
+            state=state,
+            arbiter=RailArbiter(occupancy=state.occupancy, verbose=False),
+        )
+        self._steps = 0
+        self._observe(observations)
+
+    def step(
+        self,
+        actions: np.ndarray,
+        observations: np.ndarray,
+        rewards: np.ndarray,
+        terminations: np.ndarray,
+        truncations: np.ndarray,
+    ) -> None:
+        state = self._simulation.state
+        active = np.zeros(self.n_agents, dtype=np.bool_)
+        for agent in state.agents:
+            agent.policy.action = int(actions[agent.id])
+            active[agent.id] = True
+        self._simulation.queue.clear()
+        self._simulation.step()
+        self._steps += 1
+
+        rewards.fill(0.0)
+        rewards[active] = -1.0 / self.max_steps
+        terminations[:] = ~active
+        for agent in list(state.agents):
+            if self._position(agent) == self.targets[agent.id]:
+                rewards[agent.id] = 1.0
+                terminations[agent.id] = True
+                state.remove_agent_from_network(agent)
+        truncations.fill(self._steps >= self.max_steps)
+        self._observe(observations)
+
+    def _position(self, agent: TrainAgent) -> NodeId:
+        return self._simulation.state.state.neighbors(NodeId(f"agent_{agent.id}"), "out")[0].id
+
+    def _observe(self, observations: np.ndarray) -> None:
+        state = self._simulation.state
+        observations.fill(0.0)
+        for agent in state.agents:
+            agent_id = NodeId(f"agent_{agent.id}")
+            position = self._position(agent)
+            distances = self._distances[agent.id]
+            row = observations[agent.id]
+            row[0] = distances[self._vertex_by_id[position]]
+            for branch, infra_id in enumerate(self._successors.get(position, ())):
+                row[1 + 3 * branch] = 1.0
+                row[2 + 3 * branch] = not state.occupancy.blocking_resources(agent_id, infra_id)
+                row[3 + 3 * branch] = distances[self._vertex_by_id[infra_id]]
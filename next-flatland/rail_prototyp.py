@@ -1,17 +1,43 @@
 from __future__ import annotations
 
+import math
 import random
-from dataclasses import dataclass
-from typing import Dict, List
+from collections import Counter, defaultdict, deque
+from collections.abc import Callable, Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List
 
 from ugraph import EndNodeIdPair, LinkIndex, NodeId, ThreeDCoordinates
 
 from example.rail_network import AGENT_Z, create_example_rail_network
-from gen_env import Agent, Arbiter, Effect, GenEnvSimulation, Propagator, SystemState
+from gen_env import (
+    Agent,
+    Effect,
+    EnvironmentEffect,
+    EnvironmentProcess,
+    GenEnvSimulation,
+    GlobalRule,
+    LocalRule,
+    Observer,
+    Propagator,
+    RuleBasedArbiter,
+    SystemState,
+)
+from next_flatland.network.state_network.collapse import CollapsedNetwork
 from next_flatland.network.state_network.link import StateLink, StateLinkType
 from next_flatland.network.state_network.network import StateNetwork
 from next_flatland.network.state_network.node import StateNode, StateNodeType
-from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure, compose_with_slider
+from next_flatland.network.state_network.occupancy import ResourceLayout, ResourceOccupancy
+from next_flatland.network.state_network.partition import BOUNDARY, NetworkPartition
+from next_flatland.simulation.metrics import KpiAggregator
+from next_flatland.simulation.movement import MovementModel, TimedMovement
+from next_flatland.simulation.timetable import DepartureIndex, TrainRun
+
+if TYPE_CHECKING:
+    # the stream server needs asyncio, it is passed in by the callers that stream
+    from next_flatland.simulation.streaming import StateStreamServer
 
 
 @dataclass()
@@ -39,6 +65,8 @@ class MoveEffect(Effect):
     edge_to_add: EndNodeIdPair
     edge_to_remove: EndNodeIdPair
 
+    subject_type = StateLinkType.OCCUPATION
+
 
 @dataclass()
 class AddEdge(Effect):
@@ -50,11 +78,52 @@ class RemoveEdge(Effect):
     edge: EndNodeIdPair
 
 
+@dataclass()
+class SpawnAgent(EnvironmentEffect):
+    agent: TrainAgent
+    infrastructure_id: NodeId
+
+    def apply(self, state: RailState):
+        state.add_agent_to_network(self.agent, self.infrastructure_id)
+
+    def __getstate__(self) -> dict:
+        # logged without the policy, it references the clock and the route of the run and replays don't act
+        agent = TrainAgent(self.agent.id, max_speed=self.agent.max_speed, length=self.agent.length)
+        return {"agent": agent, "infrastructure_id": self.infrastructure_id}
+
+
+@dataclass()
+class RemoveAgent(EnvironmentEffect):
+    agent_id: int
+
+    def apply(self, state: RailState):
+        # the agent is looked up by id, a replay holds its own copies of the agents
+        state.remove_agent_from_network(next(agent for agent in state.agents if agent.id == self.agent_id))
+
+
+@dataclass()
+class WakeUp(EnvironmentEffect):
+    """An event of the movement model without any occupation change, e.g. a departure from the timetable."""
+
+    time: float
+
+    def apply(self, state: TimedRailState):
+        state.movement.wake_up_at(self.time)
+
+
 @dataclass
 class RandomPolicy:
+    # move along whole macro edges instead of single infrastructure nodes
+    collapsed: CollapsedNetwork | None = None
+
     def propose_next_position(self, agent_id: NodeId, state: StateNetwork) -> StateNode | None:
         # this only works if the agent doesn't have any reservations (a single occupation)
         current_position = state.neighbors(agent_id, "out")[0]
+        if self.collapsed is not None:
+            macro_edges = self.collapsed.macro_edges_from(current_position.id)
+            if not macro_edges:
+                return None
+            return state.node_by_id(random.choice(macro_edges).target)
         possible_next_positions = state.neighbors(current_position.id, "out")
         possible_next_positions = list(
             filter(
@@ -68,13 +137,74 @@ class RandomPolicy:
         return random.choice(list(possible_next_positions))
 
 
+@dataclass
+class RoutePolicy:
+    """Follow a fixed route of infrastructure nodes and wait at every stop until its departure time."""
+
+    route: list[NodeId]
+    departures: dict[NodeId, float]
+    clock: Callable[[], float]
+    _position: int = field(default=0, init=False)
+
+    def propose_next_position(self, agent_id: NodeId, state: StateNetwork) -> StateNode | None:
+        current_position = state.neighbors(agent_id, "out")[0].id
+        try:
+            self._position = self.route.index(current_position, self._position)
+        except ValueError:
+            # off the rest of its route, e.g. moved by hand: wait instead of guessing where to rejoin it
+            return None
+        if self._position == len(self.route) - 1:
+            return None
+        if self.departures.get(current_position, -math.inf) > self.clock():
+            return None
+        return state.node_by_id(self.route[self._position + 1])
+
+
+@dataclass
+class ExternalPolicy:
+    """Move as chosen from outside, e.g. by a learning agent: 0 waits and i > 0 takes the i-th successor."""
+
+    successors: dict[NodeId, tuple[NodeId, ...]]
+    action: int = 0
+
+    def propose_next_position(self, agent_id: NodeId, state: StateNetwork) -> StateNode | None:
+        current_position = state.neighbors(agent_id, "out")[0].id
+        options = self.successors.get(current_position, ())
+        if not 0 < self.action <= len(options):
+            return None
+        return state.node_by_id(options[self.action - 1])
+
+
+def route_via_stops(state: StateNetwork, stops: list[NodeId]) -> list[NodeId]:
+    """Infrastructure nodes of the shortest transition path from the first to the last of `stops`, via all others."""
+    graph = state.underlying_digraph
+    route = [stops[0]]
+    for source, target in zip(stops, stops[1:]):
+        path = graph.get_shortest_paths(source, to=target, mode="out")[0]
+        if not path:
+            raise ValueError(f"No route from {source} to {target}")
+        route.extend(NodeId(graph.vs[i]["name"]) for i in path[1:])
+    return route
+
+
 @dataclass
 class TrainAgent(Agent):
     id: int
-    policy: RandomPolicy = RandomPolicy()
-
-    def __init__(self, id: int):
+    policy: RandomPolicy | RoutePolicy | ExternalPolicy = field(default_factory=RandomPolicy)
+    max_speed: float = 1.0
+    length: float = 0.0
+
+    def __init__(
+        self,
+        id: int,
+        policy: RandomPolicy | RoutePolicy | ExternalPolicy | None = None,
+        max_speed: float = 1.0,
+        length: float = 0.0,
+    ):
         self.id = id
+        self.policy = policy if policy is not None else RandomPolicy()
+        self.max_speed = max_speed
+        self.length = length
 
     def act(self, state: StateNetwork) -> Action:
         agent = state.node_by_id(NodeId(f"agent_{self.id}"))
@@ -86,63 +216,242 @@ class TrainAgent(Agent):
 
 
 @dataclass()
-class RailArbiter(Arbiter):
-    def check_rules(self, state: StateNetwork, effects: list[Effect]) -> list[Effect]:
-        valid_effects: list[Effect] = []
+class TransitionRule(LocalRule):
+    """A move follows a transition of the infrastructure, or a macro edge of the collapsed network."""
 
-        for effect in effects:
-            if isinstance(effect, MoveEffect):
-                agent_id, curr_infra_id = effect.edge_to_remove
-                agent_id, next_infra_id = effect.edge_to_add
-
-                # is transition valid
-                valid_transition = next_infra_id in [node.id for node in state.neighbors(curr_infra_id, "out")]
-                if not valid_transition:
-                    print(f"Invalid transition from {curr_infra_id} to {next_infra_id}")
-                    continue
-
-                # no other agent is in the using next underlying resource
-                resources_to_occupy = filter(
-                    lambda node: node.node_type == StateNodeType.RESOURCE,
-                    state.neighbors(next_infra_id, "out"),
-                )
-                linked_infra = {
-                    infra.id
-                    for resource in resources_to_occupy
-                    for infra in state.neighbors(resource.id, "in")
-                    if infra.node_type == StateNodeType.INFRASTRUCTURE
-                }
-                agents_on_linked_infra = {
-                    agent.id
-                    for infra_id in linked_infra
-                    for agent in state.neighbors(infra_id, "in")
-                    if agent.node_type == StateNodeType.AGENT
-                }
-                if agents_on_linked_infra - {agent_id}:
-                    print(
-                        f"Agent {agent_id} can't move to {next_infra_id}. "
-                        f"Agent {agents_on_linked_infra} is already there."
-                    )
-                    continue
+    effect_types = (MoveEffect,)
+    collapsed: CollapsedNetwork | None = None
+    verbose: bool = True
+
+    def check(self, state: StateNetwork, effect: MoveEffect, facts: dict) -> bool:
+        curr_infra_id = effect.edge_to_remove[1]
+        next_infra_id = effect.edge_to_add[1]
+        entered = entered_infrastructure(state, self.collapsed, curr_infra_id, next_infra_id)
+        if entered is None:
+            if self.verbose:
+                print(f"Invalid transition from {curr_infra_id} to {next_infra_id}")
+            return False
+        facts["entered"] = entered
+        return True
+
+
+@dataclass()
+class ResourceCapacityRule(GlobalRule):
+    """The underlying resources of every entered position have capacity left for the agent."""
+
+    effect_types = (MoveEffect,)
+    occupancy: ResourceOccupancy
+    verbose: bool = True
+
+    def check(self, state: StateNetwork, effect: MoveEffect, facts: dict, context: dict) -> bool:
+        # occupations granted in this step, not yet known to the occupancy counters
+        pending = context.setdefault("pending", Counter())
+        agent_id, next_infra_id = effect.edge_to_add
+        blocking = [
+            resource_id
+            for infra_id in facts["entered"]
+            for resource_id in self.occupancy.blocking_resources(agent_id, infra_id, pending)
+        ]
+        if blocking:
+            if self.verbose:
+                print(f"Agent {agent_id} can't move to {next_infra_id}. Resources {blocking} are at capacity.")
+            return False
+        return True
+
+    def commit(self, state: StateNetwork, effect: MoveEffect, facts: dict, context: dict):
+        context["pending"].update(claimed_resources(self.occupancy, effect.edge_to_add[0], facts["entered"]))
+
+
+@dataclass()
+class RailArbiter(RuleBasedArbiter):
+    occupancy: ResourceOccupancy
+    # accept moves along whole macro edges of the collapsed network
+    collapsed: CollapsedNetwork | None = None
+    # checks the local rules of large steps in chunks, e.g. on a ThreadPoolExecutor
+    executor: Executor | None = field(default=None, kw_only=True)
+    chunk_size: int = field(default=1024, kw_only=True)
+    # print every rejected move
+    verbose: bool = field(default=True, kw_only=True)
+
+    def __post_init__(self):
+        RuleBasedArbiter.__init__(self, self.executor, self.chunk_size)
+        self.register(TransitionRule(self.collapsed, self.verbose))
+        self.register(ResourceCapacityRule(self.occupancy, self.verbose))
+
+    def complete(self, state: StateNetwork, effect: Effect, facts: dict) -> list[Effect]:
+        # the rail system only changes by moves, any other effect is rejected
+        if not isinstance(effect, MoveEffect):
+            return []
+        return _accepted_move_effects(effect)
+
+    def _check_move(self, state: StateNetwork, effect: MoveEffect, pending: Counter[NodeId]) -> bool:
+        """Check a single move against all rules, with the occupations granted so far in `pending`."""
+        local_rules, global_rules = self.rules_for(effect)
+        facts: dict = {}
+        context = {"pending": pending}
+        if not all(rule.check(state, effect, facts) for rule in local_rules):
+            return False
+        if not all(rule.check(state, effect, facts, context) for rule in global_rules):
+            return False
+        for rule in global_rules:
+            rule.commit(state, effect, facts, context)
+        return True
+
+    def _check_region(self, state: StateNetwork, effects: list[MoveEffect]) -> tuple[list[int], Counter[NodeId]]:
+        """Positions of the accepted `effects` of one region and the resources they claim."""
+        accepted: list[int] = []
+        pending: Counter[NodeId] = Counter()
+        for position, effect in enumerate(effects):
+            if self._check_move(state, effect, pending):
+                accepted.append(position)
+        return accepted, pending
+
+
+def entered_infrastructure(
+    state: StateNetwork, collapsed: CollapsedNetwork | None, curr_infra_id: NodeId, next_infra_id: NodeId
+) -> tuple[NodeId, ...] | None:
+    """Infrastructure nodes entered by moving from `curr_infra_id` to `next_infra_id`, None if it is not valid."""
+    if next_infra_id in [node.id for node in state.neighbors(curr_infra_id, "out")]:
+        return (next_infra_id,)
+    if collapsed is not None:
+        return collapsed.traversed(curr_infra_id, next_infra_id)
+    return None
+
+
+def claimed_resources(
+    occupancy: ResourceOccupancy, agent_id: NodeId, entered: tuple[NodeId, ...]
+) -> tuple[NodeId, ...]:
+    """Resources newly claimed by `agent_id` when entering the infrastructure nodes `entered`."""
+    claims = (occupancy.claims(agent_id, infra_id) for infra_id in entered)
+    return tuple(dict.fromkeys(resource_id for resources in claims for resource_id in resources))
+
+
+def _accepted_move_effects(effect: MoveEffect) -> list[Effect]:
+    return [
+        AddEdge(edge=effect.edge_to_add),
+        RemoveEdge(edge=effect.edge_to_remove),
+    ]
+
+
+_worker_state: StateNetwork | None = None
+_worker_arbiter: RailArbiter | None = None
+
+
+def _init_region_worker(
+    state: StateNetwork,
+    collapsed: CollapsedNetwork | None,
+    layout: ResourceLayout,
+    shared_counts_name: str,
+    verbose: bool,
+) -> None:
+    global _worker_state, _worker_arbiter
+    occupancy = ResourceOccupancy.reading_shared_counts(layout, shared_counts_name)
+    _worker_state = state
+    _worker_arbiter = RailArbiter(occupancy, collapsed, verbose=verbose)
+
+
+def _check_region_in_worker(
+    batch: tuple[list[MoveEffect], dict[NodeId, Counter[NodeId]]],
+) -> tuple[list[int], Counter[NodeId]]:
+    effects, holdings_by_agent = batch
+    _worker_arbiter.occupancy.replace_holdings(holdings_by_agent)
+    return _worker_arbiter._check_region(_worker_state, effects)
+
+
+@dataclass()
+class PartitionedRailArbiter(RailArbiter):
+    """
+    RailArbiter that checks the moves of every region of a NetworkPartition independently against the
+    registered rules, optionally in parallel on an executor. Moves onto boundary resources are reconciled
+    afterwards in a serial pass that sees all occupations granted by the regions.
+    """
+
+    partition: NetworkPartition = field(kw_only=True)
+
+    def register(self, rule: LocalRule | GlobalRule):
+        if isinstance(self.executor, ProcessPoolExecutor):
+            raise ValueError("Rules can't be registered while the regions are checked in worker processes")
+        super().register(rule)
+
+    def start_worker_processes(self, state: StateNetwork, max_workers: int | None = None) -> None:
+        """
+        Check the regions in worker processes reading the occupancy counters from shared memory. The workers
+        rebuild the rules of the RailArbiter on a copy of `state`, so no other rules may be registered.
+        """
+        rule_types = {type(rule) for rule in [*self._local_rules, *self._global_rules]}
+        if not rule_types <= {TransitionRule, ResourceCapacityRule}:
+            raise ValueError(f"Worker processes can't check the registered rules {rule_types}")
+        shared_counts_name = self.occupancy.share_counts()
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_region_worker,
+            initargs=(state, self.collapsed, self.occupancy.layout, shared_counts_name, self.verbose),
+        )
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.occupancy.unshare_counts()
 
-                valid_effects.extend(
-                    [
-                        AddEdge(edge=effect.edge_to_add),
-                        RemoveEdge(edge=effect.edge_to_remove),
-                    ]
+    def check_rules(self, state: StateNetwork, effects: list[Effect]) -> list[Effect]:
+        regional_effects: defaultdict[int, list[MoveEffect]] = defaultdict(list)
+        boundary_effects: list[MoveEffect] = []
+        for effect in effects:
+            if not isinstance(effect, MoveEffect):
+                continue
+            curr_infra_id = effect.edge_to_remove[1]
+            next_infra_id = effect.edge_to_add[1]
+            entered = entered_infrastructure(state, self.collapsed, curr_infra_id, next_infra_id)
+            if entered is None:
+                boundary_effects.append(effect)
+                continue
+            region = self.partition.region_of(
+                resource_id for infra_id in entered for resource_id in self.occupancy.resources_of(infra_id)
+            )
+            if region == BOUNDARY:
+                boundary_effects.append(effect)
+                continue
+            regional_effects[region].append(effect)
+
+        if self.executor is None:
+            results = (self._check_region(state, region_effects) for region_effects in regional_effects.values())
+        elif isinstance(self.executor, ProcessPoolExecutor):
+            batches = [
+                (
+                    region_effects,
+                    {e.edge_to_add[0]: self.occupancy.holdings_of(e.edge_to_add[0]) for e in region_effects},
                 )
+                for region_effects in regional_effects.values()
+            ]
+            results = self.executor.map(_check_region_in_worker, batches)
+        else:
+            results = self.executor.map(partial(self._check_region, state), regional_effects.values())
 
+        valid_effects: list[Effect] = []
+        pending: Counter[NodeId] = Counter()
+        for region_effects, (accepted, region_pending) in zip(regional_effects.values(), results):
+            for position in accepted:
+                valid_effects.extend(_accepted_move_effects(region_effects[position]))
+            pending.update(region_pending)
+
+        for effect in boundary_effects:
+            if self._check_move(state, effect, pending):
+                valid_effects.extend(_accepted_move_effects(effect))
         return valid_effects
 
 
 @dataclass
 class RailPropagator(Propagator):
+    occupancy: ResourceOccupancy
+
     def propagate(self, state: StateNetwork, effects: List[Effect]) -> Dict[Agent, bool]:
         """
         Propagates effects by:
         - Validating effect types
         - Updating agent positions
         - Updating rail state relations
+        - Updating resource occupancy counters
         - Tracking completion status
         """
         dones = {"agent": True}
@@ -156,20 +465,213 @@ class RailPropagator(Propagator):
                 links_to_remove.append(state.link_index_by_end_node_id_pair(effect.edge))
             dones["agent"] = False
 
+        self._update_occupancy(state, effects)
         state.delete_links(links_to_remove)
         state.add_links(links_to_add)
 
         return dones
 
+    def _update_occupancy(self, state: StateNetwork, effects: List[Effect]) -> None:
+        for effect in effects:
+            if isinstance(effect, AddEdge):
+                self.occupancy.occupy(*effect.edge)
+            if isinstance(effect, RemoveEdge):
+                self.occupancy.release(*effect.edge)
+
+
+@dataclass
+class TimedRailPropagator(RailPropagator):
+    """
+    RailPropagator in continuous time. An accepted move starts the agent on its way: every entered
+    infrastructure node is occupied at once and released when the tail of the agent clears it, as computed
+    by the movement model. After propagating, the clock jumps to the next arrival or release.
+    """
+
+    movement: TimedMovement = field(kw_only=True)
+    collapsed: CollapsedNetwork | None = field(default=None, kw_only=True)
+
+    def propagate(self, state: StateNetwork, effects: List[Effect]) -> Dict[Agent, bool]:
+        dones = super().propagate(state, effects)
+        self.movement.advance()
+        dones["agent"] = dones["agent"] and not self.movement.has_pending_events
+        return dones
+
+    def _update_occupancy(self, state: StateNetwork, effects: List[Effect]) -> None:
+        sources = {effect.edge[0]: effect.edge[1] for effect in effects if isinstance(effect, RemoveEdge)}
+        for effect in effects:
+            if isinstance(effect, AddEdge):
+                agent_id, next_infra_id = effect.edge
+                entered = entered_infrastructure(state, self.collapsed, sources[agent_id], next_infra_id)
+                self.movement.start(agent_id, (sources[agent_id], *entered))
+
+
+@dataclass
+class RailKpiObserver(Observer):
+    """
+    Feeds the moves of every step into a KpiAggregator: proposed MoveEffects without accepted AddEdge are
+    rejected at the decision time of the step, accepted ones travel until the next step or, in continuous
+    time, until their arrival. Arriving at an infrastructure node listed in `schedule` for the agent counts
+    as a scheduled arrival for punctuality, e.g. with the `scheduled_arrivals` of a TimetableSpawner.
+    """
+
+    kpis: KpiAggregator
+    clock: Callable[[], float]
+    movement: TimedMovement | None = None
+    schedule: Mapping[NodeId, Mapping[NodeId, float]] | None = None
+    _decision_time: float = field(init=False)
+
+    def __post_init__(self):
+        self._decision_time = self.clock()
+
+    @classmethod
+    def attached_to(
+        cls,
+        occupancy: ResourceOccupancy,
+        clock: Callable[[], float],
+        movement: TimedMovement | None = None,
+        schedule: Mapping[NodeId, Mapping[NodeId, float]] | None = None,
+    ) -> RailKpiObserver:
+        kpis = KpiAggregator(clock)
+        kpis.attach(occupancy)
+        return cls(kpis, clock, movement, schedule)
+
+    def observe(self, state: SystemState, proposed: List[Effect], accepted: List[Effect]):
+        moved = [effect.edge for effect in accepted if isinstance(effect, AddEdge)]
+        moved_ids = {agent_id for agent_id, _ in moved}
+        for effect in proposed:
+            if isinstance(effect, MoveEffect) and effect.edge_to_add[0] not in moved_ids:
+                self.kpis.reject(effect.edge_to_add[0], self._decision_time)
+        for agent_id, infra_id in moved:
+            if self.movement is not None:
+                departure, arrival = self.movement.departure(agent_id), self.movement.arrival(agent_id)
+            else:
+                departure, arrival = self._decision_time, self.clock()
+            self.kpis.move(agent_id, departure, arrival)
+            scheduled = self.schedule.get(agent_id, {}).get(infra_id) if self.schedule is not None else None
+            if scheduled is not None and not math.isnan(scheduled):
+                self.kpis.arrive(agent_id, scheduled, arrival)
+        self._decision_time = self.clock()
+
+
+@dataclass
+class RailStreamObserver(Observer):
+    """
+    Publishes the accepted AddEdge and RemoveEdge effects of every step to a StateStreamServer, together
+    with the links of agents that entered or left the network outside of effects, e.g. by a timetable.
+    Frames are numbered by `steps`, the step count of the simulation, e.g.
+    `functools.partial(getattr, simulation, "n_steps")`, so they stay right when the observer is attached
+    to a running or resumed simulation.
+    """
+
+    server: StateStreamServer
+    steps: Callable[[], int]
+    _agent_ids: set[NodeId] = field(default_factory=set, init=False)
+
+    def observe(self, state: SystemState, proposed: List[Effect], accepted: List[Effect]):
+        added = [effect.edge for effect in accepted if isinstance(effect, AddEdge)]
+        removed = [effect.edge for effect in accepted if isinstance(effect, RemoveEdge)]
+        agent_ids = {NodeId(f"agent_{agent.id}") for agent in state.agents}
+        for agent_id in agent_ids - self._agent_ids:
+            added.extend((agent_id, infra.id) for infra in state.state.neighbors(agent_id, "out"))
+        removed_agents = self._agent_ids - agent_ids
+        self._agent_ids = agent_ids
+        self.server.publish(self.steps(), added, removed, removed_agents)
+
+
+@dataclass
+class TimetableSpawner(EnvironmentProcess):
+    """
+    Spawns a TrainAgent following its route for every train run of a timetable as soon as the run departs and
+    the resources of its origin have capacity left, and removes the agent again once it stands at its
+    destination. Only departed trains exist in the network, so the cost of a step follows the active trains
+    and not the whole timetable.
+    """
+
+    departures: DepartureIndex
+    clock: Callable[[], float]
+    max_speed: float = 1.0
+    length: float = 0.0
+    first_agent_id: int = 0
+    train_id_by_agent: dict[NodeId, str] = field(default_factory=dict, init=False)
+    # scheduled arrival by stop of every agent in the network, for the punctuality of a RailKpiObserver
+    scheduled_arrivals: dict[NodeId, dict[NodeId, float]] = field(default_factory=dict, init=False)
+    _waiting: deque[TrainRun] = field(default_factory=deque, init=False)
+    _active: dict[NodeId, tuple[TrainAgent, NodeId]] = field(default_factory=dict, init=False)
+    _routes: dict[tuple[NodeId, ...], list[NodeId]] = field(default_factory=dict, init=False)
+    _next_agent_id: int = field(init=False)
+
+    def __post_init__(self):
+        self._next_agent_id = self.first_agent_id
+
+    @property
+    def n_active(self) -> int:
+        return len(self._active)
+
+    def apply(self, state: RailState) -> list[EnvironmentEffect]:
+        now = self.clock()
+        movement = state.movement if isinstance(state, TimedRailState) else None
+        changes: list[EnvironmentEffect] = []
+        for agent_id, (agent, destination) in list(self._active.items()):
+            if state.state.neighbors(agent_id, "out")[0].id != destination:
+                continue
+            if movement is not None and movement.is_moving(agent_id):
+                continue
+            changes.append(_applied(RemoveAgent(agent.id), state))
+            del self._active[agent_id]
+            del self.scheduled_arrivals[agent_id]
+
+        self._waiting.extend(self.departures.pop_due(now))
+        blocked: deque[TrainRun] = deque()
+        while self._waiting:
+            run = self._waiting.popleft()
+            agent_id = NodeId(f"agent_{self._next_agent_id}")
+            if state.occupancy.blocking_resources(agent_id, run.origin):
+                blocked.append(run)
+                continue
+            changes.append(_applied(self._spawn(state, run), state))
+            if movement is not None:
+                changes.extend(_applied(WakeUp(stop.departure), state) for stop in run.stops[1:-1])
+        self._waiting = blocked
+        if movement is not None and not self.departures.exhausted:
+            changes.append(_applied(WakeUp(self.departures.next_departure), state))
+        return changes
+
+    def is_done(self) -> bool:
+        return self.departures.exhausted and not self._waiting and not self._active
+
+    def _spawn(self, state: RailState, run: TrainRun) -> SpawnAgent:
+        stops = tuple(stop.infrastructure_id for stop in run.stops)
+        if stops not in self._routes:
+            self._routes[stops] = route_via_stops(state.state, list(stops))
+        policy = RoutePolicy(
+            route=self._routes[stops],
+            departures={stop.infrastructure_id: stop.departure for stop in run.stops[:-1]},
+            clock=self.clock,
+        )
+        agent = TrainAgent(id=self._next_agent_id, policy=policy, max_speed=self.max_speed, length=self.length)
+        self._next_agent_id += 1
+        agent_id = NodeId(f"agent_{agent.id}")
+        self.train_id_by_agent[agent_id] = run.train_id
+        self.scheduled_arrivals[agent_id] = {stop.infrastructure_id: stop.arrival for stop in run.stops[1:]}
+        self._active[agent_id] = (agent, run.destination)
+        return SpawnAgent(agent, run.origin)
+
+
+def _applied(change: EnvironmentEffect, state: RailState) -> EnvironmentEffect:
+    change.apply(state)
+    return change
+
 
 @dataclass(slots=True)
 class RailState(SystemState):
     state: StateNetwork
     agents: list[TrainAgent]
+    occupancy: ResourceOccupancy
 
     def __init__(self, state: StateNetwork):
         self.state = state
         self.agents = []
+        self.occupancy = ResourceOccupancy.from_state_network(state)
 
     def actions_to_effects(self, actions: list[Action]) -> list[Effect]:
         effects = []
@@ -213,10 +715,49 @@ class RailState(SystemState):
                 )
             ]
         )
+        self.occupancy.occupy(agent_node_id, infrastructure_id)
+
+    def remove_agent_from_network(self, agent: TrainAgent):
+        agent_node_id = NodeId(f"agent_{agent.id}")
+        self._release_agent(agent_node_id)
+        self.agents.remove(agent)
+        self.state.delete_nodes([agent_node_id])
+
+    def _release_agent(self, agent_node_id: NodeId):
+        for infra in self.state.neighbors(agent_node_id, "out"):
+            self.occupancy.release(agent_node_id, infra.id)
+
+
+@dataclass(slots=True)
+class TimedRailState(RailState):
+    """RailState in continuous time, agents on their way to their next position don't act."""
+
+    movement: TimedMovement
+
+    def __init__(self, state: StateNetwork):
+        RailState.__init__(self, state)
+        self.movement = TimedMovement(MovementModel.from_state_network(state), self.occupancy)
+
+    def pull_actions(self):
+        actions = []
+        for agent in self.agents:
+            if self.movement.is_moving(NodeId(f"agent_{agent.id}")):
+                continue
+            actions.append(agent.act(self.state))
+        return actions
+
+    def add_agent_to_network(self, agent: TrainAgent, infrastructure_id: NodeId):
+        RailState.add_agent_to_network(self, agent, infrastructure_id)
+        self.movement.register(NodeId(f"agent_{agent.id}"), infrastructure_id, agent.max_speed, agent.length)
+
+    def _release_agent(self, agent_node_id: NodeId):
+        self.movement.unregister(agent_node_id)
 
 
 # Example usage
 if __name__ == "__main__":
+    from next_flatland.network.state_network.plot_3d import add_state_network_in_3d_to_figure, compose_with_slider
+
     rail_network = create_example_rail_network()
     agents = [TrainAgent(id=i) for i in range(2)]
     rail_state = RailState(state=rail_network)
@@ -224,8 +765,8 @@ if __name__ == "__main__":
     rail_state.add_agent_to_network(agents[1], NodeId("5_backward"))
     figures = [add_state_network_in_3d_to_figure(rail_state.state)]
 
-    rail_arbiter = RailArbiter()
-    rail_propagator = RailPropagator()
+    rail_arbiter = RailArbiter(occupancy=rail_state.occupancy)
+    rail_propagator = RailPropagator(occupancy=rail_state.occupancy)
 
     # Create and run simulation
     simulation = GenEnvSimulation(propagator=rail_propagator, state=rail_state, arbiter=rail_arbiter)
@@ -2,19 +2,23 @@ from dataclasses import dataclass
 from typing import Dict, List, TypeVar
 
 from gen_env import Relation
+from next_flatland.network.state_network import StateNetwork
+from next_flatland.network.state_network.route_table import Route, compile_route_table
 
 EntityType = TypeVar("EntityType")
 StateType = TypeVar("StateType")
 
 
-@dataclass
+# compared and hashed by identity, resources are keys of the valid routes
+@dataclass(eq=False)
 class Resource:
     id: int
 
 
-@dataclass
+@dataclass(eq=False)
 class RailResource(Resource):
     id: int
+    # resources a train may continue to by the resource it entered from, itself for trains starting here
     valid_routes: Dict[Resource, List[Resource]]
 
 
@@ -26,14 +30,18 @@ class RailNetwork:
         self._initialize_relations()
 
     def _initialize_routes(self):
-        # Define valid routes for straight line 0->1->2->3->4->5
-        for i in range(5):
-            self.resources[i].valid_routes[self.resources[i]] = [self.resources[i + 1]]
-            self.resources[i + 1].valid_routes[self.resources[i + 1]] = [self.resources[i]]
-
-        # Define valid routes for straight line 6->7
-        self.resources[6].valid_routes[self.resources[6]] = [self.resources[7]]
-        self.resources[7].valid_routes[self.resources[7]] = [self.resources[6]]
+        # Define valid routes for straight line 0->1->2->3->4->5, trains start and end at both ends
+        self.resources[0].valid_routes[self.resources[0]] = [self.resources[1]]
+        self.resources[5].valid_routes[self.resources[5]] = [self.resources[4]]
+        for i in range(1, 5):
+            self.resources[i].valid_routes[self.resources[i - 1]] = [self.resources[i + 1]]
+            self.resources[i].valid_routes[self.resources[i + 1]] = [self.resources[i - 1]]
+
+        # Define valid routes for straight line 1->6->7->4
+        self.resources[6].valid_routes[self.resources[1]] = [self.resources[7]]
+        self.resources[6].valid_routes[self.resources[7]] = [self.resources[1]]
+        self.resources[7].valid_routes[self.resources[6]] = [self.resources[4]]
+        self.resources[7].valid_routes[self.resources[4]] = [self.resources[6]]
 
         # Add switch connections
         # At resource 1 (connecting to 6)
@@ -53,11 +61,28 @@ class RailNetwork:
         self.resources[4].valid_routes[self.resources[7]] = [self.resources[5]]
 
     def _initialize_relations(self):
-        for resource in self.resources:
-            for from_resource, to_resources in resource.valid_routes.items():
-                for to_resource in to_resources:
-                    relation = Relation(from_entity=from_resource, to_entity=to_resource)
-                    self.relations.append(relation)
+        # a resource relates to every resource a train may continue to from it, whichever side it entered from
+        successors = {
+            (resource, to_resource): None
+            for resource in self.resources
+            for to_resources in resource.valid_routes.values()
+            for to_resource in to_resources
+        }
+        for resource, to_resource in successors:
+            relation = Relation(from_entity=resource, to_entity=to_resource)
+            self.relations.append(relation)
+
+    def route_table(self) -> list[Route]:
+        """(resource, entered from, continue to) ids of all valid routes."""
+        return [
+            (resource.id, from_resource.id, to_resource.id)
+            for resource in self.resources
+            for from_resource, to_resources in resource.valid_routes.items()
+            for to_resource in to_resources
+        ]
+
+    def to_state_network(self) -> StateNetwork:
+        return compile_route_table(self.route_table())
 
     def get_resources(self):
         return self.resources
@@ -71,3 +96,5 @@ if __name__ == "__main__":
     rail_network = RailNetwork()
     resources = rail_network.get_resources()
     relations = rail_network.get_relations()
+    state_network = rail_network.to_state_network()
+    print(state_network.validate_topology())
@@ -0,0 +1,25 @@
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, StateNode, StateNodeType
+
+
+def parallel_lines(n_lines: int, length: int) -> StateNetwork:
+    """`n_lines` one-way lines of `length` sections, every section has one infrastructure node and resource."""
+    nodes, links = [], []
+    for line in range(n_lines):
+        for i in range(length):
+            resource_id = NodeId(f"{line}_{i}")
+            nodes.append(
+                StateNode(id=resource_id, coordinates=ThreeDCoordinates(i, line, -50), node_type=StateNodeType.RESOURCE)
+            )
+            infra_id = NodeId(f"{line}_{i}_f")
+            nodes.append(
+                StateNode(
+                    id=infra_id, coordinates=ThreeDCoordinates(i, line, 0), node_type=StateNodeType.INFRASTRUCTURE
+                )
+            )
+            links.append((EndNodeIdPair((infra_id, resource_id)), StateLink(link_type=StateLinkType.ALLOCATION)))
+            if i:
+                transition = StateLink(link_type=StateLinkType.TRANSITION)
+                links.append((EndNodeIdPair((NodeId(f"{line}_{i - 1}_f"), infra_id)), transition))
+    return StateNetwork.create_new(nodes, links)
@@ -0,0 +1,91 @@
+import functools
+import random
+from pathlib import Path
+
+import numpy as np
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from gen_env import GenEnvSimulation
+from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, StateNode, StateNodeType
+from next_flatland.simulation.checkpoint import CheckpointStore
+from rail_prototyp import RailArbiter, RailKpiObserver, TimedRailPropagator, TimedRailState, TrainAgent
+
+N_AGENTS = 20
+
+
+def _line(n_sections: int) -> StateNetwork:
+    nodes, links = [], []
+    for i in range(n_sections):
+        resource_id = NodeId(str(i))
+        nodes.append(
+            StateNode(id=resource_id, coordinates=ThreeDCoordinates(i, 0, -50), node_type=StateNodeType.RESOURCE)
+        )
+        for direction in ("f", "b"):
+            infra_id = NodeId(f"{i}_{direction}")
+            nodes.append(
+                StateNode(
+                    id=infra_id,
+                    coordinates=ThreeDCoordinates(i, 0, 0),
+                    node_type=StateNodeType.INFRASTRUCTURE,
+                    length=1.0,
+                )
+            )
+            links.append((EndNodeIdPair((infra_id, resource_id)), StateLink(link_type=StateLinkType.ALLOCATION)))
+        if i:
+            transition = StateLink(link_type=StateLinkType.TRANSITION)
+            links.append((EndNodeIdPair((NodeId(f"{i - 1}_f"), NodeId(f"{i}_f"))), transition))
+            links.append((EndNodeIdPair((NodeId(f"{i}_b"), NodeId(f"{i - 1}_b"))), transition))
+    return StateNetwork.create_new(nodes, links)
+
+
+def _simulation(n_sections: int) -> tuple[GenEnvSimulation, dict]:
+    random.seed(0)
+    np.random.seed(0)
+    state = TimedRailState(_line(n_sections))
+    for i in range(N_AGENTS):
+        state.add_agent_to_network(TrainAgent(i), NodeId(f"{i * 3}_f"))
+    clock = functools.partial(getattr, state.movement, "now")
+    simulation = GenEnvSimulation(
+        TimedRailPropagator(state.occupancy, movement=state.movement),
+        state,
+        RailArbiter(state.occupancy, verbose=False),
+        observers=[RailKpiObserver.attached_to(state.occupancy, clock, state.movement)],
+    )
+    return simulation, {"clock": clock}
+
+
+def _run(simulation: GenEnvSimulation, n_steps: int) -> None:
+    for _ in range(n_steps):
+        simulation.step()
+        simulation.queue.clear()
+
+
+def _snapshot(simulation: GenEnvSimulation) -> tuple:
+    state = simulation.state
+    positions = sorted(
+        (link[0], link[1]) for link in state.state.end_node_id_pair_iterator if link[0].startswith("agent")
+    )
+    return simulation.n_steps, state.movement.now, positions, state.occupancy.counts.tolist()
+
+
+def _checkpoint_size(tmp_path: Path, n_sections: int) -> int:
+    simulation, static = _simulation(n_sections)
+    _run(simulation, 10)
+    return simulation.checkpoint(CheckpointStore(tmp_path / str(n_sections), static)).stat().st_size
+
+
+def test_checkpoint_size_does_not_grow_with_the_network(tmp_path: Path) -> None:
+    assert _checkpoint_size(tmp_path, 5000) <= _checkpoint_size(tmp_path, 500) * 1.05
+
+
+def test_resume_continues_deterministically(tmp_path: Path) -> None:
+    simulation, static = _simulation(200)
+    _run(simulation, 10)
+    path = simulation.checkpoint(CheckpointStore(tmp_path, static))
+    _run(simulation, 15)
+
+    resumed = GenEnvSimulation.resume(CheckpointStore(tmp_path, static), path)
+    _run(resumed, 15)
+
+    assert _snapshot(resumed) == _snapshot(simulation)
+    assert resumed.observers[0].kpis.summary_frame().equals(simulation.observers[0].kpis.summary_frame())
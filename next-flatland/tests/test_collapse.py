@@ -0,0 +1,44 @@
+import pytest
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, StateNode, StateNodeType
+from next_flatland.network.state_network.collapse import collapse_state_network
+
+
+def _network(transitions: list[tuple[str, str]]) -> StateNetwork:
+    infra_ids = list(dict.fromkeys(infra_id for transition in transitions for infra_id in transition))
+    nodes = [
+        StateNode(
+            id=NodeId(infra_id), coordinates=ThreeDCoordinates(x=i, y=0, z=0), node_type=StateNodeType.INFRASTRUCTURE
+        )
+        for i, infra_id in enumerate(infra_ids)
+    ]
+    links = [
+        (EndNodeIdPair((NodeId(s), NodeId(t))), StateLink(link_type=StateLinkType.TRANSITION)) for s, t in transitions
+    ]
+    return StateNetwork.create_new(nodes, links)
+
+
+@pytest.mark.parametrize(
+    "transitions",
+    [
+        [("a", "x"), ("x", "y"), ("y", "b"), ("a", "b"), ("b", "c")],
+        [("a", "b"), ("a", "x"), ("x", "y"), ("y", "b"), ("b", "c")],
+    ],
+)
+def test_parallel_chains_keep_every_node_reachable(transitions: list[tuple[str, str]]) -> None:
+    collapsed = collapse_state_network(_network(transitions))
+
+    assert len(collapsed.macro_edges) == len({(e.source, e.target) for e in collapsed.macro_edges.values()})
+    assert collapsed.traversed(NodeId("a"), NodeId("b")) == (NodeId("b"),)
+    for infra_id in ("x", "y"):
+        assert collapsed.macro_edges_from(NodeId(infra_id)), infra_id
+    entered = [infra_id for edge in collapsed.macro_edges.values() for infra_id in edge.path]
+    assert {"a", "x", "y", "b", "c"} <= set(entered)
+
+
+def test_parallel_chains_of_equal_length_are_split() -> None:
+    collapsed = collapse_state_network(_network([("a", "x"), ("x", "b"), ("a", "y"), ("y", "b"), ("b", "c")]))
+
+    assert collapsed.macro_edges_from(NodeId("x")) and collapsed.macro_edges_from(NodeId("y"))
+    assert collapsed.network.n_count == len({n for e in collapsed.macro_edges for n in e})
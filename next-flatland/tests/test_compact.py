@@ -0,0 +1,27 @@
+from example.rail_network import create_example_rail_network
+from next_flatland.network.state_network import StateNetwork
+from next_flatland.network.state_network.compact import CompactStateNetwork
+from scenario import RailNetwork
+
+
+def _links(network: StateNetwork | CompactStateNetwork) -> dict:
+    return dict(network.link_by_end_node_iterator())
+
+
+def test_scenario_round_trips_through_the_compact_network() -> None:
+    network = RailNetwork().to_state_network()
+    restored = CompactStateNetwork.from_state_network(network).to_state_network()
+    assert restored.all_nodes == network.all_nodes
+    assert _links(restored) == _links(network)
+    assert restored.l_count == network.l_count
+
+
+def test_region_keeps_the_links_between_its_nodes() -> None:
+    network = create_example_rail_network()
+    compact = CompactStateNetwork.from_state_network(network)
+    region = [node.id for node in network.all_nodes[::2]]
+    restored = compact.to_state_network(compact.node_index_by_name(node_id) for node_id in region)
+    assert sorted(node.id for node in restored.all_nodes) == sorted(region)
+    assert _links(restored) == {
+        pair: link for pair, link in _links(network).items() if pair[0] in region and pair[1] in region
+    }
@@ -0,0 +1,46 @@
+import math
+
+import pytest
+
+from next_flatland.network.state_network.occupancy import ResourceOccupancy
+from next_flatland.simulation.movement import MovementModel, Passage, TimedMovement
+
+
+def _movement() -> TimedMovement:
+    # three sections of 10, the middle one allows 5 and the transition into the last one 2
+    model = MovementModel({"x0": 10, "x1": 10, "x2": 10}, {"x0": 10, "x1": 5, "x2": 10}, {("x1", "x2"): 2})
+    occupancy = ResourceOccupancy({f"x{i}": (f"r{i}",) for i in range(3)}, {f"r{i}": 1 for i in range(3)})
+    occupancy.occupy("train", "x0")
+    movement = TimedMovement(model, occupancy)
+    movement.register("train", "x0", speed=10, train_length=5)
+    return movement
+
+
+def test_profile_takes_the_lowest_speed_limit_of_every_section() -> None:
+    assert _movement().model.profile(["x0", "x1", "x2"], departure=3, speed=10) == ([0, 10, 20], [3, 5, 10])
+
+
+def test_start_schedules_the_release_when_the_tail_clears_a_section() -> None:
+    movement = _movement()
+    passages = movement.start("train", ["x0", "x1", "x2"])
+    assert passages == [Passage("x0", 0, 1), Passage("x1", 0, 4.5), Passage("x2", 2, math.inf)]
+    assert movement.occupancy.counts.tolist() == [1, 1, 1]
+    assert movement.is_moving("train") and movement.arrival("train") == 7
+    with pytest.raises(ValueError):
+        movement.unregister("train")
+
+    assert movement.advance() == [("train", "x0")] and movement.now == 1
+    assert movement.advance() == [("train", "x1")] and movement.now == 4.5
+    assert movement.advance() == [] and movement.now == 7
+    assert not movement.is_moving("train") and not movement.has_pending_events
+
+
+def test_clock_jumps_to_wake_ups_and_stops_at_the_last_event() -> None:
+    movement = _movement()
+    movement.wake_up_at(12)
+    movement.wake_up_at(-1)
+    assert movement.next_event_time() == 12
+    movement.advance()
+    assert movement.now == 12 and movement.advance() == [] and movement.now == 12
+    movement.unregister("train")
+    assert movement.occupancy.counts.tolist() == [0, 0, 0]
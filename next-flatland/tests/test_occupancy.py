@@ -0,0 +1,67 @@
+import pickle
+
+import pytest
+
+from next_flatland.network.state_network.occupancy import ResourceOccupancy
+
+
+def _occupancy() -> ResourceOccupancy:
+    # the platform is a resource for two trains spanning both of its infrastructure nodes
+    return ResourceOccupancy({"a": ("platform",), "b": ("platform",), "c": ("switch",)}, {"platform": 2, "switch": 1})
+
+
+def test_agent_on_several_nodes_of_a_resource_counts_once() -> None:
+    occupancy = _occupancy()
+    changes = []
+    occupancy.listeners.append(lambda resource_id, change: changes.append((resource_id, change)))
+    occupancy.occupy("t1", "a")
+    occupancy.occupy("t1", "b")
+    assert occupancy.count("platform") == 1 and occupancy.holdings_of("t1") == {"platform": 2}
+    occupancy.release("t1", "a")
+    assert occupancy.count("platform") == 1
+    occupancy.release("t1", "b")
+    assert occupancy.count("platform") == 0 and not occupancy.holds("t1", "platform")
+    assert changes == [("platform", 1), ("platform", -1)]
+    with pytest.raises(ValueError):
+        occupancy.release("t1", "b")
+
+
+def test_blocking_resources_count_capacity_and_pending_occupations() -> None:
+    occupancy = _occupancy()
+    occupancy.occupy("t1", "a")
+    occupancy.occupy("t2", "c")
+    assert occupancy.blocking_resources("t3", "b") == []
+    assert occupancy.blocking_resources("t3", "b", pending={"platform": 1}) == ["platform"]
+    assert occupancy.blocking_resources("t3", "c") == ["switch"]
+    # an agent never blocks itself on a resource it holds
+    assert occupancy.blocking_resources("t1", "b", pending={"platform": 1}) == []
+
+
+def test_pickling_rebuilds_the_counters_from_the_holdings() -> None:
+    occupancy = _occupancy()
+    occupancy.occupy("t1", "a")
+    occupancy.occupy("t1", "b")
+    occupancy.occupy("t2", "c")
+    restored = pickle.loads(pickle.dumps(occupancy))
+    assert restored.counts.tolist() == occupancy.counts.tolist()
+    restored.release("t1", "a")
+    restored.release("t1", "b")
+    assert restored.count("platform") == 0 and occupancy.count("platform") == 1
+
+
+def test_replica_reads_the_shared_counters() -> None:
+    occupancy = _occupancy()
+    occupancy.occupy("t1", "a")
+    name = occupancy.share_counts()
+    try:
+        assert occupancy.share_counts() == name
+        replica = ResourceOccupancy.reading_shared_counts(occupancy.layout, name)
+        assert replica.count("platform") == 1
+        occupancy.occupy("t2", "c")
+        assert replica.counts.tolist() == [1, 1]
+        replica.replace_holdings({"t2": {"switch": 1}})
+        assert replica.blocking_resources("t3", "c") == ["switch"] and replica.blocking_resources("t2", "c") == []
+    finally:
+        occupancy.unshare_counts()
+    occupancy.release("t2", "c")
+    assert occupancy.counts.tolist() == [1, 0]
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from ugraph import EndNodeIdPair, NodeId
+
+from gen_env import LocalRule
+from next_flatland.network.state_network import StateNetwork
+from next_flatland.network.state_network.partition import partition_state_network
+from rail_prototyp import MoveEffect, PartitionedRailArbiter, RailState, TrainAgent
+from tests.networks import parallel_lines
+
+
+class NoEntryRule(LocalRule):
+    effect_types = (MoveEffect,)
+
+    def __init__(self, closed: set[NodeId]):
+        self.closed = closed
+
+    def check(self, state: StateNetwork, effect: MoveEffect, facts: dict) -> bool:
+        return effect.edge_to_add[1] not in self.closed
+
+
+@pytest.fixture
+def arbiter_and_effects() -> tuple[PartitionedRailArbiter, RailState, list[MoveEffect]]:
+    network = parallel_lines(4, 10)
+    state = RailState(network)
+    for line in range(4):
+        state.add_agent_to_network(TrainAgent(line), NodeId(f"{line}_0_f"))
+    effects = [
+        MoveEffect(
+            edge_to_add=EndNodeIdPair((NodeId(f"agent_{line}"), NodeId(f"{line}_1_f"))),
+            edge_to_remove=EndNodeIdPair((NodeId(f"agent_{line}"), NodeId(f"{line}_0_f"))),
+        )
+        for line in range(4)
+    ]
+    arbiter = PartitionedRailArbiter(state.occupancy, partition=partition_state_network(network, 5), verbose=False)
+    return arbiter, state, effects
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_regions_are_checked_against_registered_rules(arbiter_and_effects, threads) -> None:
+    arbiter, state, effects = arbiter_and_effects
+    arbiter.executor = ThreadPoolExecutor(threads) if threads else None
+    assert len(arbiter.check_rules(state.state, effects)) == 2 * len(effects)
+
+    arbiter.register(NoEntryRule({NodeId("1_1_f"), NodeId("3_1_f")}))
+    accepted = {effect.edge for effect in arbiter.check_rules(state.state, effects) if hasattr(effect, "edge")}
+    assert accepted == {edge for effect in effects[0::2] for edge in (effect.edge_to_add, effect.edge_to_remove)}
+
+
+def test_worker_processes_reject_other_rules(arbiter_and_effects) -> None:
+    arbiter, state, effects = arbiter_and_effects
+    arbiter.register(NoEntryRule(set()))
+    with pytest.raises(ValueError):
+        arbiter.start_worker_processes(state.state, 1)
@@ -0,0 +1,80 @@
+from ugraph import EndNodeIdPair, NodeId, ThreeDCoordinates
+
+from next_flatland.network.state_network import (
+    PathService,
+    StateLink,
+    StateLinkType,
+    StateNetwork,
+    StateNode,
+    StateNodeType,
+)
+
+
+def _network() -> StateNetwork:
+    """s reaches t over a or b, u reaches v; a allocates its own resource and the crossing x."""
+    allocations = {"s": ["r_s"], "a": ["r_a", "x"], "b": ["r_b"], "t": ["r_t"], "u": ["r_u"], "v": ["r_v", "x"]}
+    resources = sorted({r for resource_ids in allocations.values() for r in resource_ids})
+    nodes = [
+        StateNode(id=NodeId(i), coordinates=ThreeDCoordinates(k, 0, 0), node_type=StateNodeType.INFRASTRUCTURE)
+        for k, i in enumerate(allocations)
+    ] + [
+        StateNode(id=NodeId(r), coordinates=ThreeDCoordinates(k, 0, -50), node_type=StateNodeType.RESOURCE)
+        for k, r in enumerate(resources)
+    ]
+    links = [
+        (EndNodeIdPair((NodeId(s), NodeId(t))), StateLink(link_type=StateLinkType.TRANSITION))
+        for s, t in [("s", "a"), ("a", "t"), ("s", "b"), ("b", "t"), ("u", "v")]
+    ] + [
+        (EndNodeIdPair((NodeId(i), NodeId(r))), StateLink(link_type=StateLinkType.ALLOCATION))
+        for i, resource_ids in allocations.items()
+        for r in resource_ids
+    ]
+    return StateNetwork.create_new(nodes, links)
+
+
+def _routes(service: PathService, source: str, target: str) -> list[tuple[str, ...]]:
+    return [route.infrastructure for route in service.routes(NodeId(source), NodeId(target))]
+
+
+def test_routes_are_cached_per_source_and_target() -> None:
+    service = PathService(_network())
+    assert sorted(_routes(service, "s", "t")) == [("s", "a", "t"), ("s", "b", "t")]
+    assert [route.cost for route in service.routes("s", "t")] == [2.0, 2.0]
+    _routes(service, "s", "t")
+    assert (service.hits, service.misses) == (2, 1)
+
+
+def test_blocking_drops_only_the_routes_through_the_resource() -> None:
+    service = PathService(_network())
+    _routes(service, "s", "t")
+    _routes(service, "u", "v")
+    service.block("r_a")
+    assert _routes(service, "u", "v") == [("u", "v")]
+    assert _routes(service, "s", "t") == [("s", "b", "t")]
+    assert (service.hits, service.misses) == (1, 3)
+
+    service.release("r_a")
+    assert _routes(service, "u", "v") == [("u", "v")]
+    assert sorted(_routes(service, "s", "t")) == [("s", "a", "t"), ("s", "b", "t")]
+    assert (service.hits, service.misses) == (2, 4)
+
+
+def test_node_stays_excluded_while_another_of_its_resources_is_blocked() -> None:
+    service = PathService(_network())
+    service.block("r_a")
+    service.block("x")
+    assert _routes(service, "u", "v") == []
+    service.release("r_a")
+    assert _routes(service, "s", "t") == [("s", "b", "t")]
+    service.block("r_b")
+    assert _routes(service, "s", "t") == []
+    service.release("x")
+    assert _routes(service, "s", "t") == [("s", "a", "t")] and _routes(service, "u", "v") == [("u", "v")]
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    service = PathService(_network(), max_entries=1)
+    _routes(service, "s", "t")
+    _routes(service, "u", "v")
+    _routes(service, "s", "t")
+    assert (service.hits, service.misses) == (0, 3)
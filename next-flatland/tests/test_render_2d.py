@@ -0,0 +1,53 @@
+import shutil
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from next_flatland.network.state_network.render_2d import (
+    AGENT_COLORS,
+    BACKGROUND_COLOR,
+    ImageSequenceWriter,
+    RasterRenderer,
+    VideoWriter,
+)
+from tests.networks import parallel_lines
+
+
+@pytest.mark.parametrize("width, height", [(64, 48), (101, 51)])
+def test_frames_have_the_requested_shape(width: int, height: int) -> None:
+    renderer = RasterRenderer(parallel_lines(2, 5), width=width, height=height, margin=3, marker_radius=2)
+    frame = renderer.render_positions({"agent_0": "0_0_f", "agent_1": "1_4_f"})
+    assert frame.shape == renderer.background.shape == (height, width, 3) and frame.dtype == np.uint8
+    column, row = renderer.pixel_of("1_4_f")
+    assert column == width - 1 - 3 and 3 <= row < height - 3
+    assert frame[row, column].tolist() == list(AGENT_COLORS[1])
+    assert renderer.background[0, 0].tolist() == list(BACKGROUND_COLOR)
+    assert np.array_equal(renderer.render_positions({}), renderer.background)
+
+
+def test_markers_at_the_border_are_clipped() -> None:
+    renderer = RasterRenderer(parallel_lines(1, 2), width=20, height=11, margin=0, marker_radius=3)
+    frame = renderer.render_positions({"agent_0": "0_0_f"})
+    column, row = renderer.pixel_of("0_0_f")
+    assert column == 0
+    assert (frame[row - 3 : row + 4, :4] == AGENT_COLORS[0]).all()
+    assert (frame[:, 4:] == renderer.background[:, 4:]).all()
+
+
+def test_image_sequence_keeps_the_frame_size(tmp_path: Path) -> None:
+    renderer = RasterRenderer(parallel_lines(1, 3), width=33, height=17)
+    with ImageSequenceWriter(tmp_path, "png") as writer:
+        writer.write(renderer.render_positions({"agent_0": "0_1_f"}))
+    png = (tmp_path / "frame_000000.png").read_bytes()
+    assert struct.unpack(">II", png[16:24]) == (33, 17)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_video_of_odd_frames_is_written(tmp_path: Path) -> None:
+    renderer = RasterRenderer(parallel_lines(1, 3), width=33, height=17)
+    with VideoWriter(tmp_path / "run.mp4", renderer.width, renderer.height) as writer:
+        for _ in range(3):
+            writer.write(renderer.background)
+    assert (tmp_path / "run.mp4").stat().st_size > 0
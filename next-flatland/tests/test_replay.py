@@ -0,0 +1,99 @@
+import functools
+import random
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from example.rail_network import create_example_rail_network
+from gen_env import GenEnvSimulation
+from next_flatland.network.state_network import StateNetwork, StateNodeType
+from next_flatland.simulation.checkpoint import CheckpointStore
+from next_flatland.simulation.replay import Replay
+from next_flatland.simulation.timetable import DepartureIndex, Timetable
+from rail_prototyp import RailArbiter, TimedRailPropagator, TimedRailState, TimetableSpawner
+
+
+def _network() -> StateNetwork:
+    network = create_example_rail_network()
+    nodes = [
+        replace(node, length=1.0) if node.node_type == StateNodeType.INFRASTRUCTURE else node
+        for node in network.all_nodes
+    ]
+    links = [((nodes[s].id, nodes[t].id), link) for (s, t), link in network.link_by_tuple_iterator()]
+    return StateNetwork.create_new(nodes, links)
+
+
+def _timetable() -> Timetable:
+    # (train, location, arrival, departure), NaN at the origin and the destination
+    stops = [
+        ("A", "0_forward", np.nan, 0),
+        ("A", "3_forward", 4, 6),
+        ("A", "5_forward", 8, np.nan),
+        ("C", "0_forward", np.nan, 3.5),
+        ("C", "5_forward", np.nan, np.nan),
+        ("D", "6_forward", np.nan, 7),
+        ("D", "4_forward", np.nan, np.nan),
+        ("B", "5_backward", np.nan, 20),
+        ("B", "0_backward", 29, np.nan),
+    ]
+    train_ids, locations, arrivals, departures = map(np.array, zip(*stops))
+    return Timetable.from_stops(train_ids, locations, arrivals.astype(float), departures.astype(float))
+
+
+def _simulation() -> GenEnvSimulation:
+    random.seed(0)
+    state = TimedRailState(_network())
+    clock = functools.partial(getattr, state.movement, "now")
+    spawner = TimetableSpawner(DepartureIndex(_timetable()), clock, length=0.5)
+    propagator = TimedRailPropagator(state.occupancy, movement=state.movement)
+    arbiter = RailArbiter(state.occupancy, verbose=False)
+    return GenEnvSimulation(propagator, state, arbiter, environment=[spawner])
+
+
+def _positions(state: TimedRailState) -> tuple:
+    agents = sorted((agent.id, agent.max_speed, agent.length) for agent in state.agents)
+    links = sorted(
+        (node.id, infra.id)
+        for node in state.state.all_nodes
+        if node.node_type == StateNodeType.AGENT
+        for infra in state.state.neighbors(node.id, "out")
+    )
+    return state.movement.now, agents, links, state.occupancy.counts.tolist()
+
+
+def _run(simulation: GenEnvSimulation, n_steps: int, snapshots: dict[int, tuple]) -> None:
+    for _ in range(n_steps):
+        simulation.queue.clear()
+        simulation.step()
+        snapshots[simulation.n_steps] = _positions(simulation.state)
+
+
+def test_replay_reapplies_timetable_spawns_removals_and_wake_ups(tmp_path: Path) -> None:
+    simulation = _simulation()
+    recorder = simulation.record(tmp_path, keyframe_every=1000)
+    snapshots = {0: _positions(simulation.state)}
+    _run(simulation, 30, snapshots)
+    recorder.close()
+
+    replay = Replay(tmp_path)
+    for step in (30, 3, 17, 0, 22, 29):
+        assert _positions(replay.seek(step)) == snapshots[step]
+
+
+def test_recorded_run_can_be_checkpointed_and_resumed(tmp_path: Path) -> None:
+    simulation = _simulation()
+    simulation.record(tmp_path / "recording", keyframe_every=7)
+    snapshots = {0: _positions(simulation.state)}
+    _run(simulation, 12, snapshots)
+    checkpoint = simulation.checkpoint(CheckpointStore(tmp_path / "checkpoints"))
+    _run(simulation, 5, {})
+
+    resumed = GenEnvSimulation.resume(CheckpointStore(tmp_path / "checkpoints"), checkpoint)
+    _run(resumed, 18, snapshots)
+    resumed.observers[0].close()
+
+    replay = Replay(tmp_path / "recording")
+    assert replay.n_steps == 30
+    for step in (30, 12, 13, 5, 22):
+        assert _positions(replay.seek(step)) == snapshots[step]
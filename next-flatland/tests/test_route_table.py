@@ -0,0 +1,28 @@
+import pytest
+
+from example.rail_network import create_example_rail_network
+from next_flatland.network.state_network import StateNetwork, compile_route_table
+from scenario import RailNetwork
+
+
+def _colored_graph(network: StateNetwork):
+    return network._underlying_digraph, [node.node_type.value for node in network.all_nodes]
+
+
+def test_compiled_scenario_is_the_example_network() -> None:
+    compiled, compiled_types = _colored_graph(RailNetwork().to_state_network())
+    example, example_types = _colored_graph(create_example_rail_network())
+    assert compiled.isomorphic_vf2(example, color1=compiled_types, color2=example_types)
+
+
+def test_entries_continuing_alike_share_a_node() -> None:
+    network = compile_route_table([(1, 0, 2), (1, 0, 3), (1, 2, 0), (1, 3, 0)])
+    assert [node.id for node in network.neighbors("1_from_2_from_3", "out") if node.id != "1"] == ["0_from_1"]
+
+
+@pytest.mark.parametrize(
+    "routes", [[(1, "1", 2)], [("a_from_b", "a_from_b", "a"), ("a", "b", "a_from_b")]], ids=["resources", "entries"]
+)
+def test_colliding_node_ids_are_rejected(routes) -> None:
+    with pytest.raises(ValueError):
+        compile_route_table(routes)
@@ -0,0 +1,31 @@
+import functools
+
+from ugraph import NodeId
+
+from gen_env import GenEnvSimulation
+from rail_prototyp import RailArbiter, RailPropagator, RailState, RailStreamObserver, TrainAgent
+from tests.networks import parallel_lines
+
+
+class RecordingServer:
+    def __init__(self):
+        self.steps: list[int] = []
+
+    def publish(self, step, added, removed, removed_agents) -> None:
+        self.steps.append(step)
+
+
+def test_frames_are_numbered_by_the_simulation_steps_when_attached_mid_run() -> None:
+    state = RailState(parallel_lines(2, 10))
+    for line in range(2):
+        state.add_agent_to_network(TrainAgent(line), NodeId(f"{line}_0_f"))
+    simulation = GenEnvSimulation(RailPropagator(state.occupancy), state, RailArbiter(state.occupancy, verbose=False))
+    for _ in range(3):
+        simulation.step()
+
+    server = RecordingServer()
+    simulation.observers.append(RailStreamObserver(server, functools.partial(getattr, simulation, "n_steps")))
+    simulation.step()
+    simulation.step()
+
+    assert server.steps == [4, 5]
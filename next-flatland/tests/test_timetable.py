@@ -0,0 +1,75 @@
+import math
+from pathlib import Path
+
+import numpy as np
+
+from example.rail_network import create_example_rail_network
+from gen_env import GenEnvSimulation
+from next_flatland.simulation.timetable import DepartureIndex, Timetable
+from rail_prototyp import RailArbiter, RailPropagator, RailState, RoutePolicy, TimetableSpawner, TrainAgent
+
+
+def _timetable(stops: list[tuple[str, str, float, float]]) -> Timetable:
+    train_ids, locations, arrivals, departures = map(np.array, zip(*stops))
+    return Timetable.from_stops(train_ids, locations, arrivals.astype(float), departures.astype(float))
+
+
+def test_csv_reads_empty_times_and_times_past_midnight(tmp_path: Path) -> None:
+    path = tmp_path / "timetable.csv"
+    path.write_text(
+        "train_id,location,arrival,departure\n"
+        "night,a,,23:50\n"
+        "day,x,,600\n"
+        "night,b,24:30,24:32\n"
+        "day,y,00:20:30,\n"
+        "night,c,25:10:00,\n"
+    )
+    timetable = Timetable.read_csv(path)
+    day, night = timetable.run(0), timetable.run(1)
+    assert [stop.infrastructure_id for stop in night.stops] == ["a", "b", "c"]
+    assert math.isnan(night.stops[0].arrival) and math.isnan(night.stops[-1].departure)
+    assert [night.stops[1].arrival, night.stops[1].departure] == [24 * 3600 + 30 * 60, 24 * 3600 + 32 * 60]
+    assert night.stops[2].arrival == 25 * 3600 + 10 * 60
+    assert (day.departure, day.stops[1].arrival) == (600, 20 * 60 + 30)
+
+
+def test_departure_index_hands_out_every_run_once_in_order_of_departure() -> None:
+    timetable = _timetable(
+        [("late", "a", np.nan, 9), ("late", "b", np.nan, np.nan)]
+        + [("early", "a", np.nan, 1), ("early", "b", np.nan, np.nan)]
+        + [("middle", "a", np.nan, 4), ("middle", "b", np.nan, np.nan)]
+    )
+    departures = DepartureIndex(timetable)
+    assert departures.pop_due(0) == []
+    assert [run.train_id for run in departures.pop_due(4)] == ["early", "middle"]
+    assert [run.train_id for run in departures.pop_due(4)] == []
+    assert departures.next_departure == 9
+    assert [run.train_id for run in departures.pop_due(100)] == ["late"]
+    assert departures.exhausted and departures.next_departure == math.inf
+
+
+def test_spawner_spawns_in_order_of_departure_and_keeps_blocked_runs_waiting() -> None:
+    timetable = _timetable(
+        [("second", "0_forward", np.nan, 1), ("second", "5_forward", np.nan, np.nan)]
+        + [("first", "0_forward", np.nan, 0), ("first", "5_forward", np.nan, np.nan)]
+        + [("third", "6_forward", np.nan, 1), ("third", "4_forward", np.nan, np.nan)]
+    )
+    state = RailState(create_example_rail_network())
+    spawner = TimetableSpawner(DepartureIndex(timetable), lambda: 1.0)
+    simulation = GenEnvSimulation(
+        RailPropagator(state.occupancy), state, RailArbiter(state.occupancy, verbose=False), environment=[spawner]
+    )
+    simulation.step()
+    assert spawner.train_id_by_agent == {"agent_0": "first", "agent_1": "third"}
+
+    # the second train leaves once the first one has cleared the origin
+    while len(spawner.train_id_by_agent) < 3:
+        simulation.step()
+    assert spawner.train_id_by_agent["agent_2"] == "second"
+
+
+def test_route_policy_waits_when_its_agent_is_off_the_route() -> None:
+    state = RailState(create_example_rail_network())
+    policy = RoutePolicy(route=["3_forward", "5_forward"], departures={}, clock=lambda: 0.0)
+    state.add_agent_to_network(TrainAgent(id=0, policy=policy), "0_forward")
+    assert policy.propose_next_position("agent_0", state.state) is None
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ugraph import EndNodeIdPair, NodeId
+
+from next_flatland.network.state_network import StateLink, StateLinkType, StateNetwork, TopologyViolation
+from next_flatland.network.state_network.validation import split_into_component_batches
+from tests.networks import parallel_lines
+
+
+def _with_links(network: StateNetwork, links: list[tuple[str, str, StateLinkType]]) -> StateNetwork:
+    network.add_links(
+        [(EndNodeIdPair((NodeId(s), NodeId(t))), StateLink(link_type=link_type)) for s, t, link_type in links]
+    )
+    return network
+
+
+def test_valid_network_succeeds() -> None:
+    result = parallel_lines(3, 4).validate_topology()
+    assert result.succeeded and result.value is True
+
+
+def test_violations_of_every_component_are_collected() -> None:
+    network = _with_links(
+        parallel_lines(3, 4),
+        [("0_3_f", "0_0_f", StateLinkType.TRANSITION), ("2_0", "2_0_f", StateLinkType.TRANSITION)],
+    )
+    result = network.validate_topology()
+    assert not result.succeeded
+    assert all(isinstance(violation, TopologyViolation) for violation in result.answer)
+    messages = {violation.message: violation.node_ids for violation in result.answer}
+    assert messages["Resource node 2_0 has outgoing links"] == ("2_0",)
+    cycle = messages["Infrastructure component with 4 nodes is not a DAG"]
+    assert sorted(cycle) == ["0_0_f", "0_1_f", "0_2_f", "0_3_f"]
+    assert not any(node_id.startswith("1_") for violation in result.answer for node_id in violation.node_ids)
+
+
+def test_batches_checked_in_parallel_find_the_same_violations() -> None:
+    network = _with_links(
+        parallel_lines(6, 3),
+        [(f"{line}_2_f", f"{line}_0_f", StateLinkType.TRANSITION) for line in (0, 3, 5)],
+    )
+    assert len(split_into_component_batches(network, batch_size=6)) > 1
+    sequential = network.validate_topology().answer
+    with ThreadPoolExecutor(2) as executor:
+        parallel = network.validate_topology(executor).answer
+    assert sorted(map(repr, parallel)) == sorted(map(repr, sequential))
+    assert len([v for v in sequential if v.message.startswith("Infrastructure component")]) == 3
@@ -0,0 +1,49 @@
+import functools
+
+import numpy as np
+import pytest
+
+from next_flatland.simulation.vector_env import ParallelEnv, VectorEnv
+from rail_env import RailEnv
+from tests.networks import parallel_lines
+
+# per step the actions of both agents in both envs, env 1 waits now and then
+ACTIONS = np.array([[[1, 1], [0, 1]], [[1, 0], [1, 1]], [[1, 1], [1, 0]], [[1, 1], [1, 1]], [[0, 1], [1, 1]]])
+
+
+def _factory() -> functools.partial:
+    return functools.partial(RailEnv, parallel_lines(2, 4), ["0_0_f", "1_0_f"], ["0_3_f", "1_3_f"], max_steps=4)
+
+
+@pytest.fixture
+def vector_env():
+    env = VectorEnv([_factory(), _factory()])
+    yield env
+    env.close()
+
+
+def test_vector_env_steps_like_the_parallel_api(vector_env: VectorEnv) -> None:
+    references = [ParallelEnv(_factory()()) for _ in range(vector_env.n_envs)]
+    observations = vector_env.reset(seed=0)
+    for e, reference in enumerate(references):
+        first, _ = reference.reset(seed=e)
+        assert np.array_equal(observations[e], np.stack(list(first.values())))
+
+    n_resets = 0
+    for actions in ACTIONS:
+        observations, rewards, terminations, truncations, autoreset = vector_env.step(actions)
+        for e, reference in enumerate(references):
+            stepped = list(reference.agents)
+            obs, rew, term, trunc, _ = reference.step({agent: int(actions[e][i]) for i, agent in enumerate(stepped)})
+            done = not reference.agents
+            assert autoreset[e] == done
+            last = vector_env.buffers.final_observations[e] if done else observations[e]
+            for agent in stepped:
+                i = reference.possible_agents.index(agent)
+                assert np.array_equal(last[i], obs[agent])
+                assert (rewards[e][i], terminations[e][i], truncations[e][i]) == (rew[agent], term[agent], trunc[agent])
+            if done:
+                n_resets += 1
+                first, _ = reference.reset()
+                assert np.array_equal(observations[e], np.stack(list(first.values())))
+    assert n_resets >= 2